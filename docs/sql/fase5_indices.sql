@@ -0,0 +1,9 @@
+-- Índices de apoyo para los datasets de reportes (Fase 5).
+-- Ejecutar una vez en MySQL. Las consultas de upcoming_arrivals filtran vwMisioneros por
+-- CCM_llegada >= :start_date AND CCM_llegada < :end_date; sobre la tabla base (ccm_generaciones)
+-- ese rango se resuelve con un range scan de este índice en lugar de recorrer toda la tabla.
+-- fecha_llegada/fecha_salida ya son DATE en ccm_generaciones, por lo que las consultas las usan sin
+-- envolverlas en DATE() y el agrupamiento por fecha puede aprovechar el orden del índice.
+
+CREATE INDEX idx_ccm_generaciones_llegada_rama
+    ON ccm_generaciones (fecha_llegada, rama, distrito);
@@ -0,0 +1,27 @@
+-- Roll-ups materializados para los datasets branch_summary y district_kpi (Fase 5).
+-- Ejecutar una vez en MySQL antes de activar REPORT_USE_MATERIALIZATIONS=true.
+-- El contenido lo reconstruye SQLAlchemyReportDataRepository.refresh_materializations(),
+-- invocado tras cada /extraccion_generacion.
+
+CREATE TABLE IF NOT EXISTS mv_branch_summary (
+    branch_id INT NOT NULL,
+    district VARCHAR(100) NOT NULL,
+    first_generation_date DATE NULL,
+    first_ccm_arrival DATE NULL,
+    last_ccm_departure DATE NULL,
+    total_missionaries INT NOT NULL DEFAULT 0,
+    refreshed_at DATETIME NOT NULL,
+    PRIMARY KEY (branch_id, district)
+);
+
+CREATE TABLE IF NOT EXISTS mv_district_kpis (
+    branch_id INT NOT NULL,
+    district VARCHAR(100) NOT NULL,
+    total_missionaries INT NOT NULL DEFAULT 0,
+    ccm_count INT NOT NULL DEFAULT 0,
+    virtual_count INT NOT NULL DEFAULT 0,
+    future_count INT NOT NULL DEFAULT 0,
+    three_week_count INT NOT NULL DEFAULT 0,
+    refreshed_at DATETIME NOT NULL,
+    PRIMARY KEY (branch_id, district)
+);
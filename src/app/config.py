@@ -9,6 +9,11 @@ from pydantic import field_validator, Field
 from pydantic_settings import BaseSettings
 import structlog
 
+try:  # pragma: no cover - import opcional
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None  # type: ignore
+
 APP_DIR = Path(__file__).resolve().parent
 SRC_DIR = APP_DIR.parent
 PROJECT_ROOT = SRC_DIR.parent
@@ -32,7 +37,11 @@ class Settings(BaseSettings):
     # Search Configuration
     email_subject_pattern: str = "Misioneros que llegan"
     processed_label: str = "misioneros-procesados"
+    rejected_label: str = "misioneros-rechazados"
     email_table_required_columns: List[str] = Field(default_factory=lambda: ["Distrito"])
+    gmail_quota_units_per_second: int = 250
+    gmail_concurrency: int = 8
+    attachment_staging_dir: Optional[str] = None
 
     # Application Configuration
     app_env: str = "development"
@@ -58,6 +67,13 @@ class Settings(BaseSettings):
     cache_provider: str = "memory"
     redis_url: Optional[str] = None
     report_cache_ttl_minutes: int = 30
+    report_stream_results: bool = False
+    report_use_materializations: bool = False
+    report_repository_cache_ttl_seconds: int = 600
+    report_bundle_multi_statements: bool = False
+    report_cache_hit_log_every: int = 1
+    report_db_pool_size: int = 5
+    report_db_max_overflow: int = 10
 
     # Report Branch Configuration (Fase 5+)
     ramas_autorizadas: List[int] = Field(default_factory=list)
@@ -169,6 +185,11 @@ def get_settings() -> Settings:
     return Settings()
 
 
+def _orjson_dumps(event_dict: Any, default: Any = None, **_: Any) -> str:
+    """Serializador para ``JSONRenderer``; ``default`` conserva el fallback ``__structlog__``/``repr`` de structlog."""
+    return orjson.dumps(event_dict, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 def configure_logging(settings: Settings):
     """Configurar logging estructurado con separación por servicio."""
     import logging.config
@@ -190,6 +211,8 @@ def configure_logging(settings: Settings):
     structlog.contextvars.clear_contextvars()
     structlog.configure(
         processors=[
+            # Descarta eventos bajo el nivel configurado antes de ejecutar el resto de procesadores
+            structlog.stdlib.filter_by_level,
             structlog.contextvars.merge_contextvars,
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
@@ -220,7 +243,9 @@ def configure_logging(settings: Settings):
         "formatters": {
             formatter_name: {
                 "()": structlog.stdlib.ProcessorFormatter,
-                "processor": structlog.processors.JSONRenderer(),
+                "processor": structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+                if orjson is not None
+                else structlog.processors.JSONRenderer(),
                 "foreign_pre_chain": foreign_pre_chain,
             },
         },
@@ -19,7 +19,7 @@ from app.logging_utils import ensure_log_context, bind_log_context
 from app.services.database_sync_service import DatabaseSyncService
 from app.services.drive_service import DriveService
 from app.services.email_service import EmailService
-from app.services.report_preparation_service import ReportPreparationService
+from app.services.report_preparation_service import ReportPreparationError, ReportPreparationService
 from app.services.telegram_client import TelegramClient
 from app.services.telegram_notification_service import TelegramNotificationResult, TelegramNotificationService
 
@@ -75,6 +75,9 @@ async def lifespan(app: FastAPI):
         await email_service.close()
     if drive_service:
         drive_service.close()
+    telegram_client.close()
+    if report_preparation_service:
+        report_preparation_service.close()
 
     report_preparation_service = None
     telegram_notification_service = None
@@ -239,6 +242,14 @@ def extraccion_generacion(payload: DatabaseSyncRequest):
         "Extracción de generación completada",
         force=payload.force,
     )
+
+    if report_preparation_service and get_settings().report_use_materializations:
+        try:
+            report_preparation_service.refresh_materializations()
+        except ReportPreparationError as exc:
+            # Los roll-ups quedan con el corte anterior; la extracción ya se completó
+            endpoint_logger.warning("No se pudieron refrescar roll-ups de reportes", error=str(exc))
+
     return DatabaseSyncResponse(success=True, report=report.to_dict())
 
 
@@ -298,4 +309,5 @@ def telegram_alerta(
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # loop="auto" usa uvloop cuando está instalado (Linux/macOS) y asyncio estándar en otro caso
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto")
@@ -23,6 +23,7 @@ class EmailAttachment(BaseModel):
     size: int  # en bytes
     content_type: Optional[str] = None
     data: Optional[bytes] = None  # Base64 encoded para API
+    stream: Optional[Any] = Field(default=None, exclude=True)  # Archivo binario (p. ej. SpooledTemporaryFile)
 
     class Config:
         arbitrary_types_allowed = True
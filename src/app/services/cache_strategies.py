@@ -7,7 +7,7 @@ import threading
 import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, asdict
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
 
 import structlog
 
@@ -18,6 +18,23 @@ try:  # pragma: no cover - import opcional
 except ImportError:  # pragma: no cover - redis es opcional
     redis = None  # type: ignore
 
+try:  # pragma: no cover - import opcional
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None  # type: ignore
+
+
+def _dumps(value: Dict[str, Any]) -> Any:
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str)
+
+
+def _loads(payload: Any) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
 
 @dataclass
 class CacheMetrics:
@@ -33,23 +50,53 @@ class CacheMetrics:
         return asdict(self)
 
 
+class LazyCacheMetrics:
+    """Métricas de una estrategia que se leen solo cuando structlog renderiza el evento."""
+
+    __slots__ = ("_strategy",)
+
+    def __init__(self, strategy: "CacheStrategy") -> None:
+        self._strategy = strategy
+
+    def __structlog__(self) -> Dict[str, int]:
+        return self._strategy.get_metrics()
+
+    def __repr__(self) -> str:
+        return repr(self._strategy.get_metrics())
+
+
 class CacheStrategy(ABC):
     """Interfaz para estrategias de caché."""
 
+    # ``True`` cuando los valores se guardan por referencia dentro del proceso, sin serializar
+    stores_references: bool = False
+
     @abstractmethod
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         raise NotImplementedError
 
     @abstractmethod
-    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None) -> None:
+    def set(
+        self,
+        key: str,
+        value: Dict[str, Any],
+        ttl_seconds: Optional[int] = None,
+        *,
+        prefixes: Iterable[str] = (),
+    ) -> None:
+        """Guardar ``value``; ``prefixes`` registra la llave en el índice de esos prefijos para ``invalidate_prefix``."""
         raise NotImplementedError
 
     @abstractmethod
-    def invalidate(self, key: str) -> None:
+    def invalidate(self, key: str, *, prefixes: Iterable[str] = ()) -> None:
+        """Eliminar ``key``; ``prefixes`` son los índices usados en ``set`` de los que también se retira."""
         raise NotImplementedError
 
     def invalidate_prefix(self, prefix: str) -> None:
-        """Invalidar todos los elementos cuyo key inicie con el prefijo dado."""
+        """Invalidar todos los elementos cuyo key inicie con el prefijo dado.
+
+        Si el prefijo fue indexado al guardar se borran solo sus llaves; si no, se recorren todas.
+        """
         raise NotImplementedError
 
     @abstractmethod
@@ -60,9 +107,13 @@ class CacheStrategy(ABC):
 class InMemoryCacheStrategy(CacheStrategy):
     """Estrategia de caché en memoria con TTL simple."""
 
+    stores_references = True
+
     def __init__(self) -> None:
         self._store: Dict[str, Dict[str, Any]] = {}
         self._expirations: Dict[str, float] = {}
+        self._index: Dict[str, Set[str]] = {}
+        self._key_prefixes: Dict[str, Tuple[str, ...]] = {}
         self._lock = threading.Lock()
         self._metrics = CacheMetrics()
 
@@ -71,8 +122,7 @@ class InMemoryCacheStrategy(CacheStrategy):
             expires_at = self._expirations.get(key)
             expired = expires_at is not None and expires_at < time.time()
             if expired:
-                self._store.pop(key, None)
-                self._expirations.pop(key, None)
+                self._drop(key)
                 self._metrics.expirations += 1
                 logger.debug(
                     "cache_expirada_memoria",
@@ -90,7 +140,14 @@ class InMemoryCacheStrategy(CacheStrategy):
             logger.debug("cache_fallo_memoria", etapa="fase_5_preparacion", clave=key)
             return None
 
-    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None) -> None:
+    def set(
+        self,
+        key: str,
+        value: Dict[str, Any],
+        ttl_seconds: Optional[int] = None,
+        *,
+        prefixes: Iterable[str] = (),
+    ) -> None:
         if ttl_seconds is not None and ttl_seconds <= 0:
             logger.debug("cache_descartada_memoria", etapa="fase_5_preparacion", clave=key, ttl=ttl_seconds)
             return
@@ -101,26 +158,46 @@ class InMemoryCacheStrategy(CacheStrategy):
                 self._expirations[key] = time.time() + ttl_seconds
             else:
                 self._expirations.pop(key, None)
+            prefixes = tuple(prefixes)
+            for prefix in prefixes:
+                self._index.setdefault(prefix, set()).add(key)
+            if prefixes:
+                self._key_prefixes[key] = prefixes
             self._metrics.writes += 1
             logger.debug("cache_guardada_memoria", etapa="fase_5_preparacion", clave=key, ttl=ttl_seconds)
 
-    def invalidate(self, key: str) -> None:
+    def _drop(self, key: str) -> Optional[Dict[str, Any]]:
+        """Quitar ``key`` del almacén y de los índices de prefijo; requiere ``self._lock``."""
+        self._expirations.pop(key, None)
+        for prefix in self._key_prefixes.pop(key, ()):
+            indexed = self._index.get(prefix)
+            if indexed is not None:
+                indexed.discard(key)
+                if not indexed:
+                    del self._index[prefix]
+        return self._store.pop(key, None)
+
+    def invalidate(self, key: str, *, prefixes: Iterable[str] = ()) -> None:
+        # Los prefijos de cada llave ya se conocen desde ``set``
         with self._lock:
-            removed = self._store.pop(key, None)
-            self._expirations.pop(key, None)
+            removed = self._drop(key)
             if removed is not None:
                 self._metrics.invalidations += 1
             logger.debug("cache_invalidada_memoria", etapa="fase_5_preparacion", clave=key)
 
     def invalidate_prefix(self, prefix: str) -> None:
         with self._lock:
-            keys = [k for k in self._store if k.startswith(prefix)]
+            indexed = self._index.pop(prefix, None)
+            if indexed is not None:
+                # Las llaves del índice pueden haber expirado o invalidarse antes por otra vía
+                keys = [k for k in indexed if k in self._store]
+            else:
+                keys = [k for k in self._store if k.startswith(prefix)]
             if not keys:
                 return
 
             for key in keys:
-                self._store.pop(key, None)
-                self._expirations.pop(key, None)
+                self._drop(key)
 
             self._metrics.invalidations += len(keys)
             logger.debug(
@@ -144,6 +221,8 @@ class RedisCacheStrategy(CacheStrategy):
         self._client = redis.Redis.from_url(redis_url, decode_responses=True)
         self._metrics = CacheMetrics()
         self._lock = threading.Lock()
+        # Prefijos ya recorridos con SCAN en este proceso para alcanzar llaves escritas sin índice
+        self._scanned_prefixes: Set[str] = set()
 
     def get(self, key: str) -> Optional[Dict[str, Any]]:
         payload = self._client.get(key)
@@ -153,8 +232,8 @@ class RedisCacheStrategy(CacheStrategy):
             logger.debug("cache_fallo_redis", etapa="fase_5_preparacion", clave=key)
             return None
         try:
-            value = json.loads(payload)
-        except json.JSONDecodeError:  # pragma: no cover - datos corruptos
+            value = _loads(payload)
+        except ValueError:  # json.JSONDecodeError y orjson.JSONDecodeError heredan de ValueError  # pragma: no cover - datos corruptos
             self.invalidate(key)
             logger.warning(
                 "cache_payload_invalido_redis",
@@ -168,33 +247,70 @@ class RedisCacheStrategy(CacheStrategy):
         logger.debug("cache_hit_redis", etapa="fase_5_preparacion", clave=key)
         return value
 
-    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None) -> None:
+    def set(
+        self,
+        key: str,
+        value: Dict[str, Any],
+        ttl_seconds: Optional[int] = None,
+        *,
+        prefixes: Iterable[str] = (),
+    ) -> None:
         if ttl_seconds is not None and ttl_seconds <= 0:
             logger.debug("cache_descartada_redis", etapa="fase_5_preparacion", clave=key, ttl=ttl_seconds)
             return
 
-        payload = json.dumps(value, default=str)
+        payload = _dumps(value)
+        pipeline = self._client.pipeline(transaction=False)
         if ttl_seconds:
-            self._client.setex(key, ttl_seconds, payload)
+            pipeline.setex(key, ttl_seconds, payload)
         else:
-            self._client.set(key, payload)
+            pipeline.set(key, payload)
+        for prefix in prefixes:
+            index_key = self._index_key(prefix)
+            pipeline.sadd(index_key, key)
+            # El índice vive tanto como la última entrada escrita; con el TTL uniforme del servicio cubre a todas
+            if ttl_seconds:
+                pipeline.expire(index_key, ttl_seconds)
+            else:
+                pipeline.persist(index_key)
+        pipeline.execute()
         with self._lock:
             self._metrics.writes += 1
         logger.debug("cache_guardada_redis", etapa="fase_5_preparacion", clave=key, ttl=ttl_seconds)
 
-    def invalidate(self, key: str) -> None:
-        self._client.delete(key)
+    def invalidate(self, key: str, *, prefixes: Iterable[str] = ()) -> None:
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.delete(key)
+        for prefix in prefixes:
+            pipeline.srem(self._index_key(prefix), key)
+        pipeline.execute()
         with self._lock:
             self._metrics.invalidations += 1
         logger.debug("cache_invalidada_redis", etapa="fase_5_preparacion", clave=key)
 
+    @staticmethod
+    def _index_key(prefix: str) -> str:
+        return f"cache-index:{prefix}"
+
     def invalidate_prefix(self, prefix: str) -> None:
-        pattern = f"{prefix}*"
-        keys = list(self._client.scan_iter(match=pattern))
+        """Invalidar por índice; la primera vez por prefijo en el proceso también se recorre con SCAN.
+
+        El SCAN inicial alcanza llaves escritas antes de existir el índice (migración). Las que escriban
+        después instancias sin índice no se detectan hasta el siguiente reinicio.
+        """
+        index_key = self._index_key(prefix)
+        keys = set(self._client.smembers(index_key))
+        if not any(prefix.startswith(scanned) for scanned in self._scanned_prefixes):
+            keys.update(self._client.scan_iter(match=f"{prefix}*"))
+            self._scanned_prefixes.add(prefix)
+
         if not keys:
             return
-
-        self._client.delete(*keys)
+        # Borrado puntual de las llaves indexadas; evita el SCAN sobre todo el keyspace
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.unlink(*keys)
+        pipeline.delete(index_key)
+        pipeline.execute()
         with self._lock:
             self._metrics.invalidations += len(keys)
         logger.debug(
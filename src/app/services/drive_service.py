@@ -3,13 +3,15 @@
 import io
 import os
 import re
-import pickle
+import threading
 from datetime import datetime
-from typing import Any, Dict, Optional, List, Tuple, TYPE_CHECKING
+from typing import Any, BinaryIO, Dict, Optional, List, Tuple, Union, TYPE_CHECKING
 
+import httplib2
 import structlog
 from app.logging_utils import ensure_log_context, bind_log_context
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
@@ -17,6 +19,7 @@ from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload, MediaIoBaseDownload
 
 from app.config import Settings
+from app.services.oauth_token_store import load_token, save_token
 
 if TYPE_CHECKING:
     from app.models import EmailAttachment
@@ -31,19 +34,38 @@ class DriveService:
 
     MAX_FILENAME_LENGTH = 100
 
+    # Tamaño de fragmento para subidas reanudables (múltiplo de 256 KiB)
+    UPLOAD_CHUNK_SIZE = 1 << 20
+
+    # Timeout (segundos) de cada solicitud HTTP hacia Drive API
+    HTTP_TIMEOUT_SECONDS = 30
+
     def __init__(self, settings: Settings):
         self.settings = settings
         self.logger = structlog.get_logger("drive_service").bind(
             servicio="drive_service",
         )
         self._service = None
+        self._http: Optional[AuthorizedHttp] = None
         self._oauth_credentials: Optional[Credentials] = None
+        # Las subidas corren en hilos (``asyncio.to_thread``) y httplib2 no es thread-safe:
+        # cada hilo usa su propio AuthorizedHttp, registrado por ``threading.get_ident``
+        self._thread_local = threading.local()
+        self._thread_https: Dict[int, AuthorizedHttp] = {}
+        self._thread_https_lock = threading.Lock()
+        self._service_lock = threading.Lock()
+        self._folder_lock = threading.Lock()
 
     def _ensure_service(self, *, log_context: Optional[Dict[str, Any]] = None):
         """Inicializar el cliente de Drive una sola vez."""
         if self._service is not None:
             return
 
+        with self._service_lock:
+            if self._service is None:
+                self._build_service(log_context)
+
+    def _build_service(self, log_context: Optional[Dict[str, Any]]) -> None:
         context = ensure_log_context(log_context, etapa="drive_client")
         logger = bind_log_context(self.logger, context)
 
@@ -55,7 +77,15 @@ class DriveService:
                 "Ejecuta el flujo OAuth o comparte las credenciales desde GmailOAuthService."
             )
 
-        self._service = build("drive", "v3", credentials=credentials)
+        # Un solo AuthorizedHttp con conexiones persistentes para todas las llamadas a Drive
+        self._http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.HTTP_TIMEOUT_SECONDS))
+        self._service = build(
+            "drive",
+            "v3",
+            http=self._http,
+            cache_discovery=False,
+            static_discovery=True,
+        )
         self._oauth_credentials = credentials
         logger.info("Cliente de Google Drive inicializado correctamente")
 
@@ -66,6 +96,7 @@ class DriveService:
             return
 
         self._oauth_credentials = creds
+        self._release_http()
         self._service = None  # Forzar re-creación con las nuevas credenciales
         bind_log_context(self.logger, ensure_log_context(etapa="drive_client")).info(
             "Credenciales OAuth de Drive actualizadas desde Gmail"
@@ -98,10 +129,9 @@ class DriveService:
             or self.settings.google_drive_token_path
         )
 
-        if token_path and os.path.exists(token_path):
+        if token_path:
             try:
-                with open(token_path, "rb") as token_file:
-                    creds = pickle.load(token_file)
+                creds = load_token(token_path, self.SCOPES)
             except Exception as exc:  # noqa: BLE001
                 logger.warning("No se pudo cargar token OAuth existente", error=str(exc))
                 creds = None
@@ -132,8 +162,7 @@ class DriveService:
 
         if token_path:
             try:
-                with open(token_path, "wb") as token_file:
-                    pickle.dump(creds, token_file)
+                save_token(token_path, creds)
             except Exception as exc:  # noqa: BLE001
                 logger.warning("No se pudo guardar token OAuth", error=str(exc))
 
@@ -167,13 +196,27 @@ class DriveService:
 
         files_service = self._service.files()
 
+        # Dos mensajes de la misma generación subiendo en paralelo no deben crear dos carpetas
+        with self._folder_lock:
+            return self._find_or_create_folder(files_service, query, fecha_generacion, parent_folder_id, context, logger)
+
+    def _find_or_create_folder(
+        self,
+        files_service: Any,
+        query: str,
+        fecha_generacion: str,
+        parent_folder_id: str,
+        context: Dict[str, Any],
+        logger: Any,
+    ) -> str:
+        """Reutilizar la carpeta de la generación o crearla; se invoca bajo ``self._folder_lock``."""
         try:
-            response = files_service.list(
+            response = self._execute(files_service.list(
                 q=query,
                 spaces="drive",
                 fields="files(id, name)",
                 pageSize=1,
-            ).execute()
+            ))
         except HttpError as exc:
             logger.error("Error consultando carpeta de generación", error=str(exc), fecha=fecha_generacion)
             raise
@@ -195,7 +238,7 @@ class DriveService:
         }
 
         try:
-            folder = files_service.create(body=metadata, fields="id, name").execute()
+            folder = self._execute(files_service.create(body=metadata, fields="id, name"))
         except HttpError as exc:
             logger.error("Error creando carpeta de generación", error=str(exc), fecha=fecha_generacion)
             raise
@@ -212,12 +255,12 @@ class DriveService:
         self,
         filename: str,
         mime_type: str,
-        data: bytes,
+        data: Union[bytes, BinaryIO],
         parent_folder_id: str,
         *,
         log_context: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, str]:
-        """Subir un archivo binario a Google Drive."""
+        """Subir un archivo binario (bytes o stream legible) a Google Drive."""
         if not filename:
             raise ValueError("El nombre del archivo es obligatorio")
         if not parent_folder_id:
@@ -228,7 +271,13 @@ class DriveService:
 
         self._ensure_service(log_context=context)
 
-        media = MediaIoBaseUpload(io.BytesIO(data), mimetype=mime_type, resumable=True)
+        source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+        media = MediaIoBaseUpload(
+            source,
+            mimetype=mime_type,
+            resumable=True,
+            chunksize=self.UPLOAD_CHUNK_SIZE,
+        )
         metadata = {
             "name": filename,
             "parents": [parent_folder_id],
@@ -237,11 +286,11 @@ class DriveService:
         files_service = self._service.files()
 
         try:
-            drive_file = files_service.create(
+            drive_file = self._execute(files_service.create(
                 body=metadata,
                 media_body=media,
                 fields="id, name, webViewLink, webContentLink",
-            ).execute()
+            ))
         except HttpError as exc:
             logger.error(
                 "Error subiendo archivo a Drive",
@@ -285,12 +334,12 @@ class DriveService:
 
         while True:
             try:
-                response = files_service.list(
+                response = self._execute(files_service.list(
                     q=query,
                     fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
                     spaces="drive",
                     pageToken=page_token,
-                ).execute()
+                ))
             except HttpError as exc:
                 logger.error(
                     "Error listando archivos en Drive",
@@ -378,7 +427,8 @@ class DriveService:
             return None, uploaded, errors
 
         for attachment in attachments:
-            if not getattr(attachment, "data", None):
+            payload = getattr(attachment, "stream", None) or getattr(attachment, "data", None)
+            if not payload:
                 errors.append({
                     "code": "drive_attachment_without_data",
                     "filename": getattr(attachment, "filename", ""),
@@ -403,11 +453,14 @@ class DriveService:
 
             mime_type = getattr(attachment, "content_type", None) or "application/octet-stream"
 
+            if hasattr(payload, "seek"):
+                payload.seek(0)
+
             try:
                 drive_file = self.upload_file(
                     filename=safe_filename,
                     mime_type=mime_type,
-                    data=attachment.data,
+                    data=payload,
                     parent_folder_id=folder_id,
                     log_context=ensure_log_context(context, drive_folder_id=folder_id),
                 )
@@ -589,12 +642,12 @@ class DriveService:
         files_service = self._service.files()
 
         try:
-            response = files_service.list(
+            response = self._execute(files_service.list(
                 q=f"'{folder_id}' in parents and trashed = false",
                 spaces="drive",
                 fields="files(name)",
                 pageSize=1000,
-            ).execute()
+            ))
         except HttpError as exc:
             self.logger.error(
                 "❌ Error obteniendo nombres existentes en carpeta",
@@ -683,7 +736,39 @@ class DriveService:
 
         return cleaned
 
+    def _execute(self, request: Any) -> Any:
+        """Ejecutar ``request`` con el AuthorizedHttp del hilo actual (incluye los fragmentos reanudables)."""
+        http = self._thread_http()
+        return request.execute(http=http) if http is not None else request.execute()
+
+    def _thread_http(self) -> Optional[AuthorizedHttp]:
+        """AuthorizedHttp propio del hilo actual; ``None`` mientras el cliente no esté inicializado."""
+        if self._http is None:
+            return None
+        http = getattr(self._thread_local, "http", None)
+        if http is None or http.credentials is not self._oauth_credentials:
+            http = AuthorizedHttp(self._oauth_credentials, http=httplib2.Http(timeout=self.HTTP_TIMEOUT_SECONDS))
+            self._thread_local.http = http
+            # Tras renovar credenciales (o si se reutiliza el id de un hilo) se cierra el cliente anterior
+            with self._thread_https_lock:
+                previous = self._thread_https.get(threading.get_ident())
+                self._thread_https[threading.get_ident()] = http
+            if previous is not None:
+                previous.http.close()
+        return http
+
+    def _release_http(self) -> None:
+        if self._http is not None:
+            self._http.http.close()
+            self._http = None
+        with self._thread_https_lock:
+            for http in self._thread_https.values():
+                http.http.close()
+            self._thread_https = {}
+        self._thread_local = threading.local()
+
     def close(self):
         """Liberar el cliente de Drive."""
+        self._release_http()
         self._service = None
         self.logger.info("🔌 Cliente de Google Drive liberado")
@@ -4,6 +4,9 @@ from __future__ import annotations
 
 import re
 import unicodedata
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 _MONTH_ALIASES = {
@@ -32,8 +35,11 @@ _PATTERN_GENERIC = re.compile(
     r"(\d{1,2})\s+de\s+([A-Za-zÁÉÍÓÚáéíóúñÑ]+)\s+(?:de\s+)?(\d{4})",
     re.IGNORECASE,
 )
+_CONTENT_PATTERNS: Tuple[re.Pattern[str], ...] = (_PATTERN_GENERACION, _PATTERN_GENERIC)
+_SUBJECT_PATTERNS: Tuple[re.Pattern[str], ...] = (_PATTERN_GENERIC,)
 
 
+@lru_cache(maxsize=128)
 def _normalize_month_name(value: str) -> Optional[str]:
     """Normalize Spanish month names (with optional accents) to numbers."""
 
@@ -93,15 +99,15 @@ def extract_fecha_generacion(
     sources: List[Tuple[str, str, Sequence[re.Pattern[str]]]] = []
 
     if body:
-        sources.append(("cuerpo_texto", body, (_PATTERN_GENERACION, _PATTERN_GENERIC)))
+        sources.append(("cuerpo_texto", body, _CONTENT_PATTERNS))
     if html:
-        sources.append(("cuerpo_html", html, (_PATTERN_GENERACION, _PATTERN_GENERIC)))
+        sources.append(("cuerpo_html", html, _CONTENT_PATTERNS))
     if table_texts:
         for text in table_texts:
             if text:
-                sources.append(("tabla_html", text, (_PATTERN_GENERACION, _PATTERN_GENERIC)))
+                sources.append(("tabla_html", text, _CONTENT_PATTERNS))
     if subject:
-        sources.append(("asunto", subject, (_PATTERN_GENERIC,)))
+        sources.append(("asunto", subject, _SUBJECT_PATTERNS))
 
     for source_name, content, patterns in sources:
         parsed = _parse_with_patterns(content, patterns)
@@ -128,6 +134,17 @@ def extract_fecha_generacion(
     return None
 
 
+def parse_email_date(date_header: Optional[str]) -> datetime:
+    """Parse an RFC 2822 ``Date`` header, falling back to the current UTC time."""
+
+    if date_header:
+        try:
+            return parsedate_to_datetime(date_header)
+        except (TypeError, ValueError):
+            pass
+    return datetime.now(timezone.utc)
+
+
 def collect_table_texts(parsed_table: Optional[Dict[str, Any]]) -> List[str]:
     """Collect textual content from table headers and rows for auxiliary parsing."""
 
@@ -20,6 +20,7 @@ from app.services.email_html_parser import extract_primary_table
 from app.services.email_content_utils import (
     extract_fecha_generacion,
     collect_table_texts,
+    parse_email_date,
 )
 from app.services.drive_service import DriveService
 from app.logging_utils import ensure_log_context, bind_log_context
@@ -147,14 +148,15 @@ class EmailService:
 
             if not message_ids:
                 process_logger.info("No se encontraron correos nuevos")
+                end_time = datetime.now()
                 return ProcessingResult(
                     success=True,
                     processed=0,
                     errors=0,
                     details=[],
                     start_time=start_time,
-                    end_time=datetime.now(),
-                    duration_seconds=(datetime.now() - start_time).total_seconds()
+                    end_time=end_time,
+                    duration_seconds=(end_time - start_time).total_seconds()
                 )
 
             process_logger = bind_log_context(
@@ -244,13 +246,7 @@ class EmailService:
             # Extraer información básica
             subject = self._decode_header(email_message['Subject']) if email_message['Subject'] else ""
             sender = email_message['From'] or ""
-            date_str = email_message['Date'] or ""
-
-            # Parsear fecha
-            try:
-                date = email.utils.parsedate_to_datetime(date_str)
-            except:
-                date = datetime.now()
+            date = parse_email_date(email_message['Date'])
 
             # Obtener cuerpo del mensaje
             body = self._get_email_body(email_message)
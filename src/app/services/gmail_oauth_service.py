@@ -3,17 +3,25 @@ Servicio de Gmail con OAuth 2.0 - Reemplaza IMAP para cuentas sin contraseña
 """
 
 import os
-import pickle
-import base64
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+import asyncio
+import random
+import binascii
+import tempfile
+import threading
+from email import policy as email_policy
+from email.message import Message
+from email.parser import BytesParser
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 import structlog
 
 # Google API Libraries
+import httplib2
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
@@ -22,13 +30,49 @@ from googleapiclient.errors import HttpError
 from app.config import Settings
 from app.logging_utils import ensure_log_context, bind_log_context
 from app.models import EmailMessage, EmailAttachment, ProcessingResult
-from app.services.validators import validate_email_structure, validate_table_structure
+from app.services.validators import (
+    compile_subject_pattern,
+    subject_matches_pattern,
+    validate_email_structure,
+    validate_table_structure,
+)
 from app.services.email_html_parser import extract_primary_table
 from app.services.email_content_utils import (
     extract_fecha_generacion,
     collect_table_texts,
+    parse_email_date,
 )
 from app.services.drive_service import DriveService
+from app.services.oauth_token_store import load_token, save_token
+from app.services.rate_limiter import AsyncTokenBucket
+
+
+# Proyecciones ``fields`` para pedir a Gmail API solo lo que se consume
+_LIST_FIELDS = 'messages(id)'
+_PREFILTER_HEADERS = ['Subject', 'From']
+_SEARCH_HEADERS = ['Subject', 'From', 'Date']
+_METADATA_GET_FIELDS = 'id,payload/headers'
+_SEARCH_GET_FIELDS = 'id,payload(mimeType,headers)'
+_RAW_GET_FIELDS = 'id,raw'
+_LABELS_LIST_FIELDS = 'labels(id,name)'
+_MODIFY_FIELDS = 'id'
+
+# Traducción base64url -> base64 estándar, construida una sola vez
+_URL_TO_STD = str.maketrans('-_', '+/')
+
+
+def _decode_base64url(data: str) -> bytes:
+    """Decodificar base64url con el decodificador C de binascii (sin copias intermedias en Python)"""
+    return binascii.a2b_base64(data.translate(_URL_TO_STD))
+
+
+# Parser RFC 822 reutilizable: solo guarda la política, cada parsebytes crea su propio FeedParser
+_RAW_PARSER = BytesParser(policy=email_policy.default)
+
+# Unidades de cuota Gmail API que consume cada messages.list/get/modify y labels.create
+_QUOTA_UNITS_PER_MESSAGE_CALL = 5
+# Unidades de cuota de las llamadas ligeras: getProfile y labels.list
+_QUOTA_UNITS_LIGHT_CALL = 1
 
 
 class GmailOAuthService:
@@ -42,6 +86,27 @@ class GmailOAuthService:
         'https://www.googleapis.com/auth/drive',
     ]
 
+    # Límite de subsolicitudes por BatchHttpRequest admitido por Gmail API
+    BATCH_MAX_REQUESTS = 100
+
+    # Tamaño a partir del cual los attachments se vuelcan de memoria a disco
+    ATTACHMENT_SPOOL_MAX_BYTES = 1 << 20
+
+    # Mensajes raw (base64) mayores a este tamaño se decodifican y parsean fuera del event loop
+    OFFLOAD_DECODE_MIN_BYTES = 256 * 1024
+
+    # Timeout (segundos) de cada solicitud HTTP hacia Gmail API
+    HTTP_TIMEOUT_SECONDS = 30
+
+    # Renovar el token antes de que expire para no fallar a mitad de un lote
+    TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+    # Reintentos con backoff exponencial ante errores transitorios de Gmail API
+    RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+    RETRY_MAX_ATTEMPTS = 5
+    RETRY_BASE_SECONDS = 1.0
+    RETRY_MAX_SECONDS = 32.0
+
     def __init__(self, settings: Settings, drive_service: Optional[DriveService] = None):
         self.settings = settings
         self.logger = structlog.get_logger("email_service").bind(
@@ -50,49 +115,116 @@ class GmailOAuthService:
         )
         self.credentials = None
         self.gmail_service = None
+        self._http: Optional[AuthorizedHttp] = None
+        self._thread_local = threading.local()
+        # Un AuthorizedHttp vigente por hilo worker (por ``threading.get_ident``)
+        self._thread_https: Dict[int, AuthorizedHttp] = {}
+        self._thread_https_lock = threading.Lock()
         self._authenticated = False
         self.drive_service = drive_service
+        self._label_id_cache: Dict[str, str] = {}
+        self._pending_processed_marks: List[str] = []
+        self._pending_rejected_marks: List[str] = []
+        self._auth_lock = asyncio.Lock()
+        self._batcher = _AsyncBatcher(self, max_size=self.BATCH_MAX_REQUESTS)
+        self._rate_limiter = AsyncTokenBucket(self.settings.gmail_quota_units_per_second)
+        self._processing_semaphore = asyncio.Semaphore(self.settings.gmail_concurrency)
+        self._subject_re = compile_subject_pattern(self.settings.email_subject_pattern)
+        self._subject_search_query = f'subject:"{self.settings.email_subject_pattern}"'
+        self._subject_query = f'{self._subject_search_query} is:unread'
+        if self.settings.rejected_label:
+            # Los rechazos definitivos siguen sin leer, pero no vuelven a listarse en cada ejecución
+            self._subject_query += f' -label:{self.settings.rejected_label.replace(" ", "-")}'
+
+    def _has_valid_session(self) -> bool:
+        return bool(
+            self._authenticated
+            and self.gmail_service is not None
+            and self.credentials is not None
+            and not self._needs_refresh(self.credentials)
+        )
+
+    @classmethod
+    def _needs_refresh(cls, creds: Credentials) -> bool:
+        """Credenciales inválidas o a menos de ``TOKEN_REFRESH_MARGIN`` de expirar."""
+        if not creds.valid:
+            return True
+        expiry = getattr(creds, 'expiry', None)
+        if not isinstance(expiry, datetime):
+            return False
+        # google-auth maneja ``expiry`` como UTC sin zona horaria
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return expiry - now <= cls.TOKEN_REFRESH_MARGIN
 
     async def authenticate(self) -> bool:
         """Autenticar con Gmail usando OAuth 2.0"""
+        if self._has_valid_session():
+            return True
+
         context = ensure_log_context(etapa="gmail_oauth")
         logger = bind_log_context(self.logger, context)
 
-        try:
-            creds = None
-
-            # Verificar si ya tenemos credenciales guardadas
-            if os.path.exists(self.settings.google_token_path):
-                with open(self.settings.google_token_path, 'rb') as token:
-                    creds = pickle.load(token)
-
-            # Si no hay credenciales válidas, hacer flow OAuth
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    logger.info("Refrescando token de acceso")
-                    creds.refresh(Request())
-                else:
-                    logger.info("Iniciando flow OAuth")
-                    creds = await self._oauth_flow()
+        async with self._auth_lock:
+            # Otra corrutina pudo completar la autenticación mientras esperábamos
+            if self._has_valid_session():
+                return True
 
-                # Guardar credenciales para futuras ejecuciones
-                with open(self.settings.google_token_path, 'wb') as token:
-                    pickle.dump(creds, token)
+            try:
+                # Con una sesión ya construida solo hace falta refrescar el token en memoria
+                session_active = self._authenticated and self.gmail_service is not None
+                creds = self.credentials if session_active else None
 
-            self.credentials = creds
-            self.gmail_service = build('gmail', 'v1', credentials=creds)
-            self._authenticated = True
+                # Verificar si ya tenemos credenciales guardadas
+                if creds is None:
+                    try:
+                        creds = load_token(self.settings.google_token_path, self.SCOPES)
+                    except ValueError as exc:
+                        logger.warning("Token OAuth existente inválido, se regenerará", error=str(exc))
+                        creds = None
+
+                # Si no hay credenciales válidas, hacer flow OAuth
+                if not creds or self._needs_refresh(creds):
+                    previous_token = creds.token if creds else None
+                    if creds and creds.refresh_token:
+                        logger.info("Refrescando token de acceso")
+                        await asyncio.to_thread(creds.refresh, Request())
+                    else:
+                        logger.info("Iniciando flow OAuth")
+                        creds = await self._oauth_flow()
+
+                    # Guardar credenciales solo si el token realmente cambió
+                    if creds.token != previous_token:
+                        save_token(self.settings.google_token_path, creds)
+
+                if session_active and creds is self.credentials:
+                    # AuthorizedHttp y el servicio comparten el objeto de credenciales refrescado
+                    logger.info("Token de acceso renovado sin reconstruir el servicio")
+                    return True
+
+                self.credentials = creds
+                if self._http is not None:
+                    self._http.http.close()
+                # Un solo AuthorizedHttp (conexiones persistentes) y el discovery empaquetado en la librería
+                self._http = AuthorizedHttp(creds, http=httplib2.Http(timeout=self.HTTP_TIMEOUT_SECONDS))
+                self.gmail_service = build(
+                    'gmail',
+                    'v1',
+                    http=self._http,
+                    cache_discovery=False,
+                    static_discovery=True,
+                )
+                self._authenticated = True
 
-            if self.drive_service:
-                self.drive_service.set_oauth_credentials(creds)
+                if self.drive_service:
+                    self.drive_service.set_oauth_credentials(creds)
 
-            logger.info("Autenticación OAuth exitosa")
-            return True
+                logger.info("Autenticación OAuth exitosa")
+                return True
 
-        except Exception as e:
-            self._authenticated = False
-            logger.error("Error en autenticación OAuth", error=str(e))
-            return False
+            except Exception as e:
+                self._authenticated = False
+                logger.error("Error en autenticación OAuth", error=str(e))
+                return False
 
     async def _oauth_flow(self) -> Credentials:
         """Ejecutar flow OAuth 2.0"""
@@ -134,7 +266,8 @@ class GmailOAuthService:
                 return False
 
             # Test simple: obtener perfil del usuario
-            profile = self.gmail_service.users().getProfile(userId='me').execute()
+            await self._rate_limiter.acquire(_QUOTA_UNITS_LIGHT_CALL)
+            profile = await self._execute(self.gmail_service.users().getProfile(userId='me'))
             email_address = profile.get('emailAddress', 'unknown')
 
             logger.info("Conexión Gmail API exitosa", email_address=email_address)
@@ -154,24 +287,27 @@ class GmailOAuthService:
             await self.authenticate()
 
             if not self._authenticated:
+                end_time = datetime.now()
                 return ProcessingResult(
                     success=False,
                     processed=0,
                     errors=1,
                     details=[{"error": "No se pudo autenticar con Gmail API"}],
                     start_time=start_time,
-                    end_time=datetime.now(),
-                    duration_seconds=(datetime.now() - start_time).total_seconds()
+                    end_time=end_time,
+                    duration_seconds=(end_time - start_time).total_seconds()
                 )
 
-            query = f'subject:"{self.settings.email_subject_pattern}" is:unread'
-
             try:
-                results = self.gmail_service.users().messages().list(
-                    userId='me',
-                    q=query,
-                    maxResults=50,
-                ).execute()
+                await self._rate_limiter.acquire(_QUOTA_UNITS_PER_MESSAGE_CALL)
+                results = await self._execute(
+                    self.gmail_service.users().messages().list(
+                        userId='me',
+                        q=self._subject_query,
+                        maxResults=50,
+                        fields=_LIST_FIELDS,
+                    )
+                )
                 messages = results.get('messages', [])
 
             except HttpError as exc:
@@ -180,26 +316,28 @@ class GmailOAuthService:
                     error_code=exc.resp.status if exc.resp else None,
                     error_details=str(exc),
                 )
+                end_time = datetime.now()
                 return ProcessingResult(
                     success=False,
                     processed=0,
                     errors=1,
                     details=[{"error": f"Gmail API error: {exc}"}],
                     start_time=start_time,
-                    end_time=datetime.now(),
-                    duration_seconds=(datetime.now() - start_time).total_seconds()
+                    end_time=end_time,
+                    duration_seconds=(end_time - start_time).total_seconds()
                 )
 
             if not messages:
                 process_logger.info("No se encontraron correos nuevos")
+                end_time = datetime.now()
                 return ProcessingResult(
                     success=True,
                     processed=0,
                     errors=0,
                     details=[],
                     start_time=start_time,
-                    end_time=datetime.now(),
-                    duration_seconds=(datetime.now() - start_time).total_seconds()
+                    end_time=end_time,
+                    duration_seconds=(end_time - start_time).total_seconds()
                 )
 
             process_logger = bind_log_context(
@@ -211,45 +349,106 @@ class GmailOAuthService:
             results_list: List[Dict[str, Any]] = []
             processed_count = 0
             error_count = 0
+            self._pending_processed_marks = []
+            self._pending_rejected_marks = []
+
+            message_ids = [msg_data.get('id') for msg_data in messages]
+
+            # Etapa 1: solo headers, para descartar asuntos ajenos sin descargar el cuerpo
+            metadata, _ = await self._batch_get_messages(
+                message_ids,
+                process_logger,
+                format='metadata',
+                metadataHeaders=_PREFILTER_HEADERS,
+                fields=_METADATA_GET_FIELDS,
+            )
 
-            import asyncio
+            candidate_ids: List[str] = []
+            for msg_id in message_ids:
+                payload_headers = metadata.get(msg_id, {}).get('payload', {}).get('headers')
+                if payload_headers is None:
+                    # Sin metadata se decide tras descargar el mensaje completo
+                    candidate_ids.append(msg_id)
+                    continue
+
+                headers = self._header_map(payload_headers)
+                subject = headers.get('subject', '')
+                if subject_matches_pattern(subject, self._subject_re):
+                    candidate_ids.append(msg_id)
+                    continue
 
-            for msg_data in messages:
-                msg_id = msg_data.get('id')
                 message_context = ensure_log_context(process_context, message_id=msg_id)
-                message_logger = bind_log_context(self.logger, message_context)
+                bind_log_context(self.logger, message_context).warning(
+                    "Mensaje descartado: el asunto no coincide con el patrón",
+                    subject=subject,
+                )
+                await self._mark_message_processed(msg_id, rejected=True, base_context=message_context)
+                error_count += 1
+                results_list.append({
+                    'success': False,
+                    'message_id': msg_id,
+                    'subject': subject,
+                    'sender': headers.get('from', ''),
+                    'validation_errors': ['subject_pattern_mismatch'],
+                    'parsed_table': None,
+                    'table_errors': [],
+                })
+
+            # Etapa 2: RFC 822 completo solo para los mensajes candidatos
+            raw_messages, raw_errors = await self._batch_get_messages(
+                candidate_ids,
+                process_logger,
+                format='raw',
+                fields=_RAW_GET_FIELDS,
+            )
 
-                try:
-                    message = self.gmail_service.users().messages().get(
-                        userId='me',
-                        id=msg_id,
-                        format='full',
-                    ).execute()
+            async def _process_candidate(msg_id: str) -> Dict[str, Any]:
+                async with self._processing_semaphore:
+                    message = raw_messages.get(msg_id)
+                    if message is None:
+                        raise RuntimeError(raw_errors.get(msg_id, "Mensaje no disponible en Gmail API"))
 
-                    result = await self._process_single_message(
+                    return await self._process_single_message(
                         message,
                         msg_id,
-                        base_context=message_context,
+                        base_context=ensure_log_context(process_context, message_id=msg_id),
                     )
-                    results_list.append(result)
 
-                    if result['success']:
-                        processed_count += 1
-                    else:
-                        error_count += 1
+            outcomes = await asyncio.gather(
+                *(_process_candidate(msg_id) for msg_id in candidate_ids),
+                return_exceptions=True,
+            )
 
-                except Exception as exc:  # noqa: BLE001
+            for msg_id, outcome in zip(candidate_ids, outcomes, strict=True):
+                if isinstance(outcome, BaseException):
                     error_count += 1
-                    message_logger.error("Error procesando mensaje individual", error=str(exc))
+                    bind_log_context(
+                        self.logger,
+                        ensure_log_context(process_context, message_id=msg_id),
+                    ).error("Error procesando mensaje individual", error=str(outcome))
                     results_list.append({
                         'success': False,
-                        'error': str(exc),
+                        'error': str(outcome),
                         'message_id': msg_id,
                         'parsed_table': None,
                         'table_errors': ['processing_exception'],
                     })
+                    continue
+
+                results_list.append(outcome)
+                if outcome['success']:
+                    processed_count += 1
+                else:
+                    error_count += 1
+                # Las excepciones (transitorias) dejan el mensaje pendiente; una validación fallida es definitiva
+                if outcome['success'] or 'processing_exception' not in outcome.get('table_errors', ()):
+                    await self._mark_message_processed(
+                        msg_id,
+                        rejected=not outcome['success'],
+                        base_context=ensure_log_context(process_context, message_id=msg_id),
+                    )
 
-                await asyncio.sleep(0.5)
+            await self._flush_processed_marks(base_context=process_context)
 
             end_time = datetime.now()
             duration = (end_time - start_time).total_seconds()
@@ -295,59 +494,45 @@ class GmailOAuthService:
         """Procesar un mensaje individual usando Gmail API"""
         message_context = ensure_log_context(base_context, etapa="recepcion_correo", message_id=msg_id)
         logger = bind_log_context(self.logger, message_context)
+        attachments: List[EmailAttachment] = []
 
         try:
-            headers = message['payload']['headers']
-            subject = self._get_header_value(headers, 'Subject')
-            sender = self._get_header_value(headers, 'From')
-            date_str = self._get_header_value(headers, 'Date')
-
-            try:
-                date = datetime.fromisoformat(date_str.replace('Z', '+00:00').replace('+0000', '+00:00'))
-            except Exception:  # noqa: BLE001
-                date = datetime.now()
-
-            body = self._get_message_body(message['payload'])
-            html_body = self._get_html_body(message['payload'])
-
-            parsed_table, parse_errors = extract_primary_table(html_body or "")
-            table_texts = collect_table_texts(parsed_table)
-
-            fecha_generacion = extract_fecha_generacion(
+            raw_b64 = message['raw']
+            if len(raw_b64) > self.OFFLOAD_DECODE_MIN_BYTES:
+                # Decodificar varios MB bloquearía el event loop: se delega a un hilo
+                parsed_raw = await asyncio.to_thread(self._parse_raw_message, raw_b64)
+            else:
+                parsed_raw = self._parse_raw_message(raw_b64)
+            headers, body, html_body, raw_attachments = parsed_raw
+            subject = headers.get('subject', '')
+            sender = headers.get('from', '')
+            date = parse_email_date(headers.get('date'))
+
+            # El parseo HTML y las expresiones regulares se ejecutan fuera del event loop
+            parsed_table, parse_errors, fecha_generacion = await asyncio.to_thread(
+                self._cpu_parse,
                 logger,
-                body,
                 html_body,
+                body,
                 subject,
-                table_texts,
             )
 
-            attachments: List[EmailAttachment] = []
-            if 'parts' in message['payload']:
-                for part in self._get_all_parts(message['payload']):
-                    if part.get('filename'):
-                        attachment_id = (
-                            part.get('body', {}).get('attachmentId')
-                            if isinstance(part.get('body'), dict)
-                            else None
-                        )
-                        if not attachment_id:
-                            continue
-                        attachment_data = self._get_attachment_data(msg_id, attachment_id)
-                        if attachment_data:
-                            attachments.append(EmailAttachment(
-                                filename=part['filename'],
-                                size=len(attachment_data),
-                                content_type=part.get('mimeType', ''),
-                                data=attachment_data,
-                            ))
-
-            await self._mark_message_processed(msg_id, base_context=message_context)
+            attachments = [
+                EmailAttachment(
+                    filename=filename,
+                    size=len(attachment_data),
+                    content_type=content_type,
+                    stream=self._spool_attachment(attachment_data),
+                )
+                for filename, content_type, attachment_data in raw_attachments
+            ]
+            del raw_attachments
 
             is_valid, validation_errors = validate_email_structure(
                 subject=subject,
                 fecha_generacion=fecha_generacion,
                 attachments=attachments,
-                expected_subject_pattern=self.settings.email_subject_pattern,
+                expected_subject_pattern=self._subject_re,
             )
 
             table_errors = list(parse_errors)
@@ -381,7 +566,9 @@ class GmailOAuthService:
                             etapa="drive_upload",
                             drive_folder_id=drive_folder_id,
                         )
-                        folder_id, uploaded, errors = self.drive_service.upload_attachments(
+                        # Subida bloqueante (googleapiclient): en un hilo para no detener a los demás mensajes
+                        folder_id, uploaded, errors = await asyncio.to_thread(
+                            self.drive_service.upload_attachments,
                             fecha_generacion,
                             attachments,
                             distrito,
@@ -473,144 +660,315 @@ class GmailOAuthService:
                 'drive_upload_errors': [{'code': 'drive_upload_failed', 'message': str(exc)}],
             }
 
-    def _get_header_value(self, headers: List[Dict], name: str) -> str:
-        """Obtener valor de header específico"""
+        finally:
+            for attachment in attachments:
+                if attachment.stream is not None:
+                    attachment.stream.close()
+
+    @staticmethod
+    def _header_map(headers: List[Dict[str, str]]) -> Dict[str, str]:
+        """Indexar headers de Gmail API por nombre en minúsculas (conserva el primero)"""
+        header_map: Dict[str, str] = {}
         for header in headers:
-            if header['name'].lower() == name.lower():
-                return header['value']
-        return ""
-
-    def _get_message_body(self, payload: Dict) -> str:
-        """Extraer cuerpo del mensaje"""
-        body = ""
-
-        if 'body' in payload and payload['body'].get('data'):
-            # Cuerpo simple
-            body_data = payload['body']['data']
-            body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore')
-
-        elif 'parts' in payload:
-            # Cuerpo multipart
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        part_data = part['body']['data']
-                        body += base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-                elif part['mimeType'] == 'text/html':
-                    # Si no hay texto plano, usar HTML
-                    if not body and 'data' in part['body']:
-                        part_data = part['body']['data']
-                        body += base64.urlsafe_b64decode(part_data).decode('utf-8', errors='ignore')
-
-        return body.strip()
-
-    def _get_html_body(self, payload: Dict) -> str:
-        """Extraer cuerpo HTML del mensaje (concatenado)."""
-        fragments: List[str] = []
-
-        mime_type = payload.get('mimeType')
-        body = payload.get('body', {})
-        data = body.get('data') if isinstance(body, dict) else None
-
-        if mime_type == 'text/html' and data:
-            fragments.append(base64.urlsafe_b64decode(data).decode('utf-8', errors='ignore'))
-
-        for part in payload.get('parts', []) or []:
-            html_part = self._get_html_body(part)
-            if html_part:
-                fragments.append(html_part)
-
-        return "\n".join(fragment for fragment in fragments if fragment).strip()
-
-    def _get_all_parts(self, payload: Dict) -> List[Dict]:
-        """Obtener todas las partes del mensaje recursivamente"""
-        parts = []
-
-        if 'parts' in payload:
-            for part in payload['parts']:
-                parts.append(part)
-                # Llamada recursiva para partes anidadas
-                parts.extend(self._get_all_parts(part))
-
-        return parts
-
-    def _get_attachment_data(self, message_id: str, part_id: str) -> Optional[bytes]:
-        """Obtener datos de attachment específico"""
-        try:
-            attachment = self.gmail_service.users().messages().attachments().get(
-                userId='me',
-                messageId=message_id,
-                id=part_id
-            ).execute()
+            header_map.setdefault(header['name'].lower(), header['value'])
+        return header_map
+
+    def _parse_raw_message(
+        self,
+        raw_b64: str,
+    ) -> Tuple[Dict[str, str], str, str, List[Tuple[str, str, bytes]]]:
+        """Parsear el RFC 822 completo (``format='raw'``) en una sola pasada.
+
+        Returns:
+            Tupla ``(headers, cuerpo_texto, cuerpo_html, attachments)``. ``headers`` usa los
+            nombres en minúsculas como clave y cada attachment es ``(filename, content_type, bytes)``.
+            Si no hay partes ``text/plain`` el cuerpo de texto usa el HTML como respaldo.
+        """
+        mime_message = _RAW_PARSER.parsebytes(_decode_base64url(raw_b64))
+        headers: Dict[str, str] = {}
+        for name, value in mime_message.items():
+            headers.setdefault(name.lower(), str(value))
+
+        text_fragments: List[str] = []
+        html_fragments: List[str] = []
+        attachments: List[Tuple[str, str, bytes]] = []
+
+        for part in self._iter_leaf_parts(mime_message):
+            content_type = part.get_content_type()
+            filename = part.get_filename()
+            if filename:
+                attachment_data = part.get_payload(decode=True)
+                if attachment_data:
+                    attachments.append((filename, content_type, attachment_data))
+                continue
+
+            if content_type == 'text/plain':
+                text_fragments.append(self._decode_text_part(part))
+            elif content_type == 'text/html':
+                html_fragments.append(self._decode_text_part(part))
+
+        html_body = "\n".join(fragment for fragment in html_fragments if fragment).strip()
+        body = "".join(text_fragments).strip() or html_body
+
+        return headers, body, html_body, attachments
+
+    def _spool_attachment(self, data: bytes) -> tempfile.SpooledTemporaryFile:
+        """Copiar el attachment a un archivo temporal que pasa a disco al superar el umbral"""
+        spool = tempfile.SpooledTemporaryFile(
+            max_size=self.ATTACHMENT_SPOOL_MAX_BYTES,
+            dir=self.settings.attachment_staging_dir,
+        )
+        spool.write(data)
+        spool.seek(0)
+        return spool
+
+    @staticmethod
+    def _iter_leaf_parts(root: Message) -> Iterator[Message]:
+        """Recorrer iterativamente (pila, preorden) las partes hoja de un mensaje MIME"""
+        stack: List[Message] = [root]
+        while stack:
+            part = stack.pop()
+            if part.is_multipart():
+                stack.extend(reversed(part.get_payload()))
+            else:
+                yield part
+
+    @staticmethod
+    def _cpu_parse(
+        logger: Any,
+        html_body: str,
+        body: str,
+        subject: str,
+    ) -> Tuple[Optional[Dict[str, Any]], List[str], Optional[str]]:
+        """Extraer tabla principal y fecha de generación (trabajo CPU, apto para un hilo)"""
+        parsed_table, parse_errors = extract_primary_table(html_body or "")
+        table_texts = collect_table_texts(parsed_table)
+        fecha_generacion = extract_fecha_generacion(
+            logger,
+            body,
+            html_body,
+            subject,
+            table_texts,
+        )
+        return parsed_table, parse_errors, fecha_generacion
 
-            return base64.urlsafe_b64decode(attachment['data'])
+    @staticmethod
+    def _decode_text_part(part: Message) -> str:
+        """Decodificar una parte de texto respetando su charset declarado."""
+        payload = part.get_payload(decode=True)
+        if not payload:
+            return ""
 
-        except Exception as e:
-            self.logger.error("Error obteniendo attachment",
-                            message_id=message_id,
-                            part_id=part_id,
-                            error=str(e))
-            return None
+        charset = part.get_content_charset() or 'utf-8'
+        try:
+            return payload.decode(charset, errors='ignore')
+        except LookupError:
+            return payload.decode('utf-8', errors='ignore')
 
     async def _mark_message_processed(
         self,
         message_id: str,
         *,
+        rejected: bool = False,
         base_context: Optional[Dict[str, Any]] = None,
-    ):
-        """Marcar mensaje como procesado"""
-        context = ensure_log_context(base_context, etapa="recepcion_correo", message_id=message_id)
+    ) -> None:
+        """Encolar el mensaje para marcarlo como procesado (o rechazado) en el siguiente lote"""
+        context = ensure_log_context(base_context, etapa="gmail_mark_processed", message_id=message_id)
         logger = bind_log_context(self.logger, context)
 
+        if rejected:
+            self._pending_rejected_marks.append(message_id)
+        else:
+            self._pending_processed_marks.append(message_id)
+        logger.debug("Mensaje encolado para marcar como procesado", rechazado=rejected)
+
+    async def _flush_processed_marks(self, *, base_context: Optional[Dict[str, Any]] = None) -> None:
+        """Marcar y etiquetar los mensajes encolados mediante BatchHttpRequest.
+
+        Los procesados se marcan como leídos con ``processed_label``; los rechazados reciben
+        ``rejected_label`` y siguen sin leer (sin esa etiqueta se marcan como leídos).
+        """
+        processed, rejected = self._pending_processed_marks, self._pending_rejected_marks
+        self._pending_processed_marks, self._pending_rejected_marks = [], []
+        pending = processed + rejected
+        if not pending:
+            return
+
+        context = ensure_log_context(base_context, etapa="gmail_mark_processed", total=len(pending))
+        logger = bind_log_context(self.logger, context)
+        failed: List[str] = []
+        retry_ids: List[str] = []
+        attempt = 1
+
+        def _on_modify(request_id: str, _response: Any, exception: Optional[Exception]) -> None:
+            if exception is None:
+                return
+            status = getattr(getattr(exception, 'resp', None), 'status', None)
+            if status in self.RETRYABLE_STATUSES and attempt < self.RETRY_MAX_ATTEMPTS:
+                retry_ids.append(request_id)
+                return
+            failed.append(request_id)
+            logger.error(
+                "Error marcando mensaje como procesado",
+                message_id=request_id,
+                error=str(exception),
+            )
+
         try:
-            # Marcar como leído
-            self.gmail_service.users().messages().modify(
-                userId='me',
-                id=message_id,
-                body={'removeLabelIds': ['UNREAD']}
-            ).execute()
-
-            # Agregar etiqueta si existe
-            if self.settings.processed_label:
-                try:
-                    # Crear etiqueta si no existe
-                    label_result = self.gmail_service.users().labels().create(
-                        userId='me',
-                        body={'name': self.settings.processed_label}
-                    ).execute()
+            # Marcar como leído y etiquetar en una sola llamada por mensaje
+            bodies: Dict[str, Dict[str, List[str]]] = {}
+            if processed:
+                body: Dict[str, List[str]] = {'removeLabelIds': ['UNREAD']}
+                if self.settings.processed_label:
+                    body['addLabelIds'] = [await self._resolve_label_id(self.settings.processed_label)]
+                bodies.update(dict.fromkeys(processed, body))
+            if rejected:
+                if self.settings.rejected_label:
+                    body = {'addLabelIds': [await self._resolve_label_id(self.settings.rejected_label)]}
+                else:
+                    body = {'removeLabelIds': ['UNREAD']}
+                bodies.update(dict.fromkeys(rejected, body))
+
+            messages_api = self.gmail_service.users().messages()
+            remaining = pending
+            while remaining:
+                await self._execute_batch(
+                    [
+                        (
+                            message_id,
+                            messages_api.modify(userId='me', id=message_id, body=bodies[message_id], fields=_MODIFY_FIELDS),
+                        )
+                        for message_id in remaining
+                    ],
+                    _on_modify,
+                )
+                if not retry_ids:
+                    break
+
+                # Subsolicitudes con 429/5xx: se reenvían solas tras el backoff
+                remaining, retry_ids = retry_ids, []
+                await asyncio.sleep(self.RETRY_BASE_SECONDS * (2 ** (attempt - 1)))
+                attempt += 1
+
+            logger.info(
+                "Mensajes marcados como procesados",
+                processed=len(pending) - len(failed),
+                rejected=len(rejected),
+                errors=len(failed),
+            )
 
-                    label_id = label_result['id']
+        except Exception as e:
+            logger.error("Error marcando mensajes como procesados", error=str(e))
 
-                    # Agregar etiqueta al mensaje
-                    self.gmail_service.users().messages().modify(
-                        userId='me',
-                        id=message_id,
-                        body={'addLabelIds': [label_id]}
-                    ).execute()
-
-                except HttpError as e:
-                    # Etiqueta ya existe
-                    if e.resp.status == 409:
-                        # Obtener ID de etiqueta existente
-                        labels = self.gmail_service.users().labels().list(userId='me').execute()
-                        for label in labels['labels']:
-                            if label['name'] == self.settings.processed_label:
-                                label_id = label['id']
-                                break
-
-                        # Agregar etiqueta al mensaje
-                        self.gmail_service.users().messages().modify(
-                            userId='me',
-                            id=message_id,
-                            body={'addLabelIds': [label_id]}
-                        ).execute()
-                    else:
-                        raise
+    async def _execute(self, request: Any, **execute_kwargs: Any) -> Any:
+        """Ejecutar una solicitud en un hilo, reintentando 429/5xx con backoff exponencial"""
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.to_thread(self._execute_in_thread, request, execute_kwargs)
+            except HttpError as exc:
+                attempt += 1
+                status = exc.resp.status if exc.resp else None
+                if status not in self.RETRYABLE_STATUSES or attempt >= self.RETRY_MAX_ATTEMPTS:
+                    raise
+
+                delay = self._retry_delay(exc, attempt)
+                bind_log_context(self.logger, ensure_log_context(etapa="gmail_api")).warning(
+                    "Error transitorio en Gmail API, reintentando",
+                    error_code=status,
+                    attempt=attempt,
+                    delay_seconds=round(delay, 2),
+                )
+                await asyncio.sleep(delay)
+
+    def _execute_in_thread(self, request: Any, execute_kwargs: Dict[str, Any]) -> Any:
+        """Ejecutar ``request`` con un AuthorizedHttp propio del hilo del pool (httplib2 no es thread-safe)"""
+        if self._http is not None and 'http' not in execute_kwargs:
+            execute_kwargs = {**execute_kwargs, 'http': self._thread_http()}
+        return request.execute(**execute_kwargs)
+
+    def _thread_http(self) -> AuthorizedHttp:
+        http = getattr(self._thread_local, 'http', None)
+        if http is None or http.credentials is not self.credentials:
+            http = self._new_worker_http()
+            self._thread_local.http = http
+            # Tras renovar credenciales (o si se reutiliza el id de un hilo) se cierra el cliente anterior
+            with self._thread_https_lock:
+                previous = self._thread_https.get(threading.get_ident())
+                self._thread_https[threading.get_ident()] = http
+            if previous is not None:
+                previous.http.close()
+        return http
+
+    def _retry_delay(self, exc: HttpError, attempt: int) -> float:
+        """Calcular espera: ``Retry-After`` si viene en la respuesta, si no backoff exponencial con jitter"""
+        headers = exc.resp if isinstance(exc.resp, dict) else {}
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return min(self.RETRY_MAX_SECONDS, float(retry_after))
+            except ValueError:
+                pass
 
-            logger.info("Mensaje marcado como procesado")
+        backoff = min(self.RETRY_MAX_SECONDS, self.RETRY_BASE_SECONDS * (2 ** (attempt - 1)))
+        return backoff + random.uniform(0, self.RETRY_BASE_SECONDS)
 
-        except Exception as e:
-            logger.error("Error marcando mensaje como procesado", error=str(e))
+    async def _execute_batch(
+        self,
+        requests: List[Tuple[str, Any]],
+        callback: Callable[[str, Any, Optional[Exception]], None],
+    ) -> None:
+        """Ejecutar subsolicitudes en BatchHttpRequest de hasta BATCH_MAX_REQUESTS elementos"""
+        for start in range(0, len(requests), self.BATCH_MAX_REQUESTS):
+            chunk = requests[start:start + self.BATCH_MAX_REQUESTS]
+            await self._rate_limiter.acquire(_QUOTA_UNITS_PER_MESSAGE_CALL * len(chunk))
+            batch = self.gmail_service.new_batch_http_request(callback=callback)
+            for request_id, request in chunk:
+                batch.add(request, request_id=request_id)
+            await self._execute(batch)
+
+    async def _batch_get_messages(
+        self,
+        message_ids: List[str],
+        logger: Any,
+        **get_kwargs: Any,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """Obtener varios mensajes con ``messages.get`` mediante lotes de tamaño dinámico.
+
+        Returns:
+            Tupla ``(respuestas, errores)`` indexadas por ID de mensaje.
+        """
+        return await self._batcher.fetch_all(message_ids, logger, **get_kwargs)
+
+    def _new_worker_http(self) -> AuthorizedHttp:
+        """Crear un AuthorizedHttp exclusivo para un hilo worker"""
+        return AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.HTTP_TIMEOUT_SECONDS))
+
+    async def _resolve_label_id(self, name: str) -> str:
+        """Obtener el ID de una etiqueta; un solo labels.list llena la caché y solo se crea si falta"""
+        label_id = self._label_id_cache.get(name)
+        if label_id:
+            return label_id
+
+        await self._rate_limiter.acquire(_QUOTA_UNITS_LIGHT_CALL)
+        labels = await self._execute(
+            self.gmail_service.users().labels().list(userId='me', fields=_LABELS_LIST_FIELDS)
+        )
+        self._label_id_cache.update(
+            {label['name']: label['id'] for label in labels.get('labels', []) if label.get('name')}
+        )
+        if name in self._label_id_cache:
+            return self._label_id_cache[name]
+
+        await self._rate_limiter.acquire(_QUOTA_UNITS_PER_MESSAGE_CALL)
+        label_result = await self._execute(
+            self.gmail_service.users().labels().create(
+                userId='me',
+                body={'name': name},
+            )
+        )
+        self._label_id_cache[name] = label_result['id']
+        return label_result['id']
 
     async def search_emails(self, query: Optional[str] = None) -> List[Dict]:
         """Buscar emails usando Gmail API (para testing)"""
@@ -622,47 +980,46 @@ class GmailOAuthService:
             if not self._authenticated:
                 return []
 
-            search_query = query or f'subject:"{self.settings.email_subject_pattern}"'
+            search_query = query or self._subject_search_query
 
             try:
-                results = self.gmail_service.users().messages().list(
-                    userId='me',
-                    q=search_query,
-                    maxResults=10
-                ).execute()
+                messages_api = self.gmail_service.users().messages()
+                await self._rate_limiter.acquire(_QUOTA_UNITS_PER_MESSAGE_CALL)
+                results = await self._execute(
+                    messages_api.list(
+                        userId='me',
+                        q=search_query,
+                        maxResults=10,
+                        fields=_LIST_FIELDS,
+                    )
+                )
 
-                messages = results.get('messages', [])
+                message_ids = [msg_data['id'] for msg_data in results.get('messages', [])]
 
-                emails = []
-                for msg_data in messages:
-                    try:
-                        msg_id = msg_data['id']
-
-                        # Obtener headers básicos
-                        message = self.gmail_service.users().messages().get(
-                            userId='me',
-                            id=msg_id,
-                            format='minimal'
-                        ).execute()
-
-                        headers = message['payload']['headers']
-                        subject = self._get_header_value(headers, 'Subject')
-                        sender = self._get_header_value(headers, 'From')
-                        date_str = self._get_header_value(headers, 'Date')
-
-                        emails.append({
-                            'id': msg_id,
-                            'subject': subject,
-                            'sender': sender,
-                            'date': date_str,
-                            'has_attachments': len(message.get('payload', {}).get('parts', [])) > 1
-                        })
+                # Obtener solo los headers básicos de todos los mensajes en un lote
+                responses, _ = await self._batch_get_messages(
+                    message_ids,
+                    search_logger,
+                    format='metadata',
+                    metadataHeaders=_SEARCH_HEADERS,
+                    fields=_SEARCH_GET_FIELDS,
+                )
 
-                    except Exception as e:
-                        bind_log_context(
-                            search_logger,
-                            ensure_log_context(etapa="gmail_search", message_id=msg_id),
-                        ).error("Error procesando email en búsqueda", error=str(e))
+                emails = []
+                for msg_id in message_ids:
+                    message = responses.get(msg_id)
+                    if message is None:
+                        continue
+
+                    payload = message.get('payload', {})
+                    headers = self._header_map(payload.get('headers', []))
+                    emails.append({
+                        'id': msg_id,
+                        'subject': headers.get('subject', ''),
+                        'sender': headers.get('from', ''),
+                        'date': headers.get('date', ''),
+                        'has_attachments': payload.get('mimeType') == 'multipart/mixed',
+                    })
 
                 return emails
 
@@ -679,9 +1036,147 @@ class GmailOAuthService:
         logger = bind_log_context(self.logger, ensure_log_context(etapa="gmail_oauth"))
 
         try:
+            if self._http is not None:
+                self._http.http.close()
+            self._http = None
+            with self._thread_https_lock:
+                for http in self._thread_https.values():
+                    http.http.close()
+                self._thread_https = {}
+            self._thread_local = threading.local()
             self.gmail_service = None
             self.credentials = None
             self._authenticated = False
+            self._label_id_cache = {}
+            self._pending_processed_marks = []
+            self._pending_rejected_marks = []
             logger.info("Conexión Gmail API cerrada")
         except Exception as e:
             logger.error("Error cerrando conexión Gmail API", error=str(e))
+
+
+class _AsyncBatcher:
+    """Descarga de mensajes en lotes de tamaño dinámico con varios workers concurrentes.
+
+    Cada worker drena una cola de IDs, arma un ``BatchHttpRequest`` con hasta ``batch_size``
+    subsolicitudes y lo ejecuta en un hilo con su propio ``AuthorizedHttp`` (httplib2 no es
+    thread-safe). Ante un 429 el tamaño de lote se reduce a la mitad y los IDs afectados se
+    reencolan; tras ``grow_after`` lotes limpios consecutivos se duplica hasta ``max_size``.
+    """
+
+    def __init__(
+        self,
+        service: "GmailOAuthService",
+        *,
+        workers: int = 2,
+        initial_size: int = 50,
+        min_size: int = 5,
+        max_size: int = 100,
+        grow_after: int = 2,
+        max_retries: int = 3,
+        throttle_backoff_seconds: float = 1.0,
+    ) -> None:
+        self._service = service
+        self._workers = workers
+        self._min_size = min_size
+        self._max_size = max_size
+        self._grow_after = grow_after
+        self._max_retries = max_retries
+        self._throttle_backoff_seconds = throttle_backoff_seconds
+        self._clean_batches = 0
+        self.batch_size = min(initial_size, max_size)
+
+    async def fetch_all(
+        self,
+        message_ids: List[str],
+        logger: Any,
+        **get_kwargs: Any,
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """Obtener los mensajes indicados y devolver ``(respuestas, errores)`` por ID"""
+        responses: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, str] = {}
+        if not message_ids:
+            return responses, errors
+
+        queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        for message_id in message_ids:
+            queue.put_nowait((message_id, 0))
+
+        async def _worker() -> None:
+            http = self._service._new_worker_http()
+            try:
+                while True:
+                    chunk: List[Tuple[str, int]] = []
+                    while len(chunk) < self.batch_size and not queue.empty():
+                        chunk.append(queue.get_nowait())
+                    if not chunk:
+                        return
+
+                    await self._service._rate_limiter.acquire(_QUOTA_UNITS_PER_MESSAGE_CALL * len(chunk))
+                    batch, succeeded, failed = self._build_batch(chunk, get_kwargs)
+                    try:
+                        await self._service._execute(batch, http=http)
+                    except HttpError as exc:
+                        # El lote completo falló tras los reintentos: se reporta cada mensaje
+                        failed = {message_id: exc for message_id, _ in chunk if message_id not in succeeded}
+                    responses.update(succeeded)
+
+                    throttled = False
+                    attempts = dict(chunk)
+                    for message_id, exception in failed.items():
+                        if self._is_rate_limited(exception) and attempts[message_id] < self._max_retries:
+                            throttled = True
+                            queue.put_nowait((message_id, attempts[message_id] + 1))
+                            continue
+                        errors[message_id] = str(exception)
+                        logger.error("Error obteniendo mensaje de Gmail", message_id=message_id, error=str(exception))
+
+                    if throttled:
+                        self._shrink(logger)
+                        await asyncio.sleep(self._throttle_backoff_seconds)
+                    else:
+                        self._grow()
+            finally:
+                # Cada llamada crea sus propios clientes; se liberan sus conexiones keep-alive al terminar
+                http.http.close()
+
+        worker_count = max(1, min(self._workers, -(-len(message_ids) // self.batch_size)))
+        await asyncio.gather(*(_worker() for _ in range(worker_count)))
+        return responses, errors
+
+    def _build_batch(
+        self,
+        chunk: List[Tuple[str, int]],
+        get_kwargs: Dict[str, Any],
+    ) -> Tuple[Any, Dict[str, Dict[str, Any]], Dict[str, Exception]]:
+        succeeded: Dict[str, Dict[str, Any]] = {}
+        failed: Dict[str, Exception] = {}
+
+        def _on_get(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+            if exception is not None:
+                failed[request_id] = exception
+            else:
+                succeeded[request_id] = response
+
+        gmail_service = self._service.gmail_service
+        messages_api = gmail_service.users().messages()
+        batch = gmail_service.new_batch_http_request(callback=_on_get)
+        for message_id, _ in chunk:
+            batch.add(messages_api.get(userId='me', id=message_id, **get_kwargs), request_id=message_id)
+        return batch, succeeded, failed
+
+    @staticmethod
+    def _is_rate_limited(exception: Exception) -> bool:
+        resp = getattr(exception, 'resp', None)
+        return getattr(resp, 'status', None) == 429
+
+    def _shrink(self, logger: Any) -> None:
+        self._clean_batches = 0
+        self.batch_size = max(self._min_size, self.batch_size // 2)
+        logger.warning("Gmail API limitó la tasa de solicitudes; se reduce el lote", batch_size=self.batch_size)
+
+    def _grow(self) -> None:
+        self._clean_batches += 1
+        if self._clean_batches >= self._grow_after and self.batch_size < self._max_size:
+            self._clean_batches = 0
+            self.batch_size = min(self._max_size, self.batch_size * 2)
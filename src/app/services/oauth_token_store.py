@@ -0,0 +1,65 @@
+"""Persistencia del token OAuth compartido por Gmail y Drive."""
+
+from __future__ import annotations
+
+import os
+import pickle
+import tempfile
+from typing import Optional, Sequence
+
+import structlog
+from google.oauth2.credentials import Credentials
+
+logger = structlog.get_logger("oauth_token_store")
+
+
+def load_token(path: str, scopes: Sequence[str]) -> Optional[Credentials]:
+    """Cargar credenciales OAuth desde un token JSON; ``None`` si el archivo no existe.
+
+    Un token heredado en formato pickle se migra a JSON una sola vez, reescribiendo el archivo.
+    Si no es ni JSON ni pickle de ``Credentials`` se lanza ``ValueError``.
+    """
+
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return Credentials.from_authorized_user_file(path, list(scopes))
+    except ValueError as exc:
+        creds = _load_legacy_pickle(path)
+        if creds is None:
+            raise ValueError(f"El token OAuth en {path} no es JSON ni un pickle de Credentials: {exc}") from exc
+
+    save_token(path, creds)
+    logger.warning("token_oauth_pickle_migrado", etapa="oauth_token", token_path=path)
+    return creds
+
+
+def _load_legacy_pickle(path: str) -> Optional[Credentials]:
+    """Leer un token escrito con ``pickle.dump`` por versiones anteriores; ``None`` si no lo es."""
+
+    try:
+        with open(path, "rb") as token_file:
+            creds = pickle.load(token_file)  # noqa: S301 - archivo local propio, formato heredado
+    except Exception:  # noqa: BLE001 - cualquier fallo equivale a "no es un pickle válido"
+        return None
+    return creds if isinstance(creds, Credentials) else None
+
+
+def save_token(path: str, creds: Credentials) -> None:
+    """Escribir el token de forma atómica: archivo temporal en el mismo directorio + ``os.replace``.
+
+    Un lector concurrente (otro proceso o el servicio de Drive) nunca ve un JSON truncado.
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".token-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as token_file:
+            token_file.write(creds.to_json())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
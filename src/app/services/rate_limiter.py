@@ -0,0 +1,48 @@
+"""Limitador de tasa tipo token bucket para llamadas asíncronas a APIs externas."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """Token bucket asíncrono: permite ráfagas hasta ``capacity`` y repone ``rate`` tokens/segundo.
+
+    Solo bloquea cuando el bucket está vacío. Una adquisición mayor que la capacidad espera
+    a que el bucket esté lleno y deja saldo negativo, que se recupera antes de la siguiente.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor a cero")
+
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self._capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Consumir ``tokens``, esperando solo lo necesario para reponerlos."""
+
+        required = min(tokens, self._capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= required:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((required - self._tokens) / self._rate)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def __aenter__(self) -> "AsyncTokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
@@ -2,18 +2,315 @@
 
 from __future__ import annotations
 
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from datetime import date
-from typing import Dict, Iterable, List, Optional
+from datetime import date, timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 from abc import ABC, abstractmethod
 
-from sqlalchemy import create_engine, text
-from sqlalchemy.engine import Engine
+import structlog
+
+from sqlalchemy import Date, Integer, bindparam, create_engine, text
+from sqlalchemy.engine import URL, Engine, make_url
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.elements import BindParameter, TextClause
 
 from app.config import Settings
+from app.services.cache_strategies import InMemoryCacheStrategy
+
+# ``CLIENT.MULTI_STATEMENTS`` de PyMySQL/MySQLdb; permite varios SELECT en un solo ``execute``
+_MYSQL_CLIENT_MULTI_STATEMENTS = 1 << 16
+# Marcadores ``%(nombre)s`` del paramstyle ``pyformat`` (PyMySQL)
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+
+logger = structlog.get_logger("report_data")
+
+
+# Tipos explícitos para los parámetros compartidos por las consultas de reportes
+_BRANCH_ID_PARAM = bindparam("branch_id", type_=Integer)
+# Ventana [start_date, end_date) calculada en Python: el rango sobre la columna de fecha es sargable
+_START_DATE_PARAM = bindparam("start_date", type_=Date)
+_END_DATE_PARAM = bindparam("end_date", type_=Date)
+_BRANCH_IDS_PARAM = bindparam("branch_ids", expanding=True)
+
+
+class _BranchScopedQuery(NamedTuple):
+    """Variantes de una consulta para todas las ramas o para una sola.
+
+    Evita ``(:branch_id IS NULL OR Rama = :branch_id)``: con el filtro explícito el optimizador puede
+    usar el índice por rama y cada forma conserva su propio plan. ``many_branches`` filtra con
+    ``IN :branch_ids`` (parámetro expandible) para consultar varias ramas en un solo viaje.
+    """
+
+    all_branches: TextClause
+    one_branch: TextClause
+    many_branches: TextClause
+
+    @classmethod
+    def build(cls, sql: str, column: str, *params: BindParameter) -> "_BranchScopedQuery":
+        """Crear las variantes reemplazando ``{branch_filter}`` en ``sql``."""
+
+        return cls(
+            text(sql.replace("{branch_filter}", "1 = 1")).bindparams(*params),
+            text(sql.replace("{branch_filter}", f"{column} = :branch_id")).bindparams(_BRANCH_ID_PARAM, *params),
+            text(sql.replace("{branch_filter}", f"{column} IN :branch_ids")).bindparams(_BRANCH_IDS_PARAM, *params),
+        )
+
+    def bind(self, branch_id: Optional[int], params: Dict[str, object]) -> Tuple[TextClause, Dict[str, object]]:
+        if branch_id is None:
+            return self.all_branches, params
+        return self.one_branch, {"branch_id": branch_id, **params}
+
+
+_BRANCH_SUMMARY_QUERY = _BranchScopedQuery.build(
+    """
+    SELECT
+        Rama AS branch_id,
+        Distrito AS district,
+        CAST(Primera_Generacion AS DATE) AS first_generation_date,
+        CAST(Primera_CCM_llegada AS DATE) AS first_ccm_arrival,
+        CAST(Ultima_CCM_salida AS DATE) AS last_ccm_departure,
+        Total_Misioneros AS total_missionaries
+    FROM vwFechasCCMPorDistrito
+    WHERE {branch_filter}
+    ORDER BY district
+    """,
+    "Rama",
+)
+
+# Métricas de KPI en el orden del reporte: (nombre de la métrica, columna agregada)
+_KPI_METRICS = (
+    ("total_missionaries", "total_missionaries"),
+    ("en_ccm", "ccm_count"),
+    ("virtuales", "virtual_count"),
+    ("futuros", "future_count"),
+    ("tres_semanas", "three_week_count"),
+)
+
+# El "unpivot" (una fila por distrito y métrica) se resuelve en el servidor con UNION ALL sobre ``agg``;
+# ``value`` llega ya como DOUBLE no nulo (MySQL 8.0.17+ admite ``CAST(... AS DOUBLE)``)
+_KPI_UNPIVOT = "\n    UNION ALL\n".join(
+    f"    SELECT branch_id, district, '{metric}' AS metric, CAST(COALESCE({column}, 0) AS DOUBLE) AS value, "
+    f"'misioneros' AS unit, {order} AS metric_order FROM agg"
+    for order, (metric, column) in enumerate(_KPI_METRICS)
+)
+
+_DISTRICT_KPIS_QUERY = _BranchScopedQuery.build(
+    f"""
+    WITH agg AS (
+        SELECT
+            Rama AS branch_id,
+            Distrito AS district,
+            COUNT(*) AS total_missionaries,
+            SUM(CASE WHEN Status = 'CCM' THEN 1 ELSE 0 END) AS ccm_count,
+            SUM(CASE WHEN Status = 'Virtual' THEN 1 ELSE 0 END) AS virtual_count,
+            SUM(CASE WHEN Status = 'Futuro' THEN 1 ELSE 0 END) AS future_count,
+            SUM(CASE WHEN tres_semanas = 1 THEN 1 ELSE 0 END) AS three_week_count
+        FROM vwMisioneros
+        WHERE {{branch_filter}}
+        GROUP BY Rama, Distrito
+    )
+{_KPI_UNPIVOT}
+    ORDER BY district, metric_order
+    """,
+    "Rama",
+)
+
+_UPCOMING_ARRIVALS_QUERY = _BranchScopedQuery.build(
+    """
+    SELECT
+        Distrito AS district,
+        RDistrito AS rdistrict,
+        Rama AS branch_id,
+        CCM_llegada AS arrival_date,
+        CCM_salida AS departure_date,
+        COUNT(*) AS missionaries_count,
+        CASE WHEN MAX(tres_semanas) = 1 THEN 3 ELSE 6 END AS duration_weeks
+    FROM vwMisioneros
+    WHERE {branch_filter}
+      AND CCM_llegada >= :start_date
+      AND CCM_llegada < :end_date
+    GROUP BY Distrito, RDistrito, Rama, CCM_llegada, CCM_salida
+    ORDER BY arrival_date ASC, district ASC
+    """,
+    "Rama",
+    _START_DATE_PARAM,
+    _END_DATE_PARAM,
+)
+
+_UPCOMING_BIRTHDAYS_QUERY = _BranchScopedQuery.build(
+    """
+    SELECT
+        ID AS missionary_id,
+        Rama AS branch_id,
+        Distrito AS district,
+        Tratamiento AS treatment,
+        Nombre_del_misionero AS missionary_name,
+        DATE(Fecha_Cumpleanos) AS birthday,
+        Nueva_Edad AS age_turning,
+        Status AS status,
+        Correo_Misional AS email_missionary,
+        Correo_Personal AS email_personal,
+        (tres_semanas <> 0) AS three_weeks_program
+    FROM vwCumpleanosProximos
+    WHERE {branch_filter}
+      AND Fecha_Cumpleanos >= :start_date
+      AND Fecha_Cumpleanos < :end_date
+    ORDER BY birthday ASC, missionary_name ASC
+    """,
+    "Rama",
+    _START_DATE_PARAM,
+    _END_DATE_PARAM,
+)
+
+# Roll-ups materializados (ver docs/sql/fase5_materializaciones.sql). Se reconstruyen con
+# ``refresh_materializations`` y reflejan los datos hasta su columna ``refreshed_at``.
+_BRANCH_SUMMARY_MV_QUERY = _BranchScopedQuery.build(
+    """
+    SELECT
+        branch_id,
+        district,
+        first_generation_date,
+        first_ccm_arrival,
+        last_ccm_departure,
+        total_missionaries
+    FROM mv_branch_summary
+    WHERE {branch_filter}
+    ORDER BY district
+    """,
+    "branch_id",
+)
+
+_DISTRICT_KPIS_MV_QUERY = _BranchScopedQuery.build(
+    f"""
+    WITH agg AS (
+        SELECT
+            branch_id,
+            district,
+            total_missionaries,
+            ccm_count,
+            virtual_count,
+            future_count,
+            three_week_count
+        FROM mv_district_kpis
+        WHERE {{branch_filter}}
+    )
+{_KPI_UNPIVOT}
+    ORDER BY district, metric_order
+    """,
+    "branch_id",
+)
+
+_REFRESH_MATERIALIZATIONS = (
+    ("mv_branch_summary", text("DELETE FROM mv_branch_summary")),
+    (
+        "mv_branch_summary",
+        text(
+            """
+            INSERT INTO mv_branch_summary (
+                branch_id, district, first_generation_date, first_ccm_arrival,
+                last_ccm_departure, total_missionaries, refreshed_at
+            )
+            SELECT
+                Rama,
+                Distrito,
+                CAST(Primera_Generacion AS DATE),
+                CAST(Primera_CCM_llegada AS DATE),
+                CAST(Ultima_CCM_salida AS DATE),
+                Total_Misioneros,
+                CURRENT_TIMESTAMP
+            FROM vwFechasCCMPorDistrito
+            """
+        ),
+    ),
+    ("mv_district_kpis", text("DELETE FROM mv_district_kpis")),
+    (
+        "mv_district_kpis",
+        text(
+            """
+            INSERT INTO mv_district_kpis (
+                branch_id, district, total_missionaries, ccm_count, virtual_count,
+                future_count, three_week_count, refreshed_at
+            )
+            SELECT
+                Rama,
+                Distrito,
+                COUNT(*),
+                SUM(CASE WHEN Status = 'CCM' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN Status = 'Virtual' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN Status = 'Futuro' THEN 1 ELSE 0 END),
+                SUM(CASE WHEN tres_semanas = 1 THEN 1 ELSE 0 END),
+                CURRENT_TIMESTAMP
+            FROM vwMisioneros
+            GROUP BY Rama, Distrito
+            """
+        ),
+    ),
+)
+
+
+_ENGINE_CACHE_SIZE = 4
+
+# Datasets cuyas consultas o filas dependen de ``date.today()``
+_DATE_SCOPED_DATASETS = frozenset({"upcoming_arrivals", "upcoming_birthdays", "district_kpi"})
+_engines: "OrderedDict[Tuple[URL, bool, int, int], Engine]" = OrderedDict()
+_engines_lock = threading.Lock()
+
+
+def _get_engine(url: URL, read_only: bool = False, pool_size: int = 1, max_overflow: int = 1) -> Engine:
+    """Engine compartido por URL: todas las instancias del repositorio reutilizan el mismo pool.
+
+    Con ``read_only`` las conexiones quedan en autocommit y el pool no hace ``ROLLBACK`` al
+    recibirlas de vuelta: un SELECT no abre transacción ni paga ese roundtrip extra. Se conservan
+    ``_ENGINE_CACHE_SIZE`` engines; al desalojar uno se cierran sus conexiones con ``dispose``.
+    """
+
+    key = (url, read_only, pool_size, max_overflow)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is not None:
+            _engines.move_to_end(key)
+            return engine
+
+        if url.get_backend_name() == "sqlite":
+            # SQLite elige su propio pool (SingletonThreadPool en memoria) y no admite max_overflow
+            engine = create_engine(url, pool_pre_ping=True)
+        else:
+            options: Dict[str, Any] = {"isolation_level": "AUTOCOMMIT", "pool_reset_on_return": None} if read_only else {}
+            engine = create_engine(
+                url,
+                pool_pre_ping=True,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_recycle=1800,
+                **options,
+            )
+        _engines[key] = engine
+        if len(_engines) > _ENGINE_CACHE_SIZE:
+            # Un repositorio que aún lo use sigue funcionando: el engine abre un pool nuevo al reutilizarse
+            _engines.popitem(last=False)[1].dispose()
+    return engine
+
+
+# Columnas del dataset sin fuente en las vistas; se agregan a cada fila con ``dict.update``
+_BRANCH_SUMMARY_EXTRAS: Dict[str, object] = {"total_companionships": None, "elders_count": None, "sisters_count": None}
+_UPCOMING_ARRIVAL_EXTRAS: Dict[str, object] = {"status": None}
+
+
+def _rows_to_dicts(columns: Tuple[str, ...], rows: Iterable[Any]) -> Iterator[Dict[str, object]]:
+    """Convertir tuplas del cursor a ``dict`` con ``map``/``zip``/``dict`` (sin bucle en Python)."""
+
+    return map(dict, map(partial(zip, columns), rows))
+
+
+_StatementBuilder = Callable[[Optional[int], Dict[str, object]], Tuple[TextClause, Dict[str, object]]]
+_RowShaper = Callable[[Iterable[Dict[str, object]]], Iterator[Dict[str, object]]]
 
 
 class ReportDataRepositoryError(Exception):
@@ -39,15 +336,99 @@ class ReportDataRepository(ABC):
     def fetch_upcoming_birthdays(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
         raise NotImplementedError
 
+    def refresh_materializations(self) -> Dict[str, int]:
+        """Reconstruir roll-ups precalculados; devuelve filas escritas por tabla (ninguna por defecto)."""
+
+        return {}
+
+    def invalidate(self, dataset_id: Optional[str] = None) -> None:  # noqa: B027 - gancho opcional, no abstracto
+        """Descartar filas cacheadas por el repositorio (no cachea nada por defecto)."""
+
+        return None
+
+    def close(self) -> None:  # noqa: B027 - gancho opcional, no abstracto
+        """Liberar recursos propios del repositorio (ninguno por defecto)."""
+
+        return None
+
+    def fetch_branch_summaries_bulk(self, branch_ids: Iterable[int]) -> Dict[int, List[Dict[str, object]]]:
+        """Resumen por distrito de varias ramas; por defecto una llamada a ``fetch_branch_summary`` por rama."""
+
+        return {branch_id: list(self.fetch_branch_summary(branch_id, {})) for branch_id in sorted(set(branch_ids))}
+
+    def fetch_report_bundle(self, branch_id: Optional[int], params: Dict[str, object]) -> Dict[str, List[Dict[str, object]]]:
+        """Obtener los cuatro datasets de una rama; por defecto con una llamada ``fetch_*`` por dataset."""
+
+        return {
+            "branch_summary": list(self.fetch_branch_summary(branch_id, params)),
+            "district_kpi": list(self.fetch_district_kpis(branch_id, params)),
+            "upcoming_arrivals": list(self.fetch_upcoming_arrivals(branch_id, params)),
+            "upcoming_birthdays": list(self.fetch_upcoming_birthdays(branch_id, params)),
+        }
+
 
 class SQLAlchemyReportDataRepository(ReportDataRepository):
-    """Repositorio basado en SQLAlchemy con consultas a vistas especializadas."""
+    """Repositorio basado en SQLAlchemy con consultas a vistas especializadas.
+
+    Las filas se leen del cursor en lotes de ``FETCH_BATCH_SIZE`` y la conexión se devuelve al
+    pool al agotar (o cerrar) el iterador; ``fetch_*`` las materializa solo si la caché está activa.
+    Cada fila es un ``dict`` nuevo que los ``_shape_*`` completan en sitio, sin copiarlo.
+    """
+
+    FETCH_BATCH_SIZE = 1000
 
     def __init__(self, settings: Settings) -> None:
         if not settings.database_url:
             raise ReportDataRepositoryError("DATABASE_URL no configurada en .env para Fase 5")
-        self._engine: Engine = create_engine(settings.database_url, pool_pre_ping=True)
+        url = make_url(settings.database_url)
+        self._multi_statements = settings.report_bundle_multi_statements and url.get_backend_name() == "mysql"
+        if self._multi_statements:
+            # Se pasa por la URL para que el dialecto conserve sus propios flags (FOUND_ROWS)
+            client_flag = int(url.query.get("client_flag", 0)) | _MYSQL_CLIENT_MULTI_STATEMENTS
+            url = url.update_query_dict({"client_flag": str(client_flag)})
+        self._engine: Engine = _get_engine(url)
+        dialect = self._engine.dialect
+        if self._multi_statements and not (dialect.positional or dialect.paramstyle == "pyformat"):
+            # Solo se saben unir consultas con marcadores posicionales o ``pyformat``
+            logger.warning(
+                "bundle_multi_statements_no_soportado",
+                etapa="fase_5_preparacion",
+                paramstyle=dialect.paramstyle,
+                accion="consultas_por_separado",
+            )
+            self._multi_statements = False
+        # Las lecturas usan su propio pool en autocommit (tamaño configurable); las escrituras (roll-ups)
+        # siguen siendo transaccionales sobre un pool mínimo.
+        # En SQLite se comparte el engine: no hay roundtrip que ahorrar y en memoria serían bases distintas.
+        self._read_engine: Engine = (
+            self._engine
+            if url.get_backend_name() == "sqlite"
+            else _get_engine(
+                url,
+                read_only=True,
+                pool_size=settings.report_db_pool_size,
+                max_overflow=settings.report_db_max_overflow,
+            )
+        )
         self._session_factory = sessionmaker(bind=self._engine)
+        self._compiled_queries: Dict[TextClause, Tuple[str, Optional[List[str]]]] = {}
+        self._stream_results = settings.report_stream_results
+        self._use_materializations = settings.report_use_materializations
+        self._row_cache = InMemoryCacheStrategy()
+        # Guardar las filas en caché obliga a materializarlas; con streaming activo se leen siempre por lotes
+        self._row_cache_ttl = 0 if self._stream_results else max(settings.report_repository_cache_ttl_seconds, 0)
+        self._datasets: Dict[str, Tuple[_StatementBuilder, _RowShaper]] = {
+            "branch_summary": (self._branch_summary_statement, self._shape_branch_summary),
+            "district_kpi": (self._district_kpis_statement, self._shape_district_kpis),
+            "upcoming_arrivals": (self._upcoming_arrivals_statement, self._shape_upcoming_arrivals),
+            "upcoming_birthdays": (self._upcoming_birthdays_statement, self._shape_upcoming_birthdays),
+        }
+        # SQLite no gana nada con conexiones paralelas (y en memoria cada hilo vería otra base)
+        self._bundle_executor: Optional[ThreadPoolExecutor] = (
+            ThreadPoolExecutor(max_workers=len(self._datasets), thread_name_prefix="report-bundle")
+            if url.get_backend_name() != "sqlite"
+            else None
+        )
 
     @contextmanager
     def _session(self) -> Iterable[Session]:
@@ -60,178 +441,345 @@ class SQLAlchemyReportDataRepository(ReportDataRepository):
         finally:
             session.close()
 
+    def _iter_rows(self, query: TextClause, params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        """Ejecutar una consulta de solo lectura y producir cada fila como ``dict`` en lotes."""
+
+        if self._engine.dialect.is_async:
+            # Drivers asíncronos no exponen un cursor DBAPI síncrono utilizable
+            with self._session() as session:
+                result = session.execute(
+                    query,
+                    params,
+                    execution_options={"yield_per": self.FETCH_BATCH_SIZE},
+                )
+                for row in result.mappings():
+                    yield dict(row)
+            return
+
+        sql, positions = self._compile(query)
+        bound = [params[name] for name in positions] if positions is not None else params
+
+        try:
+            connection = self._read_engine.raw_connection()
+        except SQLAlchemyError as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
+
+        try:
+            cursor = self._open_cursor(connection)
+            try:
+                cursor.execute(sql, bound)
+                columns = tuple(description[0] for description in cursor.description)
+                while True:
+                    batch = cursor.fetchmany(self.FETCH_BATCH_SIZE)
+                    if not batch:
+                        break
+                    yield from _rows_to_dicts(columns, batch)
+            finally:
+                cursor.close()
+        except self._engine.dialect.loaded_dbapi.Error as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
+        finally:
+            connection.close()
+
+    def _fetch_result_sets(self, statements: List[Tuple[TextClause, Dict[str, object]]]) -> List[List[Dict[str, object]]]:
+        """Ejecutar varias consultas y devolver las filas de cada una, en el mismo orden.
+
+        Con ``REPORT_BUNDLE_MULTI_STATEMENTS`` en MySQL se envían todas en un único ``execute``
+        (un roundtrip) y los resultados se recorren con ``nextset``; aplica a drivers con marcadores
+        posicionales (mysqlclient) o ``pyformat`` (PyMySQL), con otro paramstyle se avisa al crear el
+        repositorio y se consulta por separado. En otros servidores cada consulta
+        usa su propia conexión del pool en paralelo, de modo que la latencia es la de la más lenta;
+        en SQLite se ejecutan una tras otra sobre el mismo cursor.
+        """
+
+        if self._engine.dialect.is_async:
+            with self._session() as session:
+                return [[dict(row) for row in session.execute(query, params).mappings()] for query, params in statements]
+
+        compiled = [self._compile(query) + (params,) for query, params in statements]
+
+        if self._bundle_executor is not None and not self._multi_statements and len(compiled) > 1:
+            return list(self._bundle_executor.map(lambda item: self._execute_compiled([item])[0], compiled))
+        return self._execute_compiled(compiled)
+
+    def _execute_compiled(
+        self,
+        compiled: List[Tuple[str, Optional[List[str]], Dict[str, object]]],
+    ) -> List[List[Dict[str, object]]]:
+        """Ejecutar consultas ya compiladas sobre una sola conexión cruda del pool."""
+
+        try:
+            connection = self._read_engine.raw_connection()
+        except SQLAlchemyError as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
+
+        result_sets: List[List[Dict[str, object]]] = []
+        try:
+            cursor = connection.cursor()
+            try:
+                if self._multi_statements:
+                    cursor.execute(*self._join_statements(compiled))
+                    for index in range(len(compiled)):
+                        if index and not cursor.nextset():
+                            raise ReportDataRepositoryError("El servidor devolvió menos resultados que consultas enviadas")
+                        result_sets.append(self._drain_cursor(cursor))
+                else:
+                    for sql, positions, params in compiled:
+                        cursor.execute(sql, [params[name] for name in positions] if positions is not None else params)
+                        result_sets.append(self._drain_cursor(cursor))
+            finally:
+                cursor.close()
+        except self._engine.dialect.loaded_dbapi.Error as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
+        finally:
+            connection.close()
+        return result_sets
+
+    @staticmethod
+    def _join_statements(compiled: List[Tuple[str, Optional[List[str]], Dict[str, object]]]) -> Tuple[str, Any]:
+        """Unir consultas compiladas en un solo texto con sus parámetros para un único ``execute``."""
+
+        if all(positions is not None for _, positions, _ in compiled):
+            return (
+                ";\n".join(sql for sql, _, _ in compiled),
+                [params[name] for _, positions, params in compiled for name in positions],
+            )
+
+        # pyformat: cada consulta lleva su propio prefijo para que parámetros homónimos no choquen
+        parts: List[str] = []
+        bound: Dict[str, object] = {}
+        for index, (sql, _, params) in enumerate(compiled):
+            prefix = f"q{index}_"
+            parts.append(_PYFORMAT_PARAM.sub(lambda match, prefix=prefix: f"%({prefix}{match.group(1)})s", sql))
+            bound.update({prefix + name: value for name, value in params.items()})
+        return ";\n".join(parts), bound
+
+    @staticmethod
+    def _drain_cursor(cursor: Any) -> List[Dict[str, object]]:
+        columns = tuple(description[0] for description in cursor.description)
+        return list(_rows_to_dicts(columns, cursor.fetchall()))
+
+    def _open_cursor(self, connection: Any) -> Any:
+        """Cursor DBAPI; en MySQL con ``REPORT_STREAM_RESULTS`` se usa el cursor sin buffer (servidor)."""
+
+        if self._stream_results and self._engine.dialect.name == "mysql":
+            return connection.cursor(self._engine.dialect.loaded_dbapi.cursors.SSCursor)
+        return connection.cursor()
+
+    def _compile(self, query: TextClause) -> Tuple[str, Optional[List[str]]]:
+        """Traducir ``:param`` al paramstyle del driver una sola vez por consulta."""
+
+        cached = self._compiled_queries.get(query)
+        if cached is None:
+            compiled = query.compile(dialect=self._engine.dialect)
+            cached = (compiled.string, list(compiled.positiontup) if compiled.positional else None)
+            self._compiled_queries[query] = cached
+        return cached
+
+    def _cached(
+        self,
+        dataset_id: str,
+        branch_id: Optional[int],
+        params: Dict[str, object],
+        loader: Callable[[Optional[int], Dict[str, object]], Iterable[Dict[str, object]]],
+    ) -> Iterable[Dict[str, object]]:
+        """Servir filas desde la caché en memoria (TTL) o cargarlas y guardarlas como tupla inmutable."""
+
+        if self._row_cache_ttl <= 0:
+            return loader(branch_id, params)
+
+        cache_key = self._row_cache_key(dataset_id, branch_id, params)
+        cached = self._row_cache.get(cache_key)
+        if cached is not None:
+            return cached["rows"]
+
+        rows = tuple(loader(branch_id, params))
+        self._row_cache.set(cache_key, {"rows": rows}, ttl_seconds=self._row_cache_ttl)
+        return rows
+
+    @staticmethod
+    def _row_cache_key(dataset_id: str, branch_id: Optional[int], params: Dict[str, object]) -> str:
+        sorted_params = "|".join(f"{key}={params[key]}" for key in sorted(params))
+        key = f"{dataset_id}:branch:{branch_id}:{sorted_params}"
+        if dataset_id in _DATE_SCOPED_DATASETS:
+            # La ventana de fechas se calcula con ``date.today()``: al cambiar el día la entrada ya no sirve
+            key = f"{key}:date:{date.today().isoformat()}"
+        return key
+
+    def fetch_report_bundle(self, branch_id: Optional[int], params: Dict[str, object]) -> Dict[str, List[Dict[str, object]]]:
+        """Obtener los cuatro datasets de una rama en un solo viaje a la base de datos.
+
+        Los datasets ya presentes en la caché en memoria no se vuelven a consultar.
+        """
+
+        bundle: Dict[str, List[Dict[str, object]]] = {}
+        pending: List[str] = []
+        for dataset_id in self._datasets:
+            cached = self._row_cache.get(self._row_cache_key(dataset_id, branch_id, params)) if self._row_cache_ttl > 0 else None
+            if cached is not None:
+                bundle[dataset_id] = list(cached["rows"])
+            else:
+                pending.append(dataset_id)
+
+        if pending:
+            statements = [self._datasets[dataset_id][0](branch_id, params) for dataset_id in pending]
+            for dataset_id, rows in zip(pending, self._fetch_result_sets(statements), strict=True):
+                shaped = tuple(self._datasets[dataset_id][1](rows))
+                if self._row_cache_ttl > 0:
+                    self._row_cache.set(
+                        self._row_cache_key(dataset_id, branch_id, params),
+                        {"rows": shaped},
+                        ttl_seconds=self._row_cache_ttl,
+                    )
+                bundle[dataset_id] = list(shaped)
+
+        return {dataset_id: bundle[dataset_id] for dataset_id in self._datasets}
+
+    def invalidate(self, dataset_id: Optional[str] = None) -> None:
+        """Descartar las filas cacheadas de un dataset (o de todos)."""
+
+        self._row_cache.invalidate_prefix(f"{dataset_id}:" if dataset_id else "")
+
+    def close(self) -> None:
+        """Detener los hilos del bundle; los engines se comparten por URL y no se cierran aquí."""
+
+        executor, self._bundle_executor = self._bundle_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def refresh_materializations(self) -> Dict[str, int]:
+        """Reemplazar el contenido de ``mv_branch_summary`` y ``mv_district_kpis`` en una transacción."""
+
+        written: Dict[str, int] = {}
+        try:
+            with self._engine.begin() as connection:
+                for table, statement in _REFRESH_MATERIALIZATIONS:
+                    result = connection.execute(statement)
+                    if statement.text.lstrip().startswith("INSERT"):
+                        written[table] = result.rowcount
+        except SQLAlchemyError as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
+        self.invalidate("branch_summary")
+        self.invalidate("district_kpi")
+        return written
+
     def fetch_branch_summary(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
-        query = text(
-            """
-            SELECT
-                Rama AS branch_id,
-                Distrito AS district,
-                CAST(Primera_Generacion AS DATE) AS first_generation_date,
-                CAST(Primera_CCM_llegada AS DATE) AS first_ccm_arrival,
-                CAST(Ultima_CCM_salida AS DATE) AS last_ccm_departure,
-                Total_Misioneros AS total_missionaries
-            FROM vwFechasCCMPorDistrito
-            WHERE (:branch_id IS NULL OR Rama = :branch_id)
-            ORDER BY district
-            """
-        )
+        return self._cached("branch_summary", branch_id, params, self._iter_branch_summary)
+
+    def _iter_dataset(self, dataset_id: str, branch_id: Optional[int], params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        build_statement, shape = self._datasets[dataset_id]
+        return shape(self._iter_rows(*build_statement(branch_id, params)))
 
-        with self._session() as session:
-            rows = session.execute(query, {"branch_id": branch_id}).mappings().all()
+    def _iter_branch_summary(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        return self._iter_dataset("branch_summary", branch_id, params)
 
-        summaries: List[Dict[str, object]] = []
+    def _branch_summary_statement(self, branch_id: Optional[int], params: Dict[str, object]) -> Tuple[TextClause, Dict[str, object]]:
+        """Resumen por distrito.
 
+        Con ``REPORT_USE_MATERIALIZATIONS`` se lee de ``mv_branch_summary``, cuyos datos tienen el
+        atraso de la última llamada a ``refresh_materializations``.
+        """
+
+        query = _BRANCH_SUMMARY_MV_QUERY if self._use_materializations else _BRANCH_SUMMARY_QUERY
+        return query.bind(branch_id, {})
+
+    @staticmethod
+    def _shape_branch_summary(rows: Iterable[Dict[str, object]]) -> Iterator[Dict[str, object]]:
+        # Los alias SQL ya coinciden con las llaves del dataset; solo se agregan las columnas sin fuente
         for row in rows:
-            summaries.append(
-                {
-                    "branch_id": row.get("branch_id"),
-                    "district": row.get("district"),
-                    "first_generation_date": row.get("first_generation_date"),
-                    "first_ccm_arrival": row.get("first_ccm_arrival"),
-                    "last_ccm_departure": row.get("last_ccm_departure"),
-                    "total_missionaries": row.get("total_missionaries", 0),
-                    "total_companionships": None,
-                    "elders_count": None,
-                    "sisters_count": None,
-                }
-            )
+            row.update(_BRANCH_SUMMARY_EXTRAS)
+            yield row
+
+    def fetch_branch_summaries_bulk(self, branch_ids: Iterable[int]) -> Dict[int, List[Dict[str, object]]]:
+        """Resumen por distrito de varias ramas con una sola consulta ``Rama IN (...)``.
+
+        Cada rama solicitada aparece en el resultado, con lista vacía si no tiene distritos.
+        """
+
+        ids = sorted(set(branch_ids))
+        if not ids:
+            return {}
+
+        query = _BRANCH_SUMMARY_MV_QUERY if self._use_materializations else _BRANCH_SUMMARY_QUERY
+        # Los parámetros expandibles requieren la capa Connection: el cursor crudo no los expande
+        try:
+            with self._read_engine.connect() as connection:
+                rows = [dict(row) for row in connection.execute(query.many_branches, {"branch_ids": ids}).mappings()]
+        except SQLAlchemyError as exc:
+            raise ReportDataRepositoryError(str(exc)) from exc
 
+        summaries: Dict[int, List[Dict[str, object]]] = {branch_id: [] for branch_id in ids}
+        for row in self._shape_branch_summary(rows):
+            summaries[row["branch_id"]].append(row)
         return summaries
 
     def fetch_district_kpis(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
-        query = text(
-            """
-            SELECT
-                Rama AS branch_id,
-                Distrito AS district,
-                COUNT(*) AS total_missionaries,
-                SUM(CASE WHEN Status = 'CCM' THEN 1 ELSE 0 END) AS ccm_count,
-                SUM(CASE WHEN Status = 'Virtual' THEN 1 ELSE 0 END) AS virtual_count,
-                SUM(CASE WHEN Status = 'Futuro' THEN 1 ELSE 0 END) AS future_count,
-                SUM(CASE WHEN tres_semanas = 1 THEN 1 ELSE 0 END) AS three_week_count
-            FROM vwMisioneros
-            WHERE (:branch_id IS NULL OR Rama = :branch_id)
-            GROUP BY Rama, Distrito
-            ORDER BY district
-            """
-        )
+        return self._cached("district_kpi", branch_id, params, self._iter_district_kpis)
 
-        with self._session() as session:
-            rows = session.execute(query, {"branch_id": branch_id}).mappings().all()
+    def _iter_district_kpis(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        return self._iter_dataset("district_kpi", branch_id, params)
 
+    def _district_kpis_statement(self, branch_id: Optional[int], params: Dict[str, object]) -> Tuple[TextClause, Dict[str, object]]:
+        """KPIs por distrito.
+
+        Con ``REPORT_USE_MATERIALIZATIONS`` se lee de ``mv_district_kpis``, cuyos datos tienen el
+        atraso de la última llamada a ``refresh_materializations``.
+        """
+
+        query = _DISTRICT_KPIS_MV_QUERY if self._use_materializations else _DISTRICT_KPIS_QUERY
+        return query.bind(branch_id, {})
+
+    @staticmethod
+    def _shape_district_kpis(rows: Iterable[Dict[str, object]]) -> Iterator[Dict[str, object]]:
         today = date.today()
-        kpis: List[Dict[str, object]] = []
 
-        for row in rows:
-            metrics = {
-                "total_missionaries": row.get("total_missionaries", 0),
-                "en_ccm": row.get("ccm_count", 0),
-                "virtuales": row.get("virtual_count", 0),
-                "futuros": row.get("future_count", 0),
-                "tres_semanas": row.get("three_week_count", 0),
+        # Las filas ya llegan con una métrica por fila (ver ``_KPI_UNPIVOT``)
+        return (
+            {
+                "branch_id": row["branch_id"],
+                "district": row["district"],
+                "metric": row["metric"],
+                "value": row["value"],
+                "unit": row["unit"],
+                "generated_for_week": today,
+                "extra": {},
             }
+            for row in rows
+        )
 
-            for metric, value in metrics.items():
-                kpis.append(
-                    {
-                        "branch_id": row.get("branch_id"),
-                        "district": row.get("district"),
-                        "metric": metric,
-                        "value": float(value or 0),
-                        "unit": "misioneros",
-                        "generated_for_week": today,
-                        "extra": {},
-                    }
-                )
+    def fetch_upcoming_arrivals(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
+        return self._cached("upcoming_arrivals", branch_id, params, self._iter_upcoming_arrivals)
 
-        return kpis
+    def _iter_upcoming_arrivals(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        return self._iter_dataset("upcoming_arrivals", branch_id, params)
 
-    def fetch_upcoming_arrivals(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
-        days_ahead = int(params.get("days_ahead", 60) or 60)
+    @staticmethod
+    def _upcoming_window(params: Dict[str, object], default_days: int) -> Dict[str, date]:
+        """Rango semiabierto ``[hoy, hoy + days_ahead + 1)`` equivalente al ``BETWEEN`` inclusivo."""
 
-        query = text(
-            """
-            SELECT
-                Distrito AS district,
-                RDistrito AS rdistrict,
-                Rama AS branch_id,
-                DATE(CCM_llegada) AS arrival_date,
-                DATE(CCM_salida) AS departure_date,
-                COUNT(*) AS missionaries_count,
-                CASE WHEN MAX(tres_semanas) = 1 THEN 3 ELSE 6 END AS duration_weeks
-            FROM vwMisioneros
-            WHERE (:branch_id IS NULL OR Rama = :branch_id)
-              AND CCM_llegada IS NOT NULL
-              AND DATE(CCM_llegada) BETWEEN CURRENT_DATE AND (CURRENT_DATE + INTERVAL :days_ahead DAY)
-            GROUP BY Distrito, RDistrito, Rama, DATE(CCM_llegada), DATE(CCM_salida)
-            ORDER BY arrival_date ASC, district ASC
-            """
-        )
+        days_ahead = int(params.get("days_ahead", default_days) or default_days)
+        start_date = date.today()
+        return {"start_date": start_date, "end_date": start_date + timedelta(days=days_ahead + 1)}
 
-        with self._session() as session:
-            rows = session.execute(query, {"branch_id": branch_id, "days_ahead": days_ahead}).mappings().all()
+    def _upcoming_arrivals_statement(self, branch_id: Optional[int], params: Dict[str, object]) -> Tuple[TextClause, Dict[str, object]]:
+        return _UPCOMING_ARRIVALS_QUERY.bind(branch_id, self._upcoming_window(params, 60))
 
-        arrivals: List[Dict[str, object]] = []
+    @staticmethod
+    def _shape_upcoming_arrivals(rows: Iterable[Dict[str, object]]) -> Iterator[Dict[str, object]]:
         for row in rows:
-            arrivals.append(
-                {
-                    "district": row.get("district"),
-                    "rdistrict": row.get("rdistrict"),
-                    "branch_id": row.get("branch_id"),
-                    "arrival_date": row.get("arrival_date"),
-                    "departure_date": row.get("departure_date"),
-                    "missionaries_count": row.get("missionaries_count", 0),
-                    "duration_weeks": row.get("duration_weeks"),
-                    "status": None,
-                }
-            )
-
-        return arrivals
+            row.update(_UPCOMING_ARRIVAL_EXTRAS)
+            yield row
 
     def fetch_upcoming_birthdays(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterable[Dict[str, object]]:
-        days_ahead = int(params.get("days_ahead", 90) or 90)
+        return self._cached("upcoming_birthdays", branch_id, params, self._iter_upcoming_birthdays)
 
-        query = text(
-            """
-            SELECT
-                ID AS missionary_id,
-                Rama AS branch_id,
-                Distrito AS district,
-                Tratamiento AS treatment,
-                Nombre_del_misionero AS missionary_name,
-                DATE(Fecha_Cumpleanos) AS birthday,
-                Nueva_Edad AS age_turning,
-                Status AS status,
-                Correo_Misional AS email_missionary,
-                Correo_Personal AS email_personal,
-                tres_semanas AS three_weeks_program
-            FROM vwCumpleanosProximos
-            WHERE (:branch_id IS NULL OR Rama = :branch_id)
-              AND DATE(Fecha_Cumpleanos) BETWEEN CURRENT_DATE AND (CURRENT_DATE + INTERVAL :days_ahead DAY)
-            ORDER BY birthday ASC, missionary_name ASC
-            """
-        )
+    def _iter_upcoming_birthdays(self, branch_id: Optional[int], params: Dict[str, object]) -> Iterator[Dict[str, object]]:
+        return self._iter_dataset("upcoming_birthdays", branch_id, params)
 
-        with self._session() as session:
-            rows = session.execute(query, {"branch_id": branch_id, "days_ahead": days_ahead}).mappings().all()
-
-        birthdays: List[Dict[str, object]] = []
-        for row in rows:
-            three_weeks_value = row.get("three_weeks_program")
-            birthdays.append(
-                {
-                    "missionary_id": row.get("missionary_id"),
-                    "branch_id": row.get("branch_id"),
-                    "district": row.get("district"),
-                    "treatment": row.get("treatment"),
-                    "missionary_name": row.get("missionary_name"),
-                    "birthday": row.get("birthday"),
-                    "age_turning": row.get("age_turning"),
-                    "status": row.get("status"),
-                    "email_missionary": row.get("email_missionary"),
-                    "email_personal": row.get("email_personal"),
-                    "three_weeks_program": bool(three_weeks_value) if three_weeks_value is not None else None,
-                }
-            )
+    def _upcoming_birthdays_statement(self, branch_id: Optional[int], params: Dict[str, object]) -> Tuple[TextClause, Dict[str, object]]:
+        return _UPCOMING_BIRTHDAYS_QUERY.bind(branch_id, self._upcoming_window(params, 90))
 
-        return birthdays
+    @staticmethod
+    def _shape_upcoming_birthdays(rows: Iterable[Dict[str, object]]) -> Iterator[Dict[str, object]]:
+        # ``three_weeks_program`` llega normalizado a 0/1/NULL desde SQL; el modelo lo convierte a bool
+        return iter(rows)
@@ -2,11 +2,21 @@
 
 from __future__ import annotations
 
-from datetime import datetime
+import itertools
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, datetime
+from functools import lru_cache, partial
+from hashlib import blake2b
+from types import MappingProxyType
 from uuid import uuid4
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Type
 
 import structlog
+from pydantic import BaseModel
 
 from app.config import get_settings
 from app.models import (
@@ -17,7 +27,7 @@ from app.models import (
     UpcomingArrival,
     UpcomingBirthday,
 )
-from app.services.cache_strategies import CacheStrategy, create_cache_strategy
+from app.services.cache_strategies import CacheStrategy, LazyCacheMetrics, create_cache_strategy
 from app.services.report_data_repository import (
     ReportDataRepository,
     ReportDataRepositoryError,
@@ -29,6 +39,10 @@ logger = structlog.get_logger("report_preparation")
 MAX_TOTAL_MISSIONARIES = 500
 MAX_KPI_VALUE = 500
 MAX_MISSIONARIES_COUNT = 200
+MAX_REJECTED_BRANCHES = 512
+
+# Parámetros compartidos (solo lectura) para pipelines creados sin parámetros
+_EMPTY_PARAMS: Mapping[str, Any] = MappingProxyType({})
 
 
 class ReportPreparationError(Exception):
@@ -43,14 +57,99 @@ class DatasetValidationError(ReportPreparationError):
         self.error_code = error_code
 
 
+_RowCheck = Callable[[Dict[str, Any]], Any]
+
+
+def _compile_row_checks(required: Tuple[str, ...], unique: Tuple[str, ...]) -> Tuple[Optional[_RowCheck], Optional[_RowCheck]]:
+    """Generar, con los nombres de campo fijos, las funciones de campos requeridos y llave única.
+
+    ``check_required(row)`` devuelve la lista de campos faltantes (``None`` o texto en blanco), o
+    ``None`` sin reservar lista cuando no falta ninguno, y
+    ``unique_key(row)`` la tupla normalizada, o ``None`` si todos sus componentes están vacíos.
+    Desenrollar los campos evita el bucle por campo y las búsquedas repetidas en cada fila.
+    """
+
+    source: List[str] = []
+    if required:
+        source += ["def check_required(row):", "    missing = None"]
+        for field in required:
+            source += [
+                f"    value = row.get({field!r})",
+                "    if value is None or (isinstance(value, str) and not value.strip()):",
+                "        if missing is None:",
+                "            missing = []",
+                f"        missing.append({field!r})",
+            ]
+        source.append("    return missing")
+    if unique:
+        names = [f"v{position}" for position in range(len(unique))]
+        source.append("def unique_key(row):")
+        for name, field in zip(names, unique, strict=True):
+            source += [
+                f"    {name} = row.get({field!r})",
+                f"    if isinstance({name}, str):",
+                f"        {name} = {name}.strip() or None",
+            ]
+        source += [
+            f"    if {' and '.join(f'{name} is None' for name in names)}:",
+            "        return None",
+            f"    return ({', '.join(names)},)",
+        ]
+
+    namespace: Dict[str, Any] = {}
+    exec("\n".join(source), namespace)  # noqa: S102 - código generado solo a partir de literales repr()
+    return namespace.get("check_required"), namespace.get("unique_key")
+
+
+# Tipos de parámetro cuyo valor y tipo exacto bastan para memoizar la llave; ``1``, ``True`` y ``1.0``
+# son iguales como llaves de ``lru_cache`` pero deben generar llaves de caché distintas
+_MEMOIZABLE_PARAM_TYPES = frozenset({str, int, float, bool, type(None), date, datetime})
+
+
+@lru_cache(maxsize=4096)
+def _cache_key(dataset_id: str, branch_id: Optional[int], params: Iterable[Tuple[str, type, Any]]) -> str:
+    branch_part = branch_id if branch_id is not None else "global"
+    # Resumen de longitud fija de los parámetros; el prefijo legible se conserva para invalidate()
+    items = tuple(sorted((key, value) for key, _, value in params))
+    digest = blake2b(pickle.dumps(items, protocol=5), digest_size=16).hexdigest()
+    return f"report:{dataset_id}:branch:{branch_part}:{digest}"
+
+
 class BaseDatasetPipeline:
     """Plantilla base para preparar datasets reutilizables."""
 
+    __slots__ = ("repository", "branch_id", "params", "rows")
+
     dataset_id: str = "base_dataset"
 
-    required_fields: Iterable[str] = ()
+    required_fields: Tuple[str, ...] = ()
     allow_empty: bool = False
-    unique_fields: Iterable[str] = ()
+    unique_fields: Tuple[str, ...] = ()
+
+    # Modelo pydantic de cada fila; ``None`` deja las filas como ``dict``
+    model: Optional[Type[BaseModel]] = None
+
+    # Generadas por subclase en ``__init_subclass__`` a partir de ``required_fields``/``unique_fields``
+    _check_required: Optional[_RowCheck] = None
+    _unique_key: Optional[_RowCheck] = None
+    # Validador y serializador JSON del modelo, equivalentes a ``Model(**row)`` y
+    # ``model_dump(mode="json")`` sin desempacar kwargs ni pasar por sus envolturas
+    _build: Optional[Callable[[Dict[str, Any]], BaseModel]] = None
+    _dump: Optional[Callable[[BaseModel], Any]] = None
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        # Se congelan una sola vez; el resto de la clase los usa ya como tuplas
+        cls.required_fields = tuple(cls.required_fields)
+        cls.unique_fields = tuple(cls.unique_fields)
+        check_required, unique_key = _compile_row_checks(cls.required_fields, cls.unique_fields)
+        cls._check_required = staticmethod(check_required) if check_required else None
+        cls._unique_key = staticmethod(unique_key) if unique_key else None
+        if cls.model is not None:
+            cls._build = staticmethod(cls.model.__pydantic_validator__.validate_python)
+            cls._dump = staticmethod(partial(cls.model.__pydantic_serializer__.to_python, mode="json"))
+        else:
+            cls._build = cls._dump = None
 
     def __init__(
         self,
@@ -61,23 +160,51 @@ class BaseDatasetPipeline:
     ) -> None:
         self.repository = repository
         self.branch_id = branch_id
-        self.params = params or {}
-        self._context: Dict[str, Any] = {}
+        self.params = params if params is not None else _EMPTY_PARAMS
+        self.rows: Optional[Iterable[Dict[str, Any]]] = None
 
     def prepare(self) -> ReportDatasetResult:
         start = datetime.utcnow()
-        raw_rows = list(self._load())
-        self._ensure_not_empty(raw_rows, stage="load")
-        cleaned = list(self._validate(raw_rows))
-        self._ensure_not_empty(cleaned, stage="validate")
-        transformed = list(self._transform(cleaned))
-        result = self._serialize(transformed)
+        start_ns = time.monotonic_ns()
+        check_required = self._check_required
+        unique_key = self._unique_key
+        dump = self._dump
+        seen_unique: Set[Tuple[Any, ...]] = set()
+        result: List[Any] = []
+        # ``rows`` permite reutilizar filas ya obtenidas (p. ej. con ``fetch_report_bundle``).
+        # Cada fila se valida, transforma y serializa en una sola pasada.
+        for index, row in enumerate(self._load() if self.rows is None else self.rows):
+            if check_required is not None:
+                missing = check_required(row)
+                if missing:
+                    raise DatasetValidationError(
+                        f"Campos faltantes {missing} en registro {index} del dataset {self.dataset_id}",
+                        error_code="missing_required_fields",
+                    )
+            if unique_key is not None:
+                key = unique_key(row)
+                if key is not None:
+                    if key in seen_unique:
+                        raise DatasetValidationError(
+                            f"Registros duplicados en {self.dataset_id} para campos {self.unique_fields}",
+                            error_code="duplicate_records",
+                        )
+                    seen_unique.add(key)
+            self._validate_row(row, index)
+            item = self._transform_row(row)
+            if dump is not None:
+                result.append(dump(item))
+            else:
+                result.append(item.model_dump(mode="json") if hasattr(item, "model_dump") else item)
+
+        # Validar nunca descarta filas: un resultado vacío implica que la carga no trajo registros
+        self._ensure_not_empty(result, stage="load")
         metadata = ReportDatasetMetadata(
             dataset_id=self.dataset_id,
             generated_at=start,
             record_count=len(result),
             branch_id=self.branch_id,
-            duration_ms=int((datetime.utcnow() - start).total_seconds() * 1000),
+            duration_ms=(time.monotonic_ns() - start_ns) // 1_000_000,
             cache_hit=False,
             parameters=self.params,
         )
@@ -85,59 +212,11 @@ class BaseDatasetPipeline:
 
     # Métodos plantilla
 
-    def _validate(self, rows: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
-        validated: List[Dict[str, Any]] = []
-        required = tuple(self.required_fields)
-        unique_fields = tuple(self.unique_fields)
-        seen_unique: Set[Tuple[Any, ...]] = set()
-        rows_list = rows if isinstance(rows, list) else list(rows)
-        for index, row in enumerate(rows_list):
-            if required:
-                missing = [
-                    field
-                    for field in required
-                    if row.get(field) is None
-                    or (isinstance(row.get(field), str) and not str(row.get(field)).strip())
-                ]
-                if missing:
-                    raise DatasetValidationError(
-                        f"Campos faltantes {missing} en registro {index} del dataset {self.dataset_id}",
-                        error_code="missing_required_fields",
-                    )
-            if unique_fields:
-                key_components: List[Any] = []
-                has_meaningful_value = False
-                for field in unique_fields:
-                    value = row.get(field)
-                    if isinstance(value, str):
-                        value = value.strip() or None
-                    if value is not None:
-                        has_meaningful_value = True
-                    key_components.append(value)
-                if not has_meaningful_value:
-                    validated.append(row)
-                    continue
-                key = tuple(key_components)
-                if key in seen_unique:
-                    raise DatasetValidationError(
-                        f"Registros duplicados en {self.dataset_id} para campos {unique_fields}",
-                        error_code="duplicate_records",
-                    )
-                seen_unique.add(key)
-            validated.append(row)
-        return validated
-
-    def _transform(self, rows: Iterable[Dict[str, Any]]) -> Iterable[Any]:
-        return rows
-
-    def _serialize(self, rows: Iterable[Any]) -> List[Any]:
-        serialized: List[Any] = []
-        for row in rows:
-            if hasattr(row, "model_dump"):
-                serialized.append(row.model_dump(mode="json"))
-            else:
-                serialized.append(row)
-        return serialized
+    def _validate_row(self, row: Dict[str, Any], index: int) -> None:
+        """Validaciones específicas del dataset sobre una fila (rangos numéricos, etc.)."""
+
+    def _transform_row(self, row: Dict[str, Any]) -> Any:
+        return self._build(row) if self._build is not None else row
 
     def _ensure_not_empty(self, rows: List[Dict[str, Any]], *, stage: str) -> None:
         if rows or self.allow_empty:
@@ -149,7 +228,10 @@ class BaseDatasetPipeline:
 
 
 class BranchSummaryPipeline(BaseDatasetPipeline):
+    __slots__ = ()
+
     dataset_id = "branch_summary"
+    model = BranchSummary
     required_fields = (
         "branch_id",
         "district",
@@ -161,29 +243,26 @@ class BranchSummaryPipeline(BaseDatasetPipeline):
     def _load(self) -> Iterable[Dict[str, Any]]:
         return self.repository.fetch_branch_summary(self.branch_id, self.params)
 
-    def _transform(self, rows: Iterable[Dict[str, Any]]) -> Iterable[BranchSummary]:
-        for row in rows:
-            yield BranchSummary(**row)
-
-    def _validate(self, rows: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
-        validated = list(super()._validate(rows))
-        for index, row in enumerate(validated):
-            total = row.get("total_missionaries")
-            if total is not None and total < 0:
-                raise DatasetValidationError(
-                    f"Total de misioneros negativo en registro {index} del dataset {self.dataset_id}",
-                    error_code="invalid_total_missionaries",
-                )
-            if total is not None and total > MAX_TOTAL_MISSIONARIES:
-                raise DatasetValidationError(
-                    f"Total de misioneros fuera de rango (>{MAX_TOTAL_MISSIONARIES}) en registro {index} del dataset {self.dataset_id}",
-                    error_code="invalid_total_missionaries",
-                )
-        return validated
+    def _validate_row(self, row: Dict[str, Any], index: int) -> None:
+        total = row.get("total_missionaries")
+        if total is None or 0 <= total <= MAX_TOTAL_MISSIONARIES:
+            return
+        if total < 0:
+            raise DatasetValidationError(
+                f"Total de misioneros negativo en registro {index} del dataset {self.dataset_id}",
+                error_code="invalid_total_missionaries",
+            )
+        raise DatasetValidationError(
+            f"Total de misioneros fuera de rango (>{MAX_TOTAL_MISSIONARIES}) en registro {index} del dataset {self.dataset_id}",
+            error_code="invalid_total_missionaries",
+        )
 
 
 class DistrictKPIPipeline(BaseDatasetPipeline):
+    __slots__ = ()
+
     dataset_id = "district_kpi"
+    model = DistrictKPI
     required_fields = (
         "branch_id",
         "district",
@@ -196,29 +275,26 @@ class DistrictKPIPipeline(BaseDatasetPipeline):
     def _load(self) -> Iterable[Dict[str, Any]]:
         return self.repository.fetch_district_kpis(self.branch_id, self.params)
 
-    def _transform(self, rows: Iterable[Dict[str, Any]]) -> Iterable[DistrictKPI]:
-        for row in rows:
-            yield DistrictKPI(**row)
-
-    def _validate(self, rows: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
-        validated = list(super()._validate(rows))
-        for index, row in enumerate(validated):
-            value = row.get("value")
-            if value is not None and value < 0:
-                raise DatasetValidationError(
-                    f"Valor negativo en KPI '{row.get('metric')}' en registro {index}",
-                    error_code="invalid_kpi_value",
-                )
-            if value is not None and value > MAX_KPI_VALUE:
-                raise DatasetValidationError(
-                    f"Valor fuera de rango (>{MAX_KPI_VALUE}) en KPI '{row.get('metric')}' en registro {index}",
-                    error_code="invalid_kpi_value",
-                )
-        return validated
+    def _validate_row(self, row: Dict[str, Any], index: int) -> None:
+        value = row.get("value")
+        if value is None or 0 <= value <= MAX_KPI_VALUE:
+            return
+        if value < 0:
+            raise DatasetValidationError(
+                f"Valor negativo en KPI '{row.get('metric')}' en registro {index}",
+                error_code="invalid_kpi_value",
+            )
+        raise DatasetValidationError(
+            f"Valor fuera de rango (>{MAX_KPI_VALUE}) en KPI '{row.get('metric')}' en registro {index}",
+            error_code="invalid_kpi_value",
+        )
 
 
 class UpcomingArrivalPipeline(BaseDatasetPipeline):
+    __slots__ = ()
+
     dataset_id = "upcoming_arrivals"
+    model = UpcomingArrival
     required_fields = (
         "district",
         "arrival_date",
@@ -230,29 +306,26 @@ class UpcomingArrivalPipeline(BaseDatasetPipeline):
     def _load(self) -> Iterable[Dict[str, Any]]:
         return self.repository.fetch_upcoming_arrivals(self.branch_id, self.params)
 
-    def _transform(self, rows: Iterable[Dict[str, Any]]) -> Iterable[UpcomingArrival]:
-        for row in rows:
-            yield UpcomingArrival(**row)
-
-    def _validate(self, rows: Iterable[Dict[str, Any]]) -> Iterable[Dict[str, Any]]:
-        validated = list(super()._validate(rows))
-        for index, row in enumerate(validated):
-            count = row.get("missionaries_count")
-            if count is not None and count < 0:
-                raise DatasetValidationError(
-                    f"Conteo negativo de misioneros en registro {index}",
-                    error_code="invalid_missionaries_count",
-                )
-            if count is not None and count > MAX_MISSIONARIES_COUNT:
-                raise DatasetValidationError(
-                    f"Conteo de misioneros fuera de rango (>{MAX_MISSIONARIES_COUNT}) en registro {index}",
-                    error_code="invalid_missionaries_count",
-                )
-        return validated
+    def _validate_row(self, row: Dict[str, Any], index: int) -> None:
+        count = row.get("missionaries_count")
+        if count is None or 0 <= count <= MAX_MISSIONARIES_COUNT:
+            return
+        if count < 0:
+            raise DatasetValidationError(
+                f"Conteo negativo de misioneros en registro {index}",
+                error_code="invalid_missionaries_count",
+            )
+        raise DatasetValidationError(
+            f"Conteo de misioneros fuera de rango (>{MAX_MISSIONARIES_COUNT}) en registro {index}",
+            error_code="invalid_missionaries_count",
+        )
 
 
 class UpcomingBirthdayPipeline(BaseDatasetPipeline):
+    __slots__ = ()
+
     dataset_id = "upcoming_birthdays"
+    model = UpcomingBirthday
     required_fields = (
         "missionary_name",
         "birthday",
@@ -263,10 +336,6 @@ class UpcomingBirthdayPipeline(BaseDatasetPipeline):
     def _load(self) -> Iterable[Dict[str, Any]]:
         return self.repository.fetch_upcoming_birthdays(self.branch_id, self.params)
 
-    def _transform(self, rows: Iterable[Dict[str, Any]]) -> Iterable[UpcomingBirthday]:
-        for row in rows:
-            yield UpcomingBirthday(**row)
-
 
 PIPELINES: Dict[str, Type[BaseDatasetPipeline]] = {
     BranchSummaryPipeline.dataset_id: BranchSummaryPipeline,
@@ -288,8 +357,19 @@ class ReportPreparationService:
     ) -> None:
         self._settings = get_settings()
         self._allowed_branches = set(self._settings.ramas_autorizadas)
+        # (rama, dataset) ya rechazados -> número de rechazos; LRU para no crecer con ramas arbitrarias
+        self._rejected_branches: "OrderedDict[Tuple[Optional[int], str], int]" = OrderedDict()
+        self._rejected_lock = threading.Lock()
+        # Ejecuciones en curso por cache_key: las peticiones concurrentes esperan al mismo resultado
+        self._inflight: Dict[str, "Future[ReportDatasetResult]"] = {}
+        self._inflight_lock = threading.Lock()
         self.default_branch_id = default_branch_id or self._settings.rama_actual
         self._cache: CacheStrategy = cache_strategy or create_cache_strategy(self._settings)
+        # Los eventos de log reciben esta vista; el dict de métricas se arma solo si el evento se emite
+        self._cache_metrics = LazyCacheMetrics(self._cache)
+        # Muestreo de ``pipeline_cache_hit``: con mucho tráfico es el evento dominante
+        self._cache_hit_log_every = max(self._settings.report_cache_hit_log_every, 1)
+        self._cache_hits = itertools.count(1)
         self._ttl_seconds = max(self._settings.report_cache_ttl_minutes, 0) * 60
         self._cache_enabled = self._ttl_seconds > 0
         self._repository: ReportDataRepository = repository or SQLAlchemyReportDataRepository(self._settings)
@@ -330,6 +410,47 @@ class ReportPreparationService:
     ) -> ReportDatasetResult:
         return self._run_pipeline(UpcomingBirthdayPipeline, branch_id, params, skip_cache=force_refresh)
 
+    def prepare_report_bundle(
+        self,
+        *,
+        branch_id: Optional[int] = None,
+        force_refresh: bool = False,
+        **params: Any,
+    ) -> Dict[str, ReportDatasetResult]:
+        """Preparar los cuatro datasets de una rama con un solo viaje al repositorio.
+
+        Si algún dataset no está en caché se llama una vez a ``fetch_report_bundle``, que consulta todos
+        los datasets que el repositorio no tenga en su caché de filas, aunque ya estén en la de reportes.
+        Solo si los cuatro están en caché no hay consulta.
+        """
+
+        # ``_run_pipeline`` ya validó la rama antes de invocar el cargador
+        resolved_branch = branch_id if branch_id is not None else self.default_branch_id
+        bundle: Dict[str, List[Dict[str, Any]]] = {}
+
+        def rows_for(dataset_id: str) -> Callable[[], Iterable[Dict[str, Any]]]:
+            def load() -> Iterable[Dict[str, Any]]:
+                if not bundle:
+                    bundle.update(self._repository.fetch_report_bundle(resolved_branch, params))
+                return bundle[dataset_id]
+
+            return load
+
+        if force_refresh:
+            for dataset_id in PIPELINES:
+                self._repository.invalidate(dataset_id)
+
+        return {
+            dataset_id: self._run_pipeline(
+                pipeline_cls,
+                branch_id,
+                params,
+                skip_cache=force_refresh,
+                rows_loader=rows_for(dataset_id),
+            )
+            for dataset_id, pipeline_cls in PIPELINES.items()
+        }
+
     def _run_pipeline(
         self,
         pipeline_cls: Type[BaseDatasetPipeline],
@@ -337,52 +458,109 @@ class ReportPreparationService:
         params: Dict[str, Any],
         *,
         skip_cache: bool = False,
+        rows_loader: Optional[Callable[[], Iterable[Dict[str, Any]]]] = None,
     ) -> ReportDatasetResult:
-        request_message_id = uuid4().hex
-        resolved_branch = self._resolve_branch(branch_id, pipeline_cls.dataset_id, request_message_id)
-        pipeline = pipeline_cls(repository=self._repository, branch_id=resolved_branch, params=params)
-        cache_key = self._build_cache_key(pipeline.dataset_id, resolved_branch, params)
+        dataset_id = pipeline_cls.dataset_id
+        resolved_branch = self._resolve_branch(branch_id, dataset_id)
+        cache_key = self._build_cache_key(dataset_id, resolved_branch, params)
         cached = None
         if self._cache_enabled and not skip_cache:
             cached = self._cache.get(cache_key)
 
+        # El id de la petición y el pipeline solo se crean si no se sirve desde caché
+        request_message_id: Optional[str] = None
         if cached:
-            metadata = ReportDatasetMetadata(**cached["metadata"])  # type: ignore[arg-type]
-            if self._is_cache_stale(metadata):
+            metadata = self._cached_metadata(cached["metadata"])
+            if self._is_cache_stale(cached, metadata):
+                request_message_id = uuid4().hex
                 logger.warning(
                     "pipeline_cache_stale",
                     etapa="fase_5_preparacion",
-                    dataset_id=pipeline.dataset_id,
+                    dataset_id=dataset_id,
                     branch_id=resolved_branch,
                     cache_key=cache_key,
                     cache_hit=False,
                     error_code="stale_cache",
-                    cache_metrics=self._cache.get_metrics(),
+                    cache_metrics=self._cache_metrics,
                     message_id=metadata.message_id,
                     request_message_id=request_message_id,
                 )
-                self._cache.invalidate(cache_key)
+                self._cache.invalidate(cache_key, prefixes=self._cache_prefixes(dataset_id, resolved_branch))
             else:
-                metadata.cache_hit = True
-                result = ReportDatasetResult(metadata=metadata, data=cached["data"])
-                cache_metrics = self._cache.get_metrics()
-                logger.info(
-                    "pipeline_cache_hit",
-                    etapa="fase_5_preparacion",
-                    dataset_id=pipeline.dataset_id,
-                    branch_id=resolved_branch,
-                    cache_key=cache_key,
-                    cache_hit=True,
-                    records_processed=metadata.record_count,
-                    duration_ms=metadata.duration_ms,
-                    cache_metrics=cache_metrics,
-                    message_id=metadata.message_id,
-                )
+                metadata = metadata.model_copy(update={"cache_hit": True})
+                result = ReportDatasetResult.model_construct(metadata=metadata, data=cached["data"])
+                if next(self._cache_hits) % self._cache_hit_log_every == 0:
+                    logger.info(
+                        "pipeline_cache_hit",
+                        etapa="fase_5_preparacion",
+                        dataset_id=dataset_id,
+                        branch_id=resolved_branch,
+                        cache_key=cache_key,
+                        cache_hit=True,
+                        records_processed=metadata.record_count,
+                        duration_ms=metadata.duration_ms,
+                        cache_metrics=self._cache_metrics,
+                        message_id=metadata.message_id,
+                    )
                 return result
 
-        if skip_cache and self._cache_enabled:
-            self._cache.invalidate(cache_key)
+        if request_message_id is None:
+            request_message_id = uuid4().hex
+        if skip_cache:
+            # force_refresh también debe saltarse las filas cacheadas por el repositorio
+            self._repository.invalidate(dataset_id)
+            if self._cache_enabled:
+                self._cache.invalidate(cache_key, prefixes=self._cache_prefixes(dataset_id, resolved_branch))
+            # Un refresco forzado no debe recibir el resultado de una ejecución iniciada antes
+            return self._execute_pipeline(
+                pipeline_cls, resolved_branch, cache_key, params, request_message_id, skip_cache, rows_loader
+            )
 
+        with self._inflight_lock:
+            inflight = self._inflight.get(cache_key)
+            if inflight is None:
+                inflight = self._inflight[cache_key] = Future()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            logger.info(
+                "pipeline_coalesced",
+                etapa="fase_5_preparacion",
+                dataset_id=dataset_id,
+                branch_id=resolved_branch,
+                cache_key=cache_key,
+                message_id=request_message_id,
+            )
+            shared = inflight.result()
+            return ReportDatasetResult.model_construct(metadata=shared.metadata.model_copy(), data=shared.data)
+
+        try:
+            result = self._execute_pipeline(
+                pipeline_cls, resolved_branch, cache_key, params, request_message_id, skip_cache, rows_loader
+            )
+        except BaseException as exc:
+            inflight.set_exception(exc)
+            raise
+        else:
+            inflight.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(cache_key, None)
+
+    def _execute_pipeline(
+        self,
+        pipeline_cls: Type[BaseDatasetPipeline],
+        resolved_branch: Optional[int],
+        cache_key: str,
+        params: Dict[str, Any],
+        request_message_id: str,
+        skip_cache: bool,
+        rows_loader: Optional[Callable[[], Iterable[Dict[str, Any]]]],
+    ) -> ReportDatasetResult:
+        pipeline = pipeline_cls(repository=self._repository, branch_id=resolved_branch, params=params)
         logger.info(
             "pipeline_cache_miss",
             etapa="fase_5_preparacion",
@@ -396,6 +574,8 @@ class ReportPreparationService:
         )
 
         try:
+            if rows_loader is not None:
+                pipeline.rows = rows_loader()
             result = pipeline.prepare()
         except ReportDataRepositoryError as exc:
             logger.error(
@@ -404,7 +584,7 @@ class ReportPreparationService:
                 dataset_id=pipeline.dataset_id,
                 branch_id=resolved_branch,
                 error=str(exc),
-                cache_metrics=self._cache.get_metrics(),
+                cache_metrics=self._cache_metrics,
                 message_id=request_message_id,
             )
             raise ReportPreparationError(str(exc)) from exc
@@ -416,7 +596,7 @@ class ReportPreparationService:
                 branch_id=resolved_branch,
                 error_code=exc.error_code,
                 error=str(exc),
-                cache_metrics=self._cache.get_metrics(),
+                cache_metrics=self._cache_metrics,
                 message_id=request_message_id,
             )
             raise
@@ -427,7 +607,7 @@ class ReportPreparationService:
                 dataset_id=pipeline.dataset_id,
                 branch_id=resolved_branch,
                 error=str(exc),
-                cache_metrics=self._cache.get_metrics(),
+                cache_metrics=self._cache_metrics,
                 message_id=request_message_id,
             )
             raise ReportPreparationError(str(exc)) from exc
@@ -442,65 +622,141 @@ class ReportPreparationService:
             duration_ms=result.metadata.duration_ms,
             cache_hit=False,
             cache_key=cache_key,
-            cache_metrics=self._cache.get_metrics(),
+            cache_metrics=self._cache_metrics,
             message_id=request_message_id,
         )
         if self._cache_enabled:
+            if self._cache.stores_references:
+                # En memoria basta una copia superficial; el reloj monotónico solo vale dentro del proceso
+                payload = {
+                    "metadata": result.metadata.model_copy(),
+                    "data": result.data,
+                    "stale_after_ns": time.monotonic_ns() + self._ttl_seconds * 1_000_000_000,
+                }
+            else:
+                payload = {"metadata": result.metadata.model_dump(mode="json"), "data": result.data}
             self._cache.set(
                 cache_key,
-                {
-                    "metadata": result.metadata.model_dump(mode="json"),
-                    "data": result.data,
-                },
+                payload,
                 ttl_seconds=self._ttl_seconds,
+                prefixes=self._cache_prefixes(pipeline.dataset_id, resolved_branch),
             )
         return result
 
+    @staticmethod
+    def _cached_metadata(payload: Any) -> ReportDatasetMetadata:
+        if isinstance(payload, ReportDatasetMetadata):
+            return payload
+        return ReportDatasetMetadata.model_validate(payload)
+
     def _build_cache_key(self, dataset_id: str, branch_id: Optional[int], params: Dict[str, Any]) -> str:
-        branch_part = branch_id if branch_id is not None else "global"
-        sorted_params = "|".join(f"{k}={params[k]}" for k in sorted(params))
-        return f"report:{dataset_id}:branch:{branch_part}:{sorted_params}"
+        typed = [(key, type(value), value) for key, value in params.items()]
+        if all(value_type in _MEMOIZABLE_PARAM_TYPES for _, value_type, _ in typed):
+            return _cache_key(dataset_id, branch_id, frozenset(typed))
+        # Contenedores (listas, tuplas, dicts): se calcula la llave sin memoizar
+        return _cache_key.__wrapped__(dataset_id, branch_id, typed)
 
     def _resolve_branch(
         self,
         explicit_branch_id: Optional[int],
         dataset_id: str,
-        message_id: str,
     ) -> Optional[int]:
         resolved = explicit_branch_id if explicit_branch_id is not None else self.default_branch_id
         if self._allowed_branches:
             if resolved is None or resolved not in self._allowed_branches:
-                logger.error(
-                    "pipeline_invalid_branch",
-                    etapa="fase_5_preparacion",
-                    dataset_id=dataset_id,
-                    branch_id=resolved,
-                    error_code="invalid_branch",
-                    cache_metrics=self._cache.get_metrics(),
-                    message_id=message_id,
-                )
+                rejection = (resolved, dataset_id)
+                with self._rejected_lock:
+                    repeats = self._rejected_branches.get(rejection)
+                    if repeats is None:
+                        if len(self._rejected_branches) >= MAX_REJECTED_BRANCHES:
+                            self._rejected_branches.popitem(last=False)
+                        self._rejected_branches[rejection] = 1
+                    else:
+                        self._rejected_branches[rejection] = repeats + 1
+                        self._rejected_branches.move_to_end(rejection)
+                if repeats is None:
+                    logger.error(
+                        "pipeline_invalid_branch",
+                        etapa="fase_5_preparacion",
+                        dataset_id=dataset_id,
+                        branch_id=resolved,
+                        error_code="invalid_branch",
+                        cache_metrics=self._cache_metrics,
+                        message_id=uuid4().hex,
+                    )
+                else:
+                    # Rechazo repetido: ya se registró como error, solo se cuenta
+                    logger.debug(
+                        "pipeline_invalid_branch_repetida",
+                        etapa="fase_5_preparacion",
+                        dataset_id=dataset_id,
+                        branch_id=resolved,
+                        error_code="invalid_branch",
+                        rechazos=repeats + 1,
+                        message_id=uuid4().hex,
+                    )
                 raise DatasetValidationError(
                     f"La rama especificada '{resolved}' no está autorizada para el dataset {dataset_id}",
                     error_code="invalid_branch",
                 )
         return resolved
 
-    def _is_cache_stale(self, metadata: ReportDatasetMetadata) -> bool:
+    def _is_cache_stale(self, cached: Dict[str, Any], metadata: ReportDatasetMetadata) -> bool:
         if not self._cache_enabled:
             return True
+        stale_after_ns = cached.get("stale_after_ns")
+        if stale_after_ns is not None:
+            return time.monotonic_ns() > stale_after_ns
         age = datetime.utcnow() - metadata.generated_at
         return age.total_seconds() > self._ttl_seconds
 
+    def refresh_materializations(self) -> Dict[str, int]:
+        """Reconstruir los roll-ups del repositorio e invalidar los datasets que dependen de ellos."""
+
+        try:
+            written = self._repository.refresh_materializations()
+        except ReportDataRepositoryError as exc:
+            logger.error(
+                "materializations_refresh_error",
+                etapa="fase_5_preparacion",
+                error=str(exc),
+            )
+            raise ReportPreparationError(str(exc)) from exc
+
+        for dataset_id in (BranchSummaryPipeline.dataset_id, DistrictKPIPipeline.dataset_id):
+            self.invalidate(dataset_id)
+        logger.info(
+            "materializations_refreshed",
+            etapa="fase_5_preparacion",
+            rows_written=written,
+        )
+        return written
+
+    def close(self) -> None:
+        """Liberar los recursos del repositorio de datos."""
+
+        self._repository.close()
+
     def invalidate(self, dataset_id: Optional[str] = None, branch_id: Optional[int] = None) -> None:
-        """Invalidar caché de datasets específicos."""
+        """Invalidar caché de datasets específicos y las filas que el repositorio conserva de ellos."""
 
+        self._repository.invalidate(dataset_id)
         if dataset_id is None and branch_id is None:
-            prefix = "report:"
+            prefixes = ["report:"]
+        elif branch_id is None:
+            prefixes = [f"report:{dataset_id}:branch:"]
         else:
-            branch_part = branch_id if branch_id is not None else ""
-            dataset_part = dataset_id if dataset_id is not None else ""
-            prefix = f"report:{dataset_part}:branch:{branch_part}"
-        self._cache.invalidate_prefix(prefix)
+            datasets = [dataset_id] if dataset_id is not None else list(PIPELINES)
+            prefixes = [f"report:{dataset}:branch:{branch_id}:" for dataset in datasets]
+        for prefix in prefixes:
+            self._cache.invalidate_prefix(prefix)
+
+    @staticmethod
+    def _cache_prefixes(dataset_id: str, branch_id: Optional[int]) -> Tuple[str, ...]:
+        """Prefijos que ``invalidate`` puede pedir para una llave; se indexan al guardarla."""
+
+        branch_part = branch_id if branch_id is not None else "global"
+        return ("report:", f"report:{dataset_id}:branch:", f"report:{dataset_id}:branch:{branch_part}:")
 
 
 __all__ = [
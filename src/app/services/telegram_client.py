@@ -61,6 +61,29 @@ class TelegramClient:
         self._transport = transport
         self._logger = logger or structlog.get_logger("telegram_service")
         self._send_endpoint = f"/bot{self._bot_token}/sendMessage" if self._bot_token else ""
+        # Un solo cliente con keep-alive: los envíos consecutivos reutilizan la conexión TLS
+        self._client: Optional[httpx.Client] = (
+            httpx.Client(
+                base_url=self._BASE_URL,
+                timeout=self._timeout_seconds,
+                transport=self._transport,
+                limits=httpx.Limits(max_keepalive_connections=5, keepalive_expiry=30),
+            )
+            if enabled
+            else None
+        )
+
+    def close(self) -> None:
+        """Cierra el pool de conexiones HTTP del cliente."""
+
+        if self._client is not None:
+            self._client.close()
+
+    def __enter__(self) -> "TelegramClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     @property
     def enabled(self) -> bool:
@@ -92,7 +115,7 @@ class TelegramClient:
         )
         logger = bind_log_context(self._logger, context)
 
-        if not self._enabled:
+        if not self._enabled or self._client is None:
             logger.warning(
                 "Las notificaciones de Telegram están deshabilitadas",
                 records_processed=0,
@@ -120,12 +143,7 @@ class TelegramClient:
 
         start_time = time.perf_counter()
         try:
-            with httpx.Client(
-                base_url=self._BASE_URL,
-                timeout=self._timeout_seconds,
-                transport=self._transport,
-            ) as client:
-                response = client.post(self._send_endpoint, json=payload)
+            response = self._client.post(self._send_endpoint, json=payload)
         except httpx.TimeoutException as exc:
             duration_ms = self._elapsed_ms(start_time)
             logger.error(
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, List, Optional, Dict
+from typing import Dict, Iterable, List, Optional, Pattern, Union
 
 from app.models import EmailAttachment
 
@@ -11,18 +11,31 @@ from app.models import EmailAttachment
 _COLUMN_ALIASES: Dict[str, List[str]] = {}
 
 
-_SUBJECT_NORMALIZER = re.compile(r"\s+")
+def compile_subject_pattern(expected_subject_pattern: str) -> Pattern[str]:
+    """Compile the subject pattern once (case-insensitive, any run of whitespace between words)."""
 
+    words = expected_subject_pattern.split()
+    return re.compile(r"\s+".join(re.escape(word) for word in words), re.IGNORECASE)
 
-def _normalize(value: str) -> str:
-    return _SUBJECT_NORMALIZER.sub(" ", value.strip()).lower()
+
+def subject_matches_pattern(
+    subject: Optional[str],
+    expected_subject_pattern: Union[str, Pattern[str]],
+) -> bool:
+    """Return True when the pattern appears in the subject (case/whitespace-insensitive)."""
+
+    if not subject or not subject.strip():
+        return False
+    if isinstance(expected_subject_pattern, str):
+        expected_subject_pattern = compile_subject_pattern(expected_subject_pattern)
+    return expected_subject_pattern.search(subject) is not None
 
 
 def validate_email_structure(
     subject: str,
     fecha_generacion: Optional[str],
     attachments: Iterable[EmailAttachment],
-    expected_subject_pattern: str,
+    expected_subject_pattern: Union[str, Pattern[str]],
 ) -> tuple[bool, List[str]]:
     """Validate mandatory pieces of an email and return (is_valid, errors).
 
@@ -35,14 +48,13 @@ def validate_email_structure(
     attachments:
         Iterable of `EmailAttachment` already extracted from the message.
     expected_subject_pattern:
-        Pattern that should appear within the subject (case-insensitive).
+        Pattern that should appear within the subject (case-insensitive). A regex
+        precompiled with `compile_subject_pattern` may be passed to avoid recompiling it.
     """
 
     errors: List[str] = []
 
-    normalized_subject = _normalize(subject) if subject else ""
-    normalized_pattern = _normalize(expected_subject_pattern)
-    if not normalized_subject or normalized_pattern not in normalized_subject:
+    if not subject_matches_pattern(subject, expected_subject_pattern):
         errors.append("subject_pattern_mismatch")
 
     if not fecha_generacion:
@@ -5,7 +5,6 @@ Script de verificación rápida de configuración OAuth
 
 import os
 import json
-import pickle
 from pathlib import Path
 
 def check_oauth_setup():
@@ -62,12 +61,14 @@ def check_oauth_setup():
         print("   ⚠️  No se encontró .env")
         print("   💡 Copiar .env.example a .env")
 
-    # 4. Verificar token.pickle
-    print("\n4. Verificando token.pickle...")
-    if os.path.exists('token.pickle'):
+    # 4. Verificar token OAuth (JSON; un pickle heredado se migra al cargarlo)
+    token_path = os.environ.get('GOOGLE_TOKEN_PATH', 'token.pickle')
+    print(f"\n4. Verificando token OAuth ({token_path})...")
+    if os.path.exists(token_path):
         try:
-            with open('token.pickle', 'rb') as f:
-                creds = pickle.load(f)
+            from app.services.gmail_oauth_service import GmailOAuthService
+            from app.services.oauth_token_store import load_token
+            creds = load_token(token_path, GmailOAuthService.SCOPES)
             if hasattr(creds, 'valid') and creds.valid:
                 print("   ✅ Token válido y activo")
             else:
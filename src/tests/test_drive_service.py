@@ -1,5 +1,7 @@
 """Tests for `DriveService` helpers and unique filename logic."""
 
+import io
+import threading
 from types import SimpleNamespace
 from unittest.mock import MagicMock
 
@@ -7,6 +9,7 @@ import pytest
 from googleapiclient.errors import HttpError
 
 from app.config import Settings
+from app.services import drive_service as drive_module
 from app.services.drive_service import DriveService
 
 
@@ -205,3 +208,66 @@ def test_upload_attachments_generates_unique_names_for_duplicates(monkeypatch, d
         "20250110_Distrito_doc_20250102030405_1.pdf",
     ]
     assert [item["name"] for item in uploaded] == captured_names
+
+
+def test_upload_attachments_streams_spooled_attachment(drive_service):
+    drive_service.ensure_generation_folder = MagicMock(return_value="folder123")
+    drive_service._generate_unique_filename = MagicMock(side_effect=lambda folder_id, name: name)
+    drive_service.upload_file = MagicMock(return_value={"id": "file1", "name": "informe.pdf"})
+
+    stream = io.BytesIO(b"PDFDATA")
+    stream.read()
+    attachment = SimpleNamespace(
+        filename="informe.pdf",
+        content_type="application/pdf",
+        data=None,
+        stream=stream,
+    )
+
+    folder_id, uploaded, errors = drive_service.upload_attachments("20250110", [attachment])
+
+    assert folder_id == "folder123"
+    assert errors == []
+    assert drive_service.upload_file.call_args.kwargs["data"] is stream
+    assert stream.tell() == 0
+
+
+def test_ensure_service_builds_over_pooled_authorized_http(drive_settings, monkeypatch):
+    build_mock = MagicMock(return_value=object())
+    monkeypatch.setattr(drive_module, "build", build_mock)
+    service = DriveService(drive_settings)
+    credentials = SimpleNamespace(valid=True, expired=False)
+    service._obtain_credentials = MagicMock(return_value=credentials)
+
+    service._ensure_service()
+    service._ensure_service()
+
+    build_mock.assert_called_once_with(
+        "drive", "v3", http=service._http, cache_discovery=False, static_discovery=True
+    )
+    assert service._http.credentials is credentials
+
+    service.close()
+    assert service._http is None
+
+
+def test_execute_uses_one_http_per_thread_and_close_releases_them(drive_settings, monkeypatch):
+    monkeypatch.setattr(drive_module, "build", MagicMock(return_value=object()))
+    service = DriveService(drive_settings)
+    service._obtain_credentials = MagicMock(return_value=SimpleNamespace(valid=True, expired=False))
+    service._ensure_service()
+    seen = []
+    request = SimpleNamespace(execute=lambda http=None: seen.append(http))
+
+    service._execute(request)
+    service._execute(request)
+    worker = threading.Thread(target=service._execute, args=(request,))
+    worker.start()
+    worker.join()
+
+    assert seen[0] is seen[1] and seen[2] is not seen[0]
+    assert service._http not in seen
+    assert len(service._thread_https) == 2
+
+    service.close()
+    assert service._thread_https == {}
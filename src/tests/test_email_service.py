@@ -19,7 +19,7 @@ from app.models import EmailAttachment, ProcessingResult
 from app.services.email_service import EmailService
 from app.services.email_html_parser import extract_primary_table
 from app.services.email_content_utils import extract_fecha_generacion, collect_table_texts
-from app.services.validators import validate_email_structure
+from app.services.validators import compile_subject_pattern, validate_email_structure
 
 
 @pytest.fixture
@@ -463,3 +463,15 @@ class TestValidators:
         assert "subject_pattern_mismatch" in errors
         assert "fecha_generacion_missing" in errors
         assert "pdf_attachment_missing" in errors
+
+    def test_validate_email_structure_accepts_compiled_pattern(self):
+        attachments = [EmailAttachment(filename="info.pdf", size=10, content_type="application/pdf")]
+        is_valid, errors = validate_email_structure(
+            subject="MISIONEROS  que\tllegan el 10 de enero",
+            fecha_generacion="20250110",
+            attachments=attachments,
+            expected_subject_pattern=compile_subject_pattern("Misioneros que llegan"),
+        )
+
+        assert is_valid is True
+        assert errors == []
@@ -1,6 +1,13 @@
 """Tests for `GmailOAuthService` covering OAuth-driven flows."""
 
+import asyncio
 import base64
+import json
+import threading
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from datetime import datetime, timedelta, timezone
 from types import SimpleNamespace
 from unittest.mock import AsyncMock, MagicMock, Mock
 
@@ -9,8 +16,13 @@ from googleapiclient.errors import HttpError
 
 from app.config import Settings
 from app.services.email_html_parser import extract_primary_table
-from app.services.email_content_utils import extract_fecha_generacion, collect_table_texts
-from app.services.gmail_oauth_service import GmailOAuthService
+from app.services.email_content_utils import (
+    collect_table_texts,
+    extract_fecha_generacion,
+    parse_email_date,
+)
+from app.services import gmail_oauth_service as gmail_module
+from app.services.gmail_oauth_service import GmailOAuthService, _AsyncBatcher, _decode_base64url
 
 
 def _build_settings(**overrides) -> Settings:
@@ -25,8 +37,10 @@ def _build_settings(**overrides) -> Settings:
     return Settings(_env_file=None, **data)
 
 
-def _encode_body(text: str) -> str:
-    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("utf-8")
+@pytest.fixture(autouse=True)
+def _no_retry_backoff(monkeypatch):
+    """Evita esperas reales en los reintentos de Gmail API."""
+    monkeypatch.setattr(GmailOAuthService, "RETRY_BASE_SECONDS", 0)
 
 
 def _http_error(status: int, message: str) -> HttpError:
@@ -34,42 +48,61 @@ def _http_error(status: int, message: str) -> HttpError:
     return HttpError(resp=resp, content=message.encode("utf-8"))
 
 
-def _default_message_payload() -> dict:
-    html_body = """
-        <html>
-          <body>
-            <p>Generación del 10 de enero de 2025</p>
-            <table>
-              <tr><th>Distrito</th><th>Zona</th></tr>
-              <tr><td>14A</td><td>Benemerito</td></tr>
-            </table>
-          </body>
-        </html>
-    """
+_DEFAULT_HTML_BODY = """
+    <html>
+      <body>
+        <p>Generación del 10 de enero de 2025</p>
+        <table>
+          <tr><th>Distrito</th><th>Zona</th></tr>
+          <tr><td>14A</td><td>Benemerito</td></tr>
+        </table>
+      </body>
+    </html>
+"""
+
+_DEFAULT_ATTACHMENTS = (("info.pdf", "application/pdf", b"PDFDATA"),)
+
+
+def _build_raw_message(
+    *,
+    text_body: str | None = "Generación del 10 de enero de 2025",
+    html_body: str | None = _DEFAULT_HTML_BODY,
+    subject: str = "Misioneros que llegan el 10 de enero",
+    sender: str = "natalia@example.com",
+    date: str = "Fri, 10 Jan 2025 00:00:00 +0000",
+    attachments: tuple = _DEFAULT_ATTACHMENTS,
+) -> MIMEMultipart:
+    mime = MIMEMultipart("mixed")
+    mime["Subject"] = subject
+    mime["From"] = sender
+    mime["Date"] = date
+
+    body = MIMEMultipart("alternative")
+    if text_body is not None:
+        body.attach(MIMEText(text_body, "plain", "utf-8"))
+    if html_body is not None:
+        body.attach(MIMEText(html_body, "html", "utf-8"))
+    mime.attach(body)
+
+    for filename, content_type, data in attachments:
+        part = MIMEApplication(data, _subtype=content_type.split("/", 1)[1])
+        part.add_header("Content-Disposition", "attachment", filename=filename)
+        mime.attach(part)
+
+    return mime
+
+
+def _encode_raw(mime: MIMEMultipart) -> str:
+    return base64.urlsafe_b64encode(mime.as_bytes()).decode("ascii")
+
+
+def _default_message_payload(**overrides) -> dict:
+    """Respuesta válida tanto para ``format='metadata'`` como para ``format='raw'``."""
+    subject = overrides.get("subject", "Misioneros que llegan el 10 de enero")
     return {
-        "payload": {
-            "headers": [
-                {"name": "Subject", "value": "Misioneros que llegan el 10 de enero"},
-                {"name": "From", "value": "natalia@example.com"},
-                {"name": "Date", "value": "2025-01-10T00:00:00+00:00"},
-            ],
-            "parts": [
-                {
-                    "mimeType": "text/plain",
-                    "body": {"data": _encode_body("Generación del 10 de enero de 2025")},
-                },
-                {
-                    "mimeType": "text/html",
-                    "body": {"data": _encode_body(html_body)},
-                },
-                {
-                    "mimeType": "application/pdf",
-                    "filename": "info.pdf",
-                    "body": {"attachmentId": "att1"},
-                    "partId": "part_1",
-                },
-            ],
-        }
+        "id": "msg1",
+        "payload": {"headers": [{"name": "Subject", "value": subject}]},
+        "raw": _encode_raw(_build_raw_message(**overrides)),
     }
 
 
@@ -100,8 +133,37 @@ def _setup_service(settings: Settings, drive_service: Mock | None = None) -> Gma
     return service
 
 
+class _FakeBatch:
+    """Simula `BatchHttpRequest` ejecutando cada subsolicitud en orden."""
+
+    def __init__(self, callback=None):
+        self._callback = callback
+        self.requests: list = []
+        self.executed = 0
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        self.executed += 1
+        for request_id, request in self.requests:
+            try:
+                response, exception = request.execute(), None
+            except Exception as exc:  # noqa: BLE001
+                response, exception = None, exc
+            self._callback(request_id, response, exception)
+
+
 def _mock_chain() -> tuple[MagicMock, MagicMock, MagicMock]:
     gmail_service = MagicMock(name="gmail_service")
+    gmail_service.batches = []
+
+    def _new_batch(callback=None):
+        batch = _FakeBatch(callback)
+        gmail_service.batches.append(batch)
+        return batch
+
+    gmail_service.new_batch_http_request.side_effect = _new_batch
     users = gmail_service.users.return_value
     messages = users.messages.return_value
     labels = users.labels.return_value
@@ -116,8 +178,6 @@ async def test_process_incoming_emails_success():
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = _default_message_payload()
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -130,14 +190,24 @@ async def test_process_incoming_emails_success():
     assert result.processed == 1
     detail = result.details[0]
     assert detail["success"] is True
+    assert detail["date"] == "2025-01-10T00:00:00+00:00"
     assert detail["parsed_table"]["headers"] == ["Distrito", "Zona"]
     assert detail["parsed_table"]["rows"][0]["Distrito"] == "14A"
     assert detail["table_errors"] == []
     assert detail["drive_folder_id"] is None
     assert detail["drive_uploaded_files"] == []
     assert detail["drive_upload_errors"] == []
-    messages.modify.assert_any_call(userId="me", id="msg1", body={"removeLabelIds": ["UNREAD"]})
-    messages.modify.assert_any_call(userId="me", id="msg1", body={"addLabelIds": ["lbl123"]})
+    messages.modify.assert_called_once_with(
+        userId="me",
+        id="msg1",
+        body={"removeLabelIds": ["UNREAD"], "addLabelIds": ["lbl123"]},
+        fields="id",
+    )
+    # metadata, raw y modify: un lote por etapa
+    assert [batch.executed for batch in gmail_service.batches] == [1, 1, 1]
+    assert [call.kwargs["format"] for call in messages.get.call_args_list] == ["metadata", "raw"]
+    assert messages.get.call_args_list[0].kwargs["metadataHeaders"] == ["Subject", "From"]
+    assert messages.get.call_args_list[1].kwargs["fields"] == "id,raw"
 
 
 @pytest.mark.asyncio
@@ -146,16 +216,13 @@ async def test_process_incoming_emails_extracts_fecha_from_table_title():
     service = _setup_service(settings)
     gmail_service, messages, labels = _mock_chain()
 
-    payload = _default_message_payload()
-    payload["payload"]["parts"][0]["body"]["data"] = _encode_body("Contenido sin fecha en cuerpo")
-    payload["payload"]["parts"][1]["body"]["data"] = _encode_body(
-        _table_with_generation_title("Generación del 22 de septiembre de 2025")
+    payload = _default_message_payload(
+        text_body="Contenido sin fecha en cuerpo",
+        html_body=_table_with_generation_title("Generación del 22 de septiembre de 2025"),
     )
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = payload
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -203,13 +270,12 @@ async def test_process_incoming_emails_http_error():
 
 
 @pytest.mark.asyncio
-async def test_process_incoming_emails_attachment_error():
+async def test_process_incoming_emails_without_attachments():
     service = _setup_service(_build_settings())
     gmail_service, messages, labels = _mock_chain()
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
-    messages.get.return_value.execute.return_value = _default_message_payload()
-    messages.attachments.return_value.get.return_value.execute.side_effect = RuntimeError("attachment error")
+    messages.get.return_value.execute.return_value = _default_message_payload(attachments=())
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -220,8 +286,235 @@ async def test_process_incoming_emails_attachment_error():
     detail = result.details[0]
     assert detail["attachments_count"] == 0
     assert detail["success"] is False
+    assert "attachments_missing" in detail["validation_errors"]
     assert "parsed_table" in detail
     assert detail["drive_uploaded_files"] == []
+    messages.attachments.assert_not_called()
+    # Validación fallida: rechazo definitivo, etiquetado sin marcarlo como leído
+    messages.modify.assert_called_once_with(userId="me", id="msg1", body={"addLabelIds": ["lbl123"]}, fields="id")
+
+
+@pytest.mark.asyncio
+async def test_rejected_message_is_not_listed_again_and_exceptions_stay_pending():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, labels = _mock_chain()
+    inbox = {"bad": _default_message_payload(attachments=()), "flaky": _default_message_payload()}
+    rejected: set = set()
+
+    def _list(**kwargs):
+        # Emula la búsqueda de Gmail: ``-label:`` excluye los mensajes con la etiqueta de rechazo
+        assert kwargs["q"].endswith("is:unread -label:misioneros-rechazados")
+        request = MagicMock()
+        request.execute.return_value = {"messages": [{"id": msg_id} for msg_id in inbox if msg_id not in rejected]}
+        return request
+
+    def _get(userId, id, **kwargs):
+        request = MagicMock()
+        if id == "flaky" and kwargs["format"] == "raw":
+            request.execute.side_effect = RuntimeError("timeout")
+        else:
+            request.execute.return_value = inbox[id]
+        return request
+
+    def _modify(userId, id, body, fields):
+        if body.get("addLabelIds") == ["lbl-rej"]:
+            rejected.add(id)
+        return MagicMock()
+
+    messages.list.side_effect = _list
+    messages.get.side_effect = _get
+    messages.modify.side_effect = _modify
+    labels.list.return_value.execute.return_value = {"labels": [{"name": "misioneros-rechazados", "id": "lbl-rej"}]}
+    service.gmail_service = gmail_service
+
+    first = await service.process_incoming_emails()
+    second = await service.process_incoming_emails()
+
+    assert first.errors == 2
+    assert rejected == {"bad"}
+    assert [call.kwargs["id"] for call in messages.modify.call_args_list] == ["bad"]
+    # El mensaje rechazado ya no se lista; el que falló por excepción sigue pendiente
+    assert [detail["message_id"] for detail in second.details] == ["flaky"]
+
+
+@pytest.mark.asyncio
+async def test_process_incoming_emails_processes_messages_concurrently():
+    service = _setup_service(_build_settings(gmail_concurrency=2))
+    gmail_service, messages, labels = _mock_chain()
+
+    messages.list.return_value.execute.return_value = {"messages": [{"id": f"msg{index}"} for index in range(3)]}
+    messages.get.return_value.execute.return_value = _default_message_payload()
+    labels.create.return_value.execute.return_value = {"id": "lbl123"}
+
+    in_flight = 0
+    peak = 0
+    original = service._process_single_message
+
+    async def _tracking(message, msg_id, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        try:
+            return await original(message, msg_id, **kwargs)
+        finally:
+            in_flight -= 1
+
+    service._process_single_message = _tracking
+    service.gmail_service = gmail_service
+
+    result = await service.process_incoming_emails()
+
+    assert result.processed == 3
+    assert [detail["message_id"] for detail in result.details] == ["msg0", "msg1", "msg2"]
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_drive_uploads_of_different_messages_overlap():
+    drive_service = Mock()
+    both_uploading = threading.Barrier(2, timeout=5)
+
+    def _upload(fecha_generacion, attachments, distrito, *, log_context=None):
+        # Solo pasa si la subida del otro mensaje está en curso al mismo tiempo
+        both_uploading.wait()
+        return "folder", [{"id": "file"}], []
+
+    drive_service.upload_attachments.side_effect = _upload
+    service = _setup_service(_build_settings(gmail_concurrency=2), drive_service=drive_service)
+    gmail_service, messages, labels = _mock_chain()
+    messages.list.return_value.execute.return_value = {"messages": [{"id": "msg0"}, {"id": "msg1"}]}
+    messages.get.return_value.execute.return_value = _default_message_payload()
+    labels.create.return_value.execute.return_value = {"id": "lbl123"}
+    service.gmail_service = gmail_service
+
+    result = await service.process_incoming_emails()
+
+    assert [detail["drive_upload_errors"] for detail in result.details] == [[], []]
+    assert drive_service.upload_attachments.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_process_incoming_emails_skips_raw_fetch_on_subject_mismatch():
+    service = _setup_service(_build_settings(processed_label="", rejected_label=""))
+    gmail_service, messages, _ = _mock_chain()
+
+    messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
+    messages.get.return_value.execute.return_value = _default_message_payload(subject="Boletín semanal")
+
+    service.gmail_service = gmail_service
+
+    result = await service.process_incoming_emails()
+
+    assert result.processed == 0
+    assert result.errors == 1
+    assert result.details[0]["validation_errors"] == ["subject_pattern_mismatch"]
+    assert [call.kwargs["format"] for call in messages.get.call_args_list] == ["metadata"]
+    # Sin etiqueta de rechazo el mensaje ajeno se marca como leído para no listarlo otra vez
+    messages.modify.assert_called_once_with(userId="me", id="msg1", body={"removeLabelIds": ["UNREAD"]}, fields="id")
+
+
+@pytest.mark.asyncio
+async def test_async_batcher_shrinks_and_retries_on_rate_limit():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, _ = _mock_chain()
+    service.gmail_service = gmail_service
+    throttled_once: set = set()
+
+    def _get(userId, id, **kwargs):  # noqa: A002 - firma de Gmail API
+        def _execute():
+            if id == "msg0" and id not in throttled_once:
+                throttled_once.add(id)
+                raise _http_error(429, "Too Many Requests")
+            return {"id": id}
+
+        return SimpleNamespace(execute=_execute)
+
+    messages.get.side_effect = _get
+    batcher = _AsyncBatcher(service, workers=1, initial_size=4, min_size=1, throttle_backoff_seconds=0)
+    logger = MagicMock()
+
+    responses, errors = await batcher.fetch_all([f"msg{index}" for index in range(3)], logger, format="raw")
+
+    assert errors == {}
+    assert sorted(responses) == ["msg0", "msg1", "msg2"]
+    assert batcher.batch_size == 2
+    assert [len(batch.requests) for batch in gmail_service.batches] == [3, 1]
+
+
+@pytest.mark.asyncio
+async def test_async_batcher_grows_after_clean_batches():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, _ = _mock_chain()
+    service.gmail_service = gmail_service
+    messages.get.return_value.execute.return_value = {"id": "msg"}
+    batcher = _AsyncBatcher(service, workers=1, initial_size=2, max_size=8, grow_after=2)
+
+    await batcher.fetch_all([f"msg{index}" for index in range(4)], MagicMock(), format="raw")
+
+    assert [len(batch.requests) for batch in gmail_service.batches] == [2, 2]
+    assert batcher.batch_size == 4
+
+
+@pytest.mark.asyncio
+async def test_async_batcher_closes_worker_http_clients():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, _ = _mock_chain()
+    service.gmail_service = gmail_service
+    messages.get.return_value.execute.return_value = {"id": "msg"}
+    clients = []
+
+    def _new_worker_http():
+        clients.append(SimpleNamespace(http=MagicMock()))
+        return clients[-1]
+
+    service._new_worker_http = _new_worker_http
+    batcher = _AsyncBatcher(service, workers=2, initial_size=1)
+
+    await batcher.fetch_all(["msg0", "msg1"], MagicMock(), format="raw")
+
+    assert len(clients) == 2
+    assert all(client.http.close.call_count == 1 for client in clients)
+
+
+@pytest.mark.asyncio
+async def test_execute_retries_transient_errors():
+    service = GmailOAuthService(_build_settings())
+    request = Mock()
+    request.execute.side_effect = [_http_error(503, "Unavailable"), _http_error(429, "Too Many"), {"ok": True}]
+
+    assert await service._execute(request) == {"ok": True}
+    assert request.execute.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_execute_does_not_retry_client_errors():
+    service = GmailOAuthService(_build_settings())
+    request = Mock()
+    request.execute.side_effect = _http_error(404, "Not found")
+
+    with pytest.raises(HttpError):
+        await service._execute(request)
+    assert request.execute.call_count == 1
+
+
+def test_retry_delay_honors_retry_after():
+    service = GmailOAuthService(_build_settings())
+    resp = gmail_module.httplib2.Response({"status": 429, "retry-after": "7"})
+    exc = HttpError(resp=resp, content=b"Too Many Requests")
+
+    assert service._retry_delay(exc, attempt=1) == 7.0
+
+
+def test_gmail_batches_use_api_specific_endpoint():
+    # El endpoint global de batch fue retirado; el cliente debe usar el host de Gmail
+    gmail_service = gmail_module.build(
+        "gmail", "v1", http=gmail_module.httplib2.Http(), cache_discovery=False, static_discovery=True
+    )
+
+    batch = gmail_service.new_batch_http_request()
+
+    assert batch._batch_uri.startswith("https://gmail.googleapis.com/batch")
 
 
 @pytest.mark.asyncio
@@ -231,14 +524,15 @@ async def test_search_emails_success():
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = {
+        "id": "msg1",
         "payload": {
+            "mimeType": "multipart/mixed",
             "headers": [
                 {"name": "Subject", "value": "Misioneros"},
                 {"name": "From", "value": "sender@example.com"},
                 {"name": "Date", "value": "2025-01-10"},
             ],
-            "parts": [],
-        }
+        },
     }
 
     service.gmail_service = gmail_service
@@ -246,6 +540,28 @@ async def test_search_emails_success():
     results = await service.search_emails("subject:Test")
     assert len(results) == 1
     assert results[0]["subject"] == "Misioneros"
+    assert results[0]["has_attachments"] is True
+    messages.get.assert_called_once_with(
+        userId="me",
+        id="msg1",
+        format="metadata",
+        metadataHeaders=["Subject", "From", "Date"],
+        fields="id,payload(mimeType,headers)",
+    )
+    assert len(gmail_service.batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_search_emails_skips_failed_metadata():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, _ = _mock_chain()
+
+    messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
+    messages.get.return_value.execute.side_effect = _http_error(404, "Not found")
+
+    service.gmail_service = gmail_service
+
+    assert await service.search_emails("subject:Test") == []
 
 
 @pytest.mark.asyncio
@@ -265,14 +581,11 @@ async def test_process_incoming_emails_html_missing_generates_error():
     service = _setup_service(settings)
     gmail_service, messages, labels = _mock_chain()
 
-    payload = _default_message_payload()
-    # Remove HTML part to force error
-    payload["payload"]["parts"] = [payload["payload"]["parts"][0]]
+    # Sin parte HTML para forzar el error
+    payload = _default_message_payload(html_body=None)
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = payload
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -303,8 +616,6 @@ async def test_process_incoming_emails_uploads_to_drive():
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = _default_message_payload()
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -318,6 +629,59 @@ async def test_process_incoming_emails_uploads_to_drive():
     assert len(detail["drive_uploaded_files"]) == 1
     assert detail["drive_upload_errors"] == []
     drive_service.upload_attachments.assert_called_once()
+    uploaded_attachment = drive_service.upload_attachments.call_args.args[1][0]
+    assert uploaded_attachment.data is None
+    assert uploaded_attachment.size == len(b"PDFDATA")
+    assert uploaded_attachment.stream.closed
+
+
+@pytest.mark.asyncio
+async def test_process_incoming_emails_reads_attachments_from_raw_message():
+    settings = _build_settings()
+    drive_service = Mock()
+    drive_service.upload_attachments.return_value = ("folder123", [], [])
+
+    service = _setup_service(settings, drive_service=drive_service)
+    gmail_service, messages, labels = _mock_chain()
+
+    attachments = (
+        ("info.pdf", "application/pdf", b"PDFDATA"),
+        ("fotos.zip", "application/zip", b"ZIPDATA"),
+    )
+    messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
+    messages.get.return_value.execute.return_value = _default_message_payload(attachments=attachments)
+
+    labels.create.return_value.execute.return_value = {"id": "lbl123"}
+    messages.modify.return_value.execute.return_value = {}
+
+    service.gmail_service = gmail_service
+
+    result = await service.process_incoming_emails()
+
+    assert result.details[0]["success"] is True
+    uploaded = drive_service.upload_attachments.call_args.args[1]
+    assert [(a.filename, a.size) for a in uploaded] == [("info.pdf", 7), ("fotos.zip", 7)]
+    # Los bytes vienen dentro del mensaje raw: ningún attachments().get adicional
+    messages.attachments.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_single_message_parses_large_raw_off_event_loop(monkeypatch):
+    service = _setup_service(_build_settings())
+    monkeypatch.setattr(GmailOAuthService, "OFFLOAD_DECODE_MIN_BYTES", 0)
+    to_thread_calls = []
+    original_to_thread = gmail_module.asyncio.to_thread
+
+    async def _spy_to_thread(func, *args, **kwargs):
+        to_thread_calls.append(getattr(func, "__name__", repr(func)))
+        return await original_to_thread(func, *args, **kwargs)
+
+    monkeypatch.setattr(gmail_module.asyncio, "to_thread", _spy_to_thread)
+
+    result = await service._process_single_message(_default_message_payload(), "msg1")
+
+    assert result["success"] is True
+    assert to_thread_calls[:2] == ["_parse_raw_message", "_cpu_parse"]
 
 
 @pytest.mark.asyncio
@@ -329,23 +693,20 @@ async def test_process_incoming_emails_drive_missing_fecha_generacion():
     service = _setup_service(settings, drive_service=drive_service)
     gmail_service, messages, labels = _mock_chain()
 
-    payload = _default_message_payload()
-    payload["payload"]["parts"][0]["body"]["data"] = _encode_body("Mensaje sin fecha")
-    payload["payload"]["parts"][1]["body"]["data"] = _encode_body(
-        """
+    payload = _default_message_payload(
+        text_body="Mensaje sin fecha",
+        html_body="""
         <html><body>
           <table>
             <tr><th>Distrito</th><th>Zona Horaria</th></tr>
             <tr><td>15C</td><td>-2,-1,0 HORAS DE DIFERENCIA</td></tr>
           </table>
         </body></html>
-        """
+        """,
     )
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = payload
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -367,23 +728,20 @@ async def test_process_incoming_emails_missing_zona_allows_processing():
     service = _setup_service(settings)
     gmail_service, messages, labels = _mock_chain()
 
-    payload = _default_message_payload()
-    # Modify table to keep required columns but leave Zona value empty
-    payload["payload"]["parts"][1]["body"]["data"] = _encode_body(
-        """
+    # Mantener columnas requeridas pero dejar vacío el valor de Zona
+    payload = _default_message_payload(
+        html_body="""
         <html><body>
         <table>
           <tr><th>Distrito</th><th>Zona</th></tr>
           <tr><td>15C</td><td></td></tr>
         </table>
         </body></html>
-        """
+        """,
     )
 
     messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
     messages.get.return_value.execute.return_value = payload
-    attachments = messages.attachments.return_value
-    attachments.get.return_value.execute.return_value = {"data": _encode_body("PDFDATA")}
 
     labels.create.return_value.execute.return_value = {"id": "lbl123"}
     messages.modify.return_value.execute.return_value = {}
@@ -400,11 +758,10 @@ async def test_process_incoming_emails_missing_zona_allows_processing():
 
 
 @pytest.mark.asyncio
-async def test_mark_message_processed_conflict():
+async def test_mark_message_processed_reuses_existing_label():
     service = _setup_service(_build_settings())
     gmail_service, messages, labels = _mock_chain()
 
-    labels.create.return_value.execute.side_effect = _http_error(409, "exists")
     labels.list.return_value.execute.return_value = {
         "labels": [{"id": "lbl123", "name": service.settings.processed_label}]
     }
@@ -412,10 +769,80 @@ async def test_mark_message_processed_conflict():
     service.gmail_service = gmail_service
 
     await service._mark_message_processed("msg1")
+    await service._flush_processed_marks()
+
+    labels.list.return_value.execute.assert_called_once_with()
+    labels.create.assert_not_called()
+    messages.modify.assert_called_once_with(
+        userId="me",
+        id="msg1",
+        body={"removeLabelIds": ["UNREAD"], "addLabelIds": ["lbl123"]},
+        fields="id",
+    )
+    assert len(gmail_service.batches) == 1
+    batch = gmail_service.batches[0]
+    assert batch.requests == [("msg1", messages.modify.return_value)]
+    assert batch.executed == 1
+
+
+@pytest.mark.asyncio
+async def test_mark_message_processed_memoizes_label_id():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, labels = _mock_chain()
+
+    labels.list.return_value.execute.return_value = {"labels": []}
+    labels.create.return_value.execute.return_value = {"id": "lbl999"}
+
+    service.gmail_service = gmail_service
+
+    await service._mark_message_processed("msg1")
+    await service._flush_processed_marks()
+    await service._mark_message_processed("msg2")
+    await service._flush_processed_marks()
+
+    labels.list.return_value.execute.assert_called_once_with()
+    labels.create.return_value.execute.assert_called_once_with()
+    messages.modify.assert_any_call(
+        userId="me",
+        id="msg2",
+        body={"removeLabelIds": ["UNREAD"], "addLabelIds": ["lbl999"]},
+        fields="id",
+    )
+
+
+@pytest.mark.asyncio
+async def test_resolve_label_id_caches_all_listed_labels():
+    service = _setup_service(_build_settings())
+    gmail_service, _, labels = _mock_chain()
+
+    labels.list.return_value.execute.return_value = {
+        "labels": [{"id": "lbl1", "name": "INBOX"}, {"id": "lbl2", "name": "otra"}]
+    }
+
+    service.gmail_service = gmail_service
+
+    assert await service._resolve_label_id("otra") == "lbl2"
+    assert await service._resolve_label_id("INBOX") == "lbl1"
 
     labels.list.return_value.execute.assert_called_once_with()
-    messages.modify.assert_any_call(userId="me", id="msg1", body={"removeLabelIds": ["UNREAD"]})
-    messages.modify.assert_any_call(userId="me", id="msg1", body={"addLabelIds": ["lbl123"]})
+    labels.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_resolve_label_id_charges_quota_per_endpoint():
+    service = _setup_service(_build_settings())
+    gmail_service, _, labels = _mock_chain()
+    service._rate_limiter = SimpleNamespace(acquire=AsyncMock())
+
+    labels.list.return_value.execute.return_value = {"labels": []}
+    labels.create.return_value.execute.return_value = {"id": "lbl123"}
+
+    service.gmail_service = gmail_service
+
+    assert await service._resolve_label_id("nueva") == "lbl123"
+
+    # labels.list cuesta 1 unidad y labels.create 5
+    assert [c.args for c in service._rate_limiter.acquire.await_args_list] == [(1,), (5,)]
 
 
 @pytest.mark.asyncio
@@ -426,52 +853,135 @@ async def test_mark_message_processed_without_label():
     service.gmail_service = gmail_service
 
     await service._mark_message_processed("msg1")
+    await service._flush_processed_marks()
 
-    messages.modify.assert_called_once_with(userId="me", id="msg1", body={"removeLabelIds": ["UNREAD"]})
+    messages.modify.assert_called_once_with(userId="me", id="msg1", body={"removeLabelIds": ["UNREAD"]}, fields="id")
 
 
-def test_get_message_body_prefers_plain_text():
-    payload = {
-        "parts": [
-            {"mimeType": "text/plain", "body": {"data": _encode_body("Texto plano")}},
-            {"mimeType": "text/html", "body": {"data": _encode_body("<p>HTML</p>")}},
-        ]
-    }
-    service = GmailOAuthService(_build_settings())
-    assert service._get_message_body(payload) == "Texto plano"
+@pytest.mark.asyncio
+async def test_flush_processed_marks_retries_throttled_messages():
+    service = _setup_service(_build_settings(processed_label=""))
+    gmail_service, messages, _ = _mock_chain()
+    service.gmail_service = gmail_service
+    throttled_once: set = set()
 
+    def _modify(userId, id, **kwargs):  # noqa: A002 - firma de Gmail API
+        def _execute():
+            if id == "msg2" and id not in throttled_once:
+                throttled_once.add(id)
+                raise _http_error(429, "Too Many Requests")
+            return {"id": id}
 
-def test_get_message_body_prefers_html_when_no_text():
-    payload = {
-        "parts": [
-            {"mimeType": "text/html", "body": {"data": _encode_body("<p>HTML</p>")}}
-        ]
-    }
+        return SimpleNamespace(execute=_execute)
+
+    messages.modify.side_effect = _modify
+
+    await service._mark_message_processed("msg1")
+    await service._mark_message_processed("msg2")
+    await service._flush_processed_marks()
+
+    assert [[request_id for request_id, _ in batch.requests] for batch in gmail_service.batches] == [
+        ["msg1", "msg2"],
+        ["msg2"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_flush_processed_marks_chunks_batches():
+    service = _setup_service(_build_settings(processed_label=""))
+    gmail_service, messages, _ = _mock_chain()
+
+    service.gmail_service = gmail_service
+
+    total = GmailOAuthService.BATCH_MAX_REQUESTS + 1
+    for index in range(total):
+        await service._mark_message_processed(f"msg{index}")
+    await service._flush_processed_marks()
+
+    assert [len(batch.requests) for batch in gmail_service.batches] == [
+        GmailOAuthService.BATCH_MAX_REQUESTS,
+        1,
+    ]
+    assert all(batch.executed == 1 for batch in gmail_service.batches)
+    assert service._pending_processed_marks == []
+
+
+def test_parse_raw_message_prefers_plain_text():
+    raw = _encode_raw(_build_raw_message(text_body="Texto plano", html_body="<p>HTML</p>", attachments=()))
     service = GmailOAuthService(_build_settings())
-    assert "HTML" in service._get_message_body(payload)
-
-
-def test_get_all_parts_recursive():
-    payload = {
-        "parts": [
-            {"mimeType": "text/plain", "body": {"data": _encode_body("text")}},
-            {
-                "mimeType": "multipart/mixed",
-                "parts": [{"mimeType": "application/pdf", "body": {"data": _encode_body("pdf")}}],
-            },
-        ]
-    }
+
+    headers, body, html_body, attachments = service._parse_raw_message(raw)
+
+    assert body == "Texto plano"
+    assert html_body == "<p>HTML</p>"
+    assert attachments == []
+    assert headers["subject"] == "Misioneros que llegan el 10 de enero"
+
+
+def test_parse_raw_message_prefers_html_when_no_text():
+    raw = _encode_raw(_build_raw_message(text_body=None, html_body="<p>HTML</p>", attachments=()))
     service = GmailOAuthService(_build_settings())
-    assert len(service._get_all_parts(payload)) == 3
 
+    _, body, _, _ = service._parse_raw_message(raw)
 
-def test_get_attachment_data_error_returns_none():
+    assert "HTML" in body
+
+
+def test_parse_raw_message_collects_nested_attachments():
+    mime = _build_raw_message(attachments=(("info.pdf", "application/pdf", b"PDFDATA"),))
+    nested = MIMEMultipart("mixed")
+    inner = MIMEApplication(b"XLSDATA", _subtype="octet-stream")
+    inner.add_header("Content-Disposition", "attachment", filename="datos.xlsx")
+    nested.attach(inner)
+    mime.attach(nested)
     service = GmailOAuthService(_build_settings())
-    gmail_service, messages, _ = _mock_chain()
-    messages.attachments.return_value.get.return_value.execute.side_effect = RuntimeError("attachment error")
-    service.gmail_service = gmail_service
 
-    assert service._get_attachment_data("msg", "part") is None
+    _, _, _, attachments = service._parse_raw_message(_encode_raw(mime))
+
+    assert [(name, data) for name, _, data in attachments] == [
+        ("info.pdf", b"PDFDATA"),
+        ("datos.xlsx", b"XLSDATA"),
+    ]
+    assert attachments[0][1] == "application/pdf"
+
+
+def test_spool_attachment_rolls_over_into_staging_dir(tmp_path, monkeypatch):
+    spooled = gmail_module.tempfile.SpooledTemporaryFile
+    calls = []
+
+    def _spy(*args, **kwargs):
+        calls.append(kwargs)
+        return spooled(*args, **kwargs)
+
+    monkeypatch.setattr(gmail_module.tempfile, "SpooledTemporaryFile", _spy)
+    service = GmailOAuthService(_build_settings(attachment_staging_dir=str(tmp_path)))
+    data = b"x" * (GmailOAuthService.ATTACHMENT_SPOOL_MAX_BYTES + 1)
+
+    with service._spool_attachment(data) as spool:
+        assert spool._rolled is True
+        assert spool.read() == data
+    assert calls[0]["dir"] == str(tmp_path)
+
+
+def test_decode_base64url_matches_stdlib():
+    payload = bytes(range(256)) * 3
+    encoded = base64.urlsafe_b64encode(payload).decode("ascii")
+
+    assert "-" in encoded and "_" in encoded
+    assert _decode_base64url(encoded) == payload
+
+
+def test_iter_leaf_parts_preserves_document_order():
+    inner = MIMEMultipart("alternative")
+    inner.attach(MIMEText("uno", "plain", "utf-8"))
+    inner.attach(MIMEText("<p>dos</p>", "html", "utf-8"))
+    outer = MIMEMultipart("mixed")
+    outer.attach(inner)
+    outer.attach(MIMEText("tres", "plain", "utf-8"))
+
+    leaves = list(GmailOAuthService._iter_leaf_parts(outer))
+
+    assert [part.get_payload(decode=True).decode() for part in leaves] == ["uno", "<p>dos</p>", "tres"]
 
 
 def test_extract_fecha_generacion_cases():
@@ -496,9 +1006,41 @@ def test_extract_fecha_generacion_cases():
     ) == "20240305"
 
 
-def test_get_header_value_missing():
-    service = GmailOAuthService(_build_settings())
-    assert service._get_header_value([{"name": "Subject", "value": "Test"}], "From") == ""
+def test_parse_email_date_handles_rfc2822_and_invalid_values():
+    parsed = parse_email_date("Mon, 3 Jun 2024 10:15:02 -0700")
+    assert parsed.isoformat() == "2024-06-03T10:15:02-07:00"
+
+    for invalid in ("", None, "no es una fecha"):
+        fallback = parse_email_date(invalid)
+        assert fallback.tzinfo is timezone.utc
+
+
+def test_header_map_is_case_insensitive_and_keeps_first_value():
+    headers = GmailOAuthService._header_map([
+        {"name": "SUBJECT", "value": "Primero"},
+        {"name": "Subject", "value": "Segundo"},
+    ])
+
+    assert headers == {"subject": "Primero"}
+
+
+@pytest.mark.asyncio
+async def test_search_emails_missing_headers_default_to_empty():
+    service = _setup_service(_build_settings())
+    gmail_service, messages, _ = _mock_chain()
+
+    messages.list.return_value.execute.return_value = {"messages": [{"id": "msg1"}]}
+    messages.get.return_value.execute.return_value = {
+        "id": "msg1",
+        "payload": {"mimeType": "text/plain", "headers": [{"name": "subject", "value": "Test"}]},
+    }
+
+    service.gmail_service = gmail_service
+
+    results = await service.search_emails("subject:Test")
+    assert results == [
+        {"id": "msg1", "subject": "Test", "sender": "", "date": "", "has_attachments": False}
+    ]
 
 
 @pytest.mark.asyncio
@@ -513,3 +1055,121 @@ async def test_close_resets_state():
     assert service.gmail_service is None
     assert service.credentials is None
     assert service._authenticated is False
+
+
+@pytest.mark.asyncio
+async def test_authenticate_loads_json_token(tmp_path, monkeypatch):
+    token_path = tmp_path / "token.json"
+    token_path.write_text(
+        json.dumps({
+            "token": "access",
+            "refresh_token": "refresh",
+            "client_id": "client",
+            "client_secret": "secret",
+            "expiry": "2999-01-01T00:00:00Z",
+        }),
+        encoding="utf-8",
+    )
+    build_mock = Mock(return_value=object())
+    monkeypatch.setattr(gmail_module, "build", build_mock)
+    service = GmailOAuthService(_build_settings(google_token_path=str(token_path)))
+
+    assert await service.authenticate() is True
+
+    assert service.credentials.token == "access"
+    assert service.credentials.refresh_token == "refresh"
+    assert service.gmail_service is build_mock.return_value
+    build_mock.assert_called_once_with(
+        "gmail", "v1", http=service._http, cache_discovery=False, static_discovery=True
+    )
+    assert service._http.credentials is service.credentials
+
+
+@pytest.mark.asyncio
+async def test_authenticate_reuses_valid_session(monkeypatch):
+    build_mock = Mock()
+    monkeypatch.setattr(gmail_module, "build", build_mock)
+    service = GmailOAuthService(_build_settings())
+    service.credentials = SimpleNamespace(valid=True)
+    service.gmail_service = object()
+    service._authenticated = True
+
+    results = await asyncio.gather(*(service.authenticate() for _ in range(3)))
+
+    assert results == [True, True, True]
+    build_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_authenticate_refreshes_in_place_near_expiry(tmp_path, monkeypatch):
+    build_mock = Mock()
+    monkeypatch.setattr(gmail_module, "build", build_mock)
+    token_path = tmp_path / "token.json"
+    service = GmailOAuthService(_build_settings(google_token_path=str(token_path)))
+    gmail_service = object()
+    near_expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(minutes=2)
+
+    def _refresh(_request):
+        creds.token = "renovado"
+        creds.expiry = near_expiry + timedelta(hours=1)
+
+    creds = SimpleNamespace(
+        valid=True,
+        expiry=near_expiry,
+        token="viejo",
+        refresh_token="refresh",
+        refresh=_refresh,
+        to_json=lambda: json.dumps({"token": creds.token}),
+    )
+    service.credentials = creds
+    service.gmail_service = gmail_service
+    service._authenticated = True
+
+    assert await service.authenticate() is True
+
+    assert creds.token == "renovado"
+    assert service.gmail_service is gmail_service
+    build_mock.assert_not_called()
+    assert json.loads(token_path.read_text(encoding="utf-8"))["token"] == "renovado"
+
+    # Fuera de la ventana de renovación no se vuelve a tocar disco ni red
+    token_path.unlink()
+    assert await service.authenticate() is True
+    assert not token_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_execute_uses_one_http_per_worker_thread():
+    service = GmailOAuthService(_build_settings())
+    service.credentials = object()
+    service._http = gmail_module.AuthorizedHttp(service.credentials, http=gmail_module.httplib2.Http())
+    seen = []
+
+    class _Request:
+        def execute(self, http=None):
+            seen.append(http)
+            return {"ok": True}
+
+    assert await service._execute(_Request()) == {"ok": True}
+    assert await service._execute(_Request()) == {"ok": True}
+
+    assert all(http is not None and http is not service._http for http in seen)
+    assert set(map(id, seen)) <= set(map(id, service._thread_https.values()))
+
+    await service.close()
+    assert service._thread_https == {}
+
+
+def test_thread_http_replaces_and_closes_client_after_credentials_change():
+    service = GmailOAuthService(_build_settings())
+    service.credentials = object()
+    first = service._thread_http()
+    first.http = MagicMock()
+
+    assert service._thread_http() is first
+    service.credentials = object()
+    second = service._thread_http()
+
+    assert second is not first
+    first.http.close.assert_called_once_with()
+    assert list(service._thread_https.values()) == [second]
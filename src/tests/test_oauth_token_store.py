@@ -0,0 +1,59 @@
+import json
+import pickle
+
+import pytest
+
+from google.oauth2.credentials import Credentials
+
+from app.services.oauth_token_store import load_token, save_token
+
+
+SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
+
+
+def _credentials(token: str) -> Credentials:
+    return Credentials(
+        token=token,
+        refresh_token="refresh",
+        client_id="client",
+        client_secret="secret",
+        token_uri="https://oauth2.googleapis.com/token",
+        scopes=SCOPES,
+    )
+
+
+def test_load_token_returns_none_when_missing(tmp_path):
+    assert load_token(str(tmp_path / "token.json"), SCOPES) is None
+
+
+def test_save_token_replaces_file_atomically(tmp_path):
+    token_path = tmp_path / "token.json"
+    token_path.write_text("{corrupto", encoding="utf-8")
+
+    save_token(str(token_path), _credentials("nuevo"))
+
+    assert json.loads(token_path.read_text(encoding="utf-8"))["token"] == "nuevo"
+    assert [p.name for p in tmp_path.iterdir()] == ["token.json"]
+
+    loaded = load_token(str(token_path), SCOPES)
+    assert loaded.token == "nuevo"
+    assert loaded.refresh_token == "refresh"
+
+
+def test_load_token_migrates_legacy_pickle_to_json(tmp_path):
+    token_path = tmp_path / "token.pickle"
+    token_path.write_bytes(pickle.dumps(_credentials("heredado")))
+
+    loaded = load_token(str(token_path), SCOPES)
+
+    assert loaded.token == "heredado"
+    assert json.loads(token_path.read_text(encoding="utf-8"))["refresh_token"] == "refresh"
+    assert load_token(str(token_path), SCOPES).token == "heredado"
+
+
+def test_load_token_rejects_unknown_format(tmp_path):
+    token_path = tmp_path / "token.pickle"
+    token_path.write_bytes(b"\x80\x04no-es-un-token")
+
+    with pytest.raises(ValueError, match="no es JSON ni un pickle"):
+        load_token(str(token_path), SCOPES)
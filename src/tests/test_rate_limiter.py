@@ -0,0 +1,62 @@
+"""Pruebas para `AsyncTokenBucket`."""
+
+import pytest
+
+from app.services import rate_limiter
+from app.services.rate_limiter import AsyncTokenBucket
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _FakeClock:
+    fake = _FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake.sleep)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_acquire_within_capacity_does_not_wait(clock: _FakeClock) -> None:
+    bucket = AsyncTokenBucket(rate=10)
+
+    await bucket.acquire(5)
+    await bucket.acquire(5)
+
+    assert clock.sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_acquire_waits_only_for_missing_tokens(clock: _FakeClock) -> None:
+    bucket = AsyncTokenBucket(rate=10)
+
+    await bucket.acquire(10)
+    await bucket.acquire(5)
+
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+@pytest.mark.asyncio
+async def test_acquire_larger_than_capacity_leaves_debt(clock: _FakeClock) -> None:
+    bucket = AsyncTokenBucket(rate=10)
+
+    await bucket.acquire(25)
+    await bucket.acquire(1)
+
+    assert clock.sleeps == [pytest.approx(1.6)]
+
+
+def test_rate_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        AsyncTokenBucket(rate=0)
@@ -191,3 +191,24 @@ def test_send_message_api_error_should_not_retry_on_client_issue() -> None:
     assert result.success is False
     assert result.error_code == "telegram_api_error"
     assert result.should_retry is False
+
+
+def test_send_message_reuses_one_http_client() -> None:
+    """Los envíos consecutivos comparten el mismo `httpx.Client` hasta `close()`."""
+
+    requests: list[httpx.Request] = []
+
+    class RecordingTransport(DummyTransport):
+        def handle_request(self, request: httpx.Request) -> httpx.Response:
+            requests.append(request)
+            return super().handle_request(request)
+
+    transport = RecordingTransport(status_code=200, json_body={"ok": True, "result": {"message_id": 1}})
+    with _make_client(transport=transport) as client:
+        http_client = client._client
+        assert client.send_message(text="uno").success
+        assert client.send_message(text="dos").success
+        assert client._client is http_client
+
+    assert len(requests) == 2
+    assert http_client.is_closed
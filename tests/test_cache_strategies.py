@@ -2,9 +2,14 @@
 
 from __future__ import annotations
 
+import json
+import threading
 import types
+from datetime import date
+from unittest.mock import MagicMock
 
 import pytest
+import structlog
 
 from app.services import cache_strategies
 
@@ -29,3 +34,89 @@ def test_create_cache_strategy_fallbacks_to_memory_when_redis_missing(monkeypatc
     strategy = cache_strategies.create_cache_strategy(settings)
 
     assert isinstance(strategy, cache_strategies.InMemoryCacheStrategy)
+
+
+def test_lazy_cache_metrics_render_current_counters_in_json() -> None:
+    strategy = cache_strategies.InMemoryCacheStrategy()
+    metrics = cache_strategies.LazyCacheMetrics(strategy)
+    strategy.get("ausente")
+
+    rendered = structlog.processors.JSONRenderer()(None, "info", {"event": "x", "cache_metrics": metrics})
+
+    assert json.loads(rendered)["cache_metrics"] == {**strategy.get_metrics(), "misses": 1}
+
+
+def test_in_memory_invalidate_prefix_uses_indexed_keys() -> None:
+    strategy = cache_strategies.InMemoryCacheStrategy()
+    strategy.set("report:a:branch:1:x", {"v": 1}, prefixes=("report:a:branch:1:",))
+    strategy.set("report:a:branch:14:x", {"v": 14}, prefixes=("report:a:branch:14:",))
+    strategy.invalidate("report:a:branch:1:x")
+    strategy.set("report:a:branch:1:y", {"v": 2}, prefixes=("report:a:branch:1:",))
+
+    strategy.invalidate_prefix("report:a:branch:1:")
+
+    assert strategy.get("report:a:branch:1:y") is None
+    assert strategy.get("report:a:branch:14:x") == {"v": 14}
+    assert strategy.get_metrics()["invalidations"] == 2
+
+
+def _redis_strategy() -> cache_strategies.RedisCacheStrategy:
+    strategy = object.__new__(cache_strategies.RedisCacheStrategy)
+    strategy._client = MagicMock()
+    strategy._metrics = cache_strategies.CacheMetrics()
+    strategy._lock = threading.Lock()
+    strategy._scanned_prefixes = set()
+    return strategy
+
+
+def test_in_memory_index_is_pruned_on_invalidate_and_expiry(monkeypatch: pytest.MonkeyPatch) -> None:
+    strategy = cache_strategies.InMemoryCacheStrategy()
+    prefixes = ("report:", "report:a:branch:1:")
+    strategy.set("report:a:branch:1:x", {"v": 1}, prefixes=prefixes)
+    strategy.set("report:a:branch:1:y", {"v": 2}, ttl_seconds=60, prefixes=prefixes)
+
+    strategy.invalidate("report:a:branch:1:x")
+    assert strategy._index == {prefix: {"report:a:branch:1:y"} for prefix in prefixes}
+
+    now = cache_strategies.time.time()
+    monkeypatch.setattr(cache_strategies.time, "time", lambda: now + 120)
+    assert strategy.get("report:a:branch:1:y") is None
+    assert strategy._index == {}
+    assert strategy._key_prefixes == {}
+
+
+def test_redis_invalidate_prefix_scans_once_then_uses_index() -> None:
+    strategy = _redis_strategy()
+    strategy._client.smembers.return_value = {"report:a:branch:1:x"}
+    strategy._client.scan_iter.return_value = iter(["report:a:branch:1:legacy"])
+
+    strategy.set("report:a:branch:1:x", {"v": 1}, ttl_seconds=60, prefixes=("report:a:branch:1:",))
+    strategy.invalidate_prefix("report:a:branch:1:")
+    strategy.invalidate_prefix("report:a:branch:1:")
+
+    pipeline = strategy._client.pipeline.return_value
+    pipeline.sadd.assert_called_once_with("cache-index:report:a:branch:1:", "report:a:branch:1:x")
+    pipeline.expire.assert_called_once_with("cache-index:report:a:branch:1:", 60)
+    assert set(pipeline.unlink.call_args_list[0].args) == {"report:a:branch:1:x", "report:a:branch:1:legacy"}
+    pipeline.unlink.assert_called_with("report:a:branch:1:x")
+    strategy._client.scan_iter.assert_called_once_with(match="report:a:branch:1:*")
+
+
+def test_redis_invalidate_removes_key_from_indexes() -> None:
+    strategy = _redis_strategy()
+
+    strategy.invalidate("report:a:branch:1:x", prefixes=("report:", "report:a:branch:1:"))
+
+    pipeline = strategy._client.pipeline.return_value
+    pipeline.delete.assert_called_once_with("report:a:branch:1:x")
+    assert [call.args for call in pipeline.srem.call_args_list] == [
+        ("cache-index:report:", "report:a:branch:1:x"),
+        ("cache-index:report:a:branch:1:", "report:a:branch:1:x"),
+    ]
+
+
+def test_redis_payload_round_trips_dates_as_strings() -> None:
+    payload = cache_strategies._dumps({"metadata": {"generated_at": date(2025, 1, 2)}, "data": [{"n": 1}]})
+
+    assert cache_strategies._loads(payload) == {"metadata": {"generated_at": "2025-01-02"}, "data": [{"n": 1}]}
+    assert cache_strategies._loads(json.dumps({"ok": True})) == {"ok": True}
@@ -4,6 +4,7 @@ Estas pruebas validan los requisitos de logging estructurado descritos en
 `logging-rules.md`, asegurando que los campos obligatorios se propaguen.
 """
 
+import json
 import sys
 from pathlib import Path
 
@@ -15,6 +16,7 @@ SRC_PATH = PROJECT_ROOT / "src"
 if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
 
+from app.config import Settings, _orjson_dumps, configure_logging
 from app.logging_utils import MANDATORY_FIELDS, ensure_log_context, bind_log_context
 from structlog.testing import capture_logs
 
@@ -60,3 +62,37 @@ def test_bind_log_context_filters_none_and_binds():
     assert event["etapa"] == "procesamiento"
     assert event["records_processed"] == 5
     assert "records_skipped" not in event
+
+
+def test_orjson_renderer_keeps_structlog_fallbacks():
+    """El renderer JSON con orjson respeta ``__structlog__`` y llaves no textuales."""
+    pytest.importorskip("orjson")
+
+    class Metrics:
+        def __structlog__(self):
+            return {"hits": 1}
+
+    renderer = structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    rendered = renderer(None, "info", {"event": "pipeline_completed", "cache_metrics": Metrics(), 14: "rama"})
+
+    assert json.loads(rendered) == {"event": "pipeline_completed", "cache_metrics": {"hits": 1}, "14": "rama"}
+
+
+def test_configured_pipeline_drops_events_below_level_first(tmp_path):
+    """``configure_logging`` descarta eventos bajo ``log_level`` antes del resto de procesadores."""
+    settings = Settings(gmail_user="logs@example.com", log_level="INFO", log_file_path=str(tmp_path / "email_service.log"))
+    configure_logging(settings)
+
+    seen = []
+
+    def spy(logger, method_name, event_dict):
+        seen.append((method_name, event_dict["event"]))
+        return event_dict
+
+    structlog.get_config()["processors"].insert(1, spy)
+    logger = structlog.get_logger("app")
+    logger.debug("evento_debug", cache_metrics=object())
+    logger.info("evento_info")
+
+    assert structlog.get_config()["processors"][0] is structlog.stdlib.filter_by_level
+    assert seen == [("info", "evento_info")]
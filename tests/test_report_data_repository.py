@@ -0,0 +1,394 @@
+"""Pruebas del repositorio SQLAlchemy de Fase 5 contra SQLite."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool.base import ResetStyle
+
+from app.config import Settings
+from app.models import UpcomingBirthday
+from app.services.report_data_repository import (
+    ReportDataRepositoryError,
+    SQLAlchemyReportDataRepository,
+)
+
+
+@pytest.fixture
+def repository(tmp_path) -> SQLAlchemyReportDataRepository:
+    settings = Settings(
+        _env_file=None,
+        gmail_user="test@example.com",
+        database_url=f"sqlite:///{tmp_path / 'reportes.db'}",
+    )
+    repo = SQLAlchemyReportDataRepository(settings)
+    with repo._engine.begin() as conn:
+        conn.execute(text("CREATE TABLE vwMisioneros (Rama INTEGER, Distrito TEXT, Status TEXT, tres_semanas INTEGER)"))
+        conn.execute(
+            text("INSERT INTO vwMisioneros VALUES (:rama, :distrito, :status, :tres)"),
+            [
+                {"rama": 14, "distrito": "14A", "status": "CCM", "tres": 1},
+                {"rama": 14, "distrito": "14A", "status": "Virtual", "tres": 0},
+                {"rama": 14, "distrito": "14B", "status": "Futuro", "tres": 0},
+                {"rama": 15, "distrito": "15A", "status": "CCM", "tres": 0},
+            ],
+        )
+    return repo
+
+
+def test_repositories_share_engine_per_database_url(repository):
+    settings = Settings(
+        _env_file=None,
+        gmail_user="test@example.com",
+        database_url=str(repository._engine.url),
+    )
+
+    assert SQLAlchemyReportDataRepository(settings)._engine is repository._engine
+
+
+def test_module_exposes_the_functional_repository(repository):
+    # Regresión: una segunda definición "stub" de la clase no debe sombrear la implementación real
+    from app.services import report_data_repository as module
+
+    assert module.SQLAlchemyReportDataRepository is SQLAlchemyReportDataRepository
+    assert not SQLAlchemyReportDataRepository.__abstractmethods__
+    assert list(repository.fetch_district_kpis(None, {}))
+
+
+def test_reads_use_an_autocommit_pool_without_reset_on_return():
+    settings = Settings(_env_file=None, gmail_user="test@example.com", database_url="mysql+pymysql://u:p@db/ccm")
+    repo = SQLAlchemyReportDataRepository(settings)
+
+    assert repo._read_engine is not repo._engine
+    assert repo._read_engine.dialect._on_connect_isolation_level == "AUTOCOMMIT"
+    assert repo._read_engine.pool._reset_on_return is ResetStyle.reset_none
+    assert repo._engine.dialect._on_connect_isolation_level is None
+
+
+def test_read_pool_size_comes_from_settings_and_write_pool_stays_minimal():
+    settings = Settings(
+        _env_file=None,
+        gmail_user="test@example.com",
+        database_url="mysql+pymysql://u:p@db/ccm_pool",
+        report_db_pool_size=3,
+        report_db_max_overflow=2,
+    )
+    repo = SQLAlchemyReportDataRepository(settings)
+
+    assert (repo._read_engine.pool.size(), repo._read_engine.pool._max_overflow) == (3, 2)
+    assert (repo._engine.pool.size(), repo._engine.pool._max_overflow) == (1, 1)
+
+
+def test_evicted_engines_are_disposed(monkeypatch):
+    from sqlalchemy.engine import make_url
+
+    from app.services import report_data_repository as module
+
+    monkeypatch.setattr(module, "_engines", module.OrderedDict())
+    first = module._get_engine(make_url("mysql+pymysql://u:p@db/ccm_0"))
+    disposed = []
+    monkeypatch.setattr(first, "dispose", lambda: disposed.append(first))
+
+    for index in range(1, module._ENGINE_CACHE_SIZE + 1):
+        module._get_engine(make_url(f"mysql+pymysql://u:p@db/ccm_{index}"))
+
+    assert disposed == [first]
+    assert len(module._engines) == module._ENGINE_CACHE_SIZE
+
+
+def test_fetch_district_kpis_reads_rows_through_raw_cursor(repository):
+    kpis = repository.fetch_district_kpis(14, {})
+
+    by_key = {(row["district"], row["metric"]): row["value"] for row in kpis}
+    assert {district for district, _ in by_key} == {"14A", "14B"}
+    assert by_key[("14A", "total_missionaries")] == 2.0
+    assert by_key[("14A", "en_ccm")] == 1.0
+    assert by_key[("14A", "tres_semanas")] == 1.0
+    assert by_key[("14B", "futuros")] == 1.0
+    assert all(type(value) is float for value in by_key.values())
+    assert [row["metric"] for row in kpis if row["district"] == "14A"] == [
+        "total_missionaries",
+        "en_ccm",
+        "virtuales",
+        "futuros",
+        "tres_semanas",
+    ]
+
+    # Sin filtro de rama (parámetro repetido con valor NULL) se incluyen todas
+    assert {row["district"] for row in repository.fetch_district_kpis(None, {})} == {"14A", "14B", "15A"}
+
+
+def test_iter_rows_wraps_driver_errors(repository):
+    with repository._engine.begin() as conn:
+        conn.execute(text("DROP TABLE vwMisioneros"))
+
+    with pytest.raises(ReportDataRepositoryError):
+        list(repository.fetch_district_kpis(14, {}))
+
+
+def test_fetch_methods_stream_rows_in_batches(repository, monkeypatch):
+    monkeypatch.setattr(SQLAlchemyReportDataRepository, "FETCH_BATCH_SIZE", 1)
+
+    rows = repository._iter_district_kpis(None, {})
+
+    assert iter(rows) is rows
+    first = next(rows)
+    assert first["district"] == "14A"
+    assert len(list(rows)) == 3 * 5 - 1
+
+
+def test_fetch_methods_cache_rows_until_invalidated(repository):
+    first = repository.fetch_district_kpis(14, {})
+
+    with repository._engine.begin() as conn:
+        conn.execute(text("INSERT INTO vwMisioneros VALUES (14, '14C', 'CCM', 0)"))
+
+    assert isinstance(first, tuple)
+    assert repository.fetch_district_kpis(14, {}) is first
+    assert repository.fetch_district_kpis(15, {}) is not first
+
+    repository.invalidate("district_kpi")
+    assert {row["district"] for row in repository.fetch_district_kpis(14, {})} == {"14A", "14B", "14C"}
+
+
+def test_date_scoped_datasets_are_not_served_from_a_previous_day(repository, monkeypatch):
+    import app.services.report_data_repository as module
+
+    first = repository.fetch_district_kpis(14, {})
+    summary_key = repository._row_cache_key("branch_summary", 14, {})
+
+    class _Tomorrow(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(module, "date", _Tomorrow)
+
+    assert repository.fetch_district_kpis(14, {}) is not first
+    assert repository._row_cache_key("branch_summary", 14, {}) == summary_key
+
+
+def test_streaming_repository_does_not_materialize_rows_in_cache(tmp_path):
+    settings = Settings(
+        _env_file=None,
+        gmail_user="test@example.com",
+        database_url=f"sqlite:///{tmp_path / 'streaming.db'}",
+        report_stream_results=True,
+    )
+    repo = SQLAlchemyReportDataRepository(settings)
+    with repo._engine.begin() as conn:
+        conn.execute(text("CREATE TABLE vwMisioneros (Rama INTEGER, Distrito TEXT, Status TEXT, tres_semanas INTEGER)"))
+        conn.execute(text("INSERT INTO vwMisioneros VALUES (14, '14A', 'CCM', 0)"))
+
+    rows = repo.fetch_district_kpis(14, {})
+
+    assert iter(rows) is rows
+    assert len(list(rows)) == 5
+    assert repo._row_cache.get_metrics()["writes"] == 0
+
+
+def test_fetch_report_bundle_runs_pending_queries_on_one_connection(repository, monkeypatch):
+    statements_per_call = []
+    fetch_result_sets = repository._fetch_result_sets
+
+    def spy(statements):
+        statements_per_call.append(len(statements))
+        return fetch_result_sets(statements)
+
+    monkeypatch.setattr(repository, "_fetch_result_sets", spy)
+    # Las vistas de llegadas y cumpleaños usan sintaxis MySQL; en SQLite solo se prueban resumen y KPIs
+    monkeypatch.setattr(
+        repository,
+        "_datasets",
+        {key: repository._datasets[key] for key in ("branch_summary", "district_kpi")},
+    )
+    with repository._engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE vwFechasCCMPorDistrito (Rama INTEGER, Distrito TEXT, Primera_Generacion TEXT, "
+                "Primera_CCM_llegada TEXT, Ultima_CCM_salida TEXT, Total_Misioneros INTEGER)"
+            )
+        )
+        conn.execute(text("INSERT INTO vwFechasCCMPorDistrito VALUES (14, '14A', NULL, NULL, NULL, 2)"))
+
+    cached_kpis = repository.fetch_district_kpis(14, {})
+    bundle = repository.fetch_report_bundle(14, {})
+
+    assert statements_per_call == [1]
+    assert bundle["district_kpi"] == list(cached_kpis)
+    assert [(row["district"], row["total_missionaries"]) for row in bundle["branch_summary"]] == [("14A", 2)]
+    assert repository.fetch_branch_summary(14, {}) == tuple(bundle["branch_summary"])
+
+
+def test_fetch_report_bundle_runs_statements_concurrently_when_executor_enabled(repository, monkeypatch):
+    threads = []
+    execute_compiled = repository._execute_compiled
+
+    def spy(compiled):
+        threads.append(threading.current_thread().name)
+        return execute_compiled(compiled)
+
+    monkeypatch.setattr(repository, "_execute_compiled", spy)
+    monkeypatch.setattr(repository, "_bundle_executor", ThreadPoolExecutor(max_workers=2, thread_name_prefix="bundle-test"))
+    monkeypatch.setattr(
+        repository,
+        "_datasets",
+        {key: repository._datasets[key] for key in ("district_kpi", "branch_summary")},
+    )
+    with repository._engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE vwFechasCCMPorDistrito (Rama INTEGER, Distrito TEXT, Primera_Generacion TEXT, "
+                "Primera_CCM_llegada TEXT, Ultima_CCM_salida TEXT, Total_Misioneros INTEGER)"
+            )
+        )
+
+    bundle = repository.fetch_report_bundle(14, {})
+
+    assert len(threads) == 2 and all(name.startswith("bundle-test") for name in threads)
+    assert list(bundle) == ["district_kpi", "branch_summary"]
+    assert bundle["branch_summary"] == []
+    assert {row["district"] for row in bundle["district_kpi"]} == {"14A", "14B"}
+
+
+def test_join_statements_supports_positional_and_pyformat_markers():
+    positional = SQLAlchemyReportDataRepository._join_statements(
+        [("SELECT ?", ["branch_id"], {"branch_id": 14}), ("SELECT ?, ?", ["start", "end"], {"start": 1, "end": 2})]
+    )
+    pyformat = SQLAlchemyReportDataRepository._join_statements(
+        [
+            ("SELECT %(branch_id)s", None, {"branch_id": 14}),
+            ("SELECT %(branch_id)s, 100%% WHERE x = %(branch_id)s", None, {"branch_id": 1}),
+        ]
+    )
+
+    assert positional == ("SELECT ?;\nSELECT ?, ?", [14, 1, 2])
+    assert pyformat == (
+        "SELECT %(q0_branch_id)s;\nSELECT %(q1_branch_id)s, 100%% WHERE x = %(q1_branch_id)s",
+        {"q0_branch_id": 14, "q1_branch_id": 1},
+    )
+
+
+def test_close_shuts_down_bundle_executor(repository):
+    executor = ThreadPoolExecutor(max_workers=1)
+    repository._bundle_executor = executor
+
+    repository.close()
+    repository.close()
+
+    assert repository._bundle_executor is None
+    assert executor._shutdown
+
+
+def test_fetch_branch_summaries_bulk_groups_rows_by_branch(repository):
+    with repository._engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE vwFechasCCMPorDistrito (Rama INTEGER, Distrito TEXT, Primera_Generacion TEXT, "
+                "Primera_CCM_llegada TEXT, Ultima_CCM_salida TEXT, Total_Misioneros INTEGER)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO vwFechasCCMPorDistrito VALUES "
+                "(14, '14B', NULL, NULL, NULL, 3), (14, '14A', NULL, NULL, NULL, 2), (15, '15A', NULL, NULL, NULL, 4)"
+            )
+        )
+
+    summaries = repository.fetch_branch_summaries_bulk([15, 14, 16, 14])
+
+    assert list(summaries) == [14, 15, 16]
+    assert [row["district"] for row in summaries[14]] == ["14A", "14B"]
+    assert summaries[15][0]["total_missionaries"] == 4
+    assert summaries[15][0]["total_companionships"] is None
+    assert summaries[16] == []
+    assert repository.fetch_branch_summaries_bulk([]) == {}
+
+
+def test_upcoming_statements_bind_a_half_open_date_window(repository):
+    _, arrivals = repository._upcoming_arrivals_statement(14, {"days_ahead": 7})
+    _, birthdays = repository._upcoming_birthdays_statement(14, {})
+
+    today = date.today()
+    assert arrivals == {"branch_id": 14, "start_date": today, "end_date": today + timedelta(days=8)}
+    assert birthdays["end_date"] == today + timedelta(days=91)
+
+
+def test_statements_specialize_the_branch_filter(repository):
+    scoped, scoped_params = repository._district_kpis_statement(14, {})
+    unscoped, unscoped_params = repository._district_kpis_statement(None, {})
+
+    assert "Rama = :branch_id" in scoped.text and scoped_params == {"branch_id": 14}
+    assert ":branch_id" not in unscoped.text and unscoped_params == {}
+    assert "IS NULL OR" not in scoped.text
+
+
+def test_fetch_upcoming_birthdays_normalizes_three_weeks_flag_in_sql(repository):
+    soon = (date.today() + timedelta(days=3)).isoformat()
+    with repository._engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE vwCumpleanosProximos (ID INTEGER, Rama INTEGER, Distrito TEXT, Tratamiento TEXT, "
+                "Nombre_del_misionero TEXT, Fecha_Cumpleanos TEXT, Nueva_Edad INTEGER, Status TEXT, "
+                "Correo_Misional TEXT, Correo_Personal TEXT, tres_semanas INTEGER)"
+            )
+        )
+        conn.execute(
+            text(
+                "INSERT INTO vwCumpleanosProximos VALUES "
+                "(1, 14, '14A', 'Elder', 'Alfa', :soon, 20, 'CCM', NULL, NULL, 2), "
+                "(2, 14, '14A', 'Hermana', 'Beta', :soon, 21, 'CCM', NULL, NULL, NULL), "
+                "(3, 14, '14A', 'Elder', 'Gamma', '2000-01-01', 22, 'CCM', NULL, NULL, 0)"
+            ),
+            {"soon": soon},
+        )
+
+    rows = list(repository.fetch_upcoming_birthdays(14, {}))
+
+    assert [(row["missionary_name"], row["three_weeks_program"]) for row in rows] == [("Alfa", 1), ("Beta", None)]
+    assert UpcomingBirthday(**rows[0]).three_weeks_program is True
+
+
+def test_refresh_materializations_rebuilds_rollups(tmp_path):
+    settings = Settings(
+        _env_file=None,
+        gmail_user="test@example.com",
+        database_url=f"sqlite:///{tmp_path / 'reportes.db'}",
+        report_use_materializations=True,
+    )
+    repo = SQLAlchemyReportDataRepository(settings)
+    with repo._engine.begin() as conn:
+        conn.execute(text("CREATE TABLE vwMisioneros (Rama INTEGER, Distrito TEXT, Status TEXT, tres_semanas INTEGER)"))
+        conn.execute(
+            text(
+                "CREATE TABLE vwFechasCCMPorDistrito (Rama INTEGER, Distrito TEXT, Primera_Generacion TEXT, "
+                "Primera_CCM_llegada TEXT, Ultima_CCM_salida TEXT, Total_Misioneros INTEGER)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE mv_district_kpis (branch_id INTEGER, district TEXT, total_missionaries INTEGER, "
+                "ccm_count INTEGER, virtual_count INTEGER, future_count INTEGER, three_week_count INTEGER, "
+                "refreshed_at TEXT)"
+            )
+        )
+        conn.execute(
+            text(
+                "CREATE TABLE mv_branch_summary (branch_id INTEGER, district TEXT, first_generation_date TEXT, "
+                "first_ccm_arrival TEXT, last_ccm_departure TEXT, total_missionaries INTEGER, refreshed_at TEXT)"
+            )
+        )
+        conn.execute(text("INSERT INTO mv_district_kpis VALUES (14, 'obsoleto', 9, 9, 9, 9, 9, '2000-01-01')"))
+        conn.execute(text("INSERT INTO vwMisioneros VALUES (14, '14A', 'CCM', 1), (14, '14A', 'Futuro', 0)"))
+        conn.execute(text("INSERT INTO vwFechasCCMPorDistrito VALUES (14, '14A', NULL, NULL, NULL, 2)"))
+
+    assert repo.refresh_materializations() == {"mv_branch_summary": 1, "mv_district_kpis": 1}
+
+    kpis = {row["metric"]: row["value"] for row in repo.fetch_district_kpis(14, {})}
+    assert kpis == {"total_missionaries": 2.0, "en_ccm": 1.0, "virtuales": 0.0, "futuros": 1.0, "tres_semanas": 1.0}
+    summary = list(repo.fetch_branch_summary(14, {}))
+    assert [(row["district"], row["total_missionaries"]) for row in summary] == [("14A", 2)]
@@ -1,11 +1,17 @@
 """Pruebas unitarias para `ReportPreparationService` y pipelines de Fase 5."""
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 from typing import Any, Dict, Iterable, List, Optional
 
 import pytest
+import structlog
+from structlog.testing import capture_logs
 
+from app.services import report_preparation_service
 from app.services.cache_strategies import InMemoryCacheStrategy
 from app.services.report_data_repository import ReportDataRepository, ReportDataRepositoryError
 from app.services.report_preparation_service import (
@@ -46,6 +52,18 @@ def build_service(repository: ReportDataRepository) -> ReportPreparationService:
     return ReportPreparationService(default_branch_id=14, cache_strategy=cache, repository=repository)
 
 
+@pytest.fixture
+def service_logs(monkeypatch):
+    """Captura los eventos del servicio aunque `configure_logging` ya haya fijado su logger en caché."""
+
+    config = structlog.get_config()
+    structlog.reset_defaults()
+    monkeypatch.setattr(report_preparation_service, "logger", structlog.get_logger("report_preparation"))
+    with capture_logs() as logs:
+        yield logs
+    structlog.configure(**config)
+
+
 def test_prepare_branch_summary_success():
     """Valida ruta feliz de Branch Summary (requisito: dataset completo)."""
     # Requisito: Fase 5 debe entregar `BranchSummary` consistente para consumo de reportes (`docs/plan_fase5.md`).
@@ -157,6 +175,88 @@ def test_cache_hit_on_second_call():
     assert second.metadata.record_count == 1
 
 
+def test_refresh_materializations_invalidates_dependent_datasets():
+    """Tras refrescar los roll-ups, `branch_summary` debe recalcularse en lugar de salir de caché."""
+
+    repository = StubRepository(
+        branch_summary_rows=[
+            {
+                "branch_id": 14,
+                "district": "Distrito 3",
+                "first_generation_date": None,
+                "first_ccm_arrival": None,
+                "last_ccm_departure": None,
+                "total_missionaries": 7,
+                "total_companionships": None,
+                "elders_count": None,
+                "sisters_count": None,
+            }
+        ],
+        district_kpis_rows=[],
+        upcoming_arrivals_rows=[],
+        upcoming_birthdays_rows=[],
+    )
+
+    service = build_service(repository)
+    service.prepare_branch_summary()
+
+    assert service.refresh_materializations() == {}
+    assert service.prepare_branch_summary().metadata.cache_hit is False
+
+
+def test_prepare_report_bundle_loads_all_datasets_in_one_call():
+    """Los cuatro datasets salen de una sola llamada a `fetch_report_bundle`; la caché evita repetirla."""
+
+    @dataclass
+    class CountingRepository(StubRepository):
+        bundle_calls: int = 0
+
+        def fetch_report_bundle(self, branch_id: Optional[int], params: Dict[str, object]) -> Dict[str, List[Dict[str, object]]]:
+            self.bundle_calls += 1
+            return super().fetch_report_bundle(branch_id, params)
+
+    repository = CountingRepository(
+        branch_summary_rows=[
+            {
+                "branch_id": 14,
+                "district": "Distrito 4",
+                "first_generation_date": None,
+                "first_ccm_arrival": None,
+                "last_ccm_departure": None,
+                "total_missionaries": 5,
+                "total_companionships": None,
+                "elders_count": None,
+                "sisters_count": None,
+            }
+        ],
+        district_kpis_rows=[
+            {
+                "branch_id": 14,
+                "district": "Distrito 4",
+                "metric": "en_ccm",
+                "value": 5.0,
+                "unit": "misioneros",
+                "generated_for_week": date.today(),
+                "extra": {},
+            }
+        ],
+        upcoming_arrivals_rows=[],
+        upcoming_birthdays_rows=[],
+    )
+
+    service = build_service(repository)
+    results = service.prepare_report_bundle()
+
+    assert repository.bundle_calls == 1
+    assert set(results) == {"branch_summary", "district_kpi", "upcoming_arrivals", "upcoming_birthdays"}
+    assert results["branch_summary"].data[0]["total_missionaries"] == 5
+    assert results["district_kpi"].metadata.record_count == 1
+
+    cached = service.prepare_report_bundle()
+    assert repository.bundle_calls == 1
+    assert all(result.metadata.cache_hit for result in cached.values())
+
+
 def test_cache_metrics_track_usage():
     """✅ Registra métricas de caché para auditoría (`docs/plan_fase5.md`)."""
 
@@ -288,6 +388,19 @@ def test_prepare_branch_summary_invalid_branch_rejected():
     assert exc_info.value.error_code == "invalid_branch"
 
 
+def test_repeated_invalid_branch_is_logged_as_error_once(service_logs):
+    service = build_service(StubRepository([], [], [], []))
+
+    for _ in range(3):
+        with pytest.raises(DatasetValidationError) as exc_info:
+            service.prepare_branch_summary(branch_id=99)
+        assert exc_info.value.error_code == "invalid_branch"
+
+    events = [entry["event"] for entry in service_logs if entry["event"].startswith("pipeline_invalid_branch")]
+    assert events == ["pipeline_invalid_branch"] + ["pipeline_invalid_branch_repetida"] * 2
+    assert service._rejected_branches[(99, "branch_summary")] == 3
+
+
 def test_branch_summary_missing_required_fields_error_code():
     """Valida presencia de campos obligatorios y retorna `missing_required_fields`."""
     # Requisito: Detectar registros incompletos previo a serialización (`docs/plan_fase5.md`).
@@ -349,9 +462,7 @@ def test_cache_stale_invalidates_and_refreshes():
 
     cache_key = service._build_cache_key("branch_summary", 14, {})
     cached_payload = service._cache._store[cache_key]
-    cached_payload["metadata"]["generated_at"] = (
-        datetime.utcnow() - timedelta(hours=STALE_CACHE_AGE_HOURS)
-    ).isoformat()
+    cached_payload["stale_after_ns"] = time.monotonic_ns() - STALE_CACHE_AGE_HOURS * 3_600_000_000_000
 
     repository.branch_summary_rows = [
         {
@@ -442,3 +553,108 @@ def test_repository_error_is_wrapped():
 
     with pytest.raises(ReportPreparationError):
         service.prepare_branch_summary()
+
+
+def test_cache_key_is_order_independent_and_keeps_invalidation_prefix():
+    service = build_service(StubRepository([], [], [], []))
+
+    key = service._build_cache_key("upcoming_arrivals", 14, {"days": 30, "limit": 5})
+
+    assert key == service._build_cache_key("upcoming_arrivals", 14, {"limit": 5, "days": 30})
+    assert key != service._build_cache_key("upcoming_arrivals", 14, {"days": 31, "limit": 5})
+    assert key.startswith("report:upcoming_arrivals:branch:14:")
+    assert len(key.rsplit(":", 1)[1]) == 32
+
+
+def test_cache_key_accepts_unhashable_params():
+    service = build_service(StubRepository([], [], [], []))
+
+    key = service._build_cache_key("branch_summary", None, {"districts": ["A", "B"]})
+
+    assert key == service._build_cache_key("branch_summary", None, {"districts": ["A", "B"]})
+    assert key.startswith("report:branch_summary:branch:global:")
+
+
+def test_cache_key_distinguishes_equal_hashing_values():
+    service = build_service(StubRepository([], [], [], []))
+
+    keys = {
+        service._build_cache_key("upcoming_arrivals", 14, {"days": value})
+        for value in (1, True, 1.0, (1,), (True,), 1, True)
+    }
+
+    assert len(keys) == 5
+
+
+def test_concurrent_cache_misses_share_one_pipeline_run(service_logs):
+    started = threading.Event()
+    release = threading.Event()
+    calls: List[int] = []
+
+    class SlowRepository(StubRepository):
+        def fetch_branch_summary(self, branch_id, params):
+            calls.append(branch_id)
+            started.set()
+            release.wait(timeout=5)
+            return super().fetch_branch_summary(branch_id, params)
+
+    row = {"branch_id": 14, "district": "14A", "total_missionaries": 3}
+    service = build_service(SlowRepository([row], [], [], []))
+
+    logs = service_logs
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(service.prepare_branch_summary)
+        assert started.wait(timeout=5)
+        follower = pool.submit(service.prepare_branch_summary)
+        deadline = time.monotonic() + 5
+        while not any(entry["event"] == "pipeline_coalesced" for entry in logs) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result(timeout=5), follower.result(timeout=5)]
+
+    assert calls == [14]
+    assert [entry["event"] for entry in logs].count("pipeline_coalesced") == 1
+    assert [result.data for result in results] == [results[0].data] * 2
+    assert results[1].metadata is not results[0].metadata
+    assert not service._inflight
+
+
+def test_invalidate_branch_does_not_match_longer_branch_ids():
+    rows = [{"branch_id": 1, "district": "1A", "total_missionaries": 3}]
+    service = build_service(StubRepository(rows, [], [], []))
+    service._allowed_branches = {1, 14}
+    service.prepare_branch_summary(branch_id=1)
+    service.prepare_branch_summary(branch_id=14)
+
+    service.invalidate(branch_id=1)
+
+    assert service.prepare_branch_summary(branch_id=1).metadata.cache_hit is False
+    assert service.prepare_branch_summary(branch_id=14).metadata.cache_hit is True
+
+
+def test_invalidate_also_discards_repository_rows():
+    invalidated: List[Optional[str]] = []
+
+    class RecordingRepository(StubRepository):
+        def invalidate(self, dataset_id=None):
+            invalidated.append(dataset_id)
+
+    service = build_service(RecordingRepository([], [], [], []))
+
+    service.invalidate("upcoming_arrivals")
+    service.invalidate(branch_id=14)
+    service.invalidate()
+
+    assert invalidated == ["upcoming_arrivals", None, None]
+
+
+def test_cache_hit_logs_are_sampled(service_logs):
+    rows = [{"branch_id": 14, "district": "14A", "total_missionaries": 3}]
+    service = build_service(StubRepository(rows, [], [], []))
+    service._cache_hit_log_every = 2
+    service.prepare_branch_summary()
+
+    for _ in range(4):
+        assert service.prepare_branch_summary().metadata.cache_hit is True
+
+    assert [entry["event"] for entry in service_logs].count("pipeline_cache_hit") == 2
@@ -160,3 +160,34 @@ def test_empty_dataset_without_allow_empty_triggers_error():
         pipeline.prepare()
 
     assert exc_info.value.error_code == "dataset_missing_rows"
+
+
+def test_generated_row_checks_match_field_semantics():
+    """ℹ️ Las verificaciones generadas por subclase normalizan texto y omiten llaves vacías."""
+
+    class _KeyedPipeline(_SimplePipeline):
+        unique_fields = ("id", "value")
+
+    assert _KeyedPipeline._check_required({"id": 0, "value": "  "}) == ["value"]
+    assert _KeyedPipeline._check_required({}) == ["id", "value"]
+    assert _KeyedPipeline._check_required({"id": 0, "value": "x"}) is None
+    assert _KeyedPipeline._unique_key({"id": None, "value": "  "}) is None
+    assert _KeyedPipeline._unique_key({"id": 1, "value": " a "}) == (1, "a")
+    assert BaseDatasetPipeline._unique_key is None
+
+    pipeline = _KeyedPipeline(rows=[{"id": 1, "value": "a"}, {"id": 1, "value": " a "}])
+    with pytest.raises(DatasetValidationError) as exc_info:
+        pipeline.prepare()
+
+    assert exc_info.value.error_code == "duplicate_records"
+
+
+def test_pipelines_use_slots_and_shared_empty_params():
+    """ℹ️ Los pipelines del repositorio no reservan `__dict__` ni un dict de parámetros vacío."""
+
+    first = UpcomingArrivalPipeline(repository=_ListRepository(), branch_id=14)
+    second = BranchSummaryPipeline(repository=_ListRepository(), branch_id=14)
+
+    assert not hasattr(first, "__dict__")
+    assert first.params is second.params
+    assert first.prepare().metadata.parameters == {}